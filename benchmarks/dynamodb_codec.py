@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# Micro-benchmark for the moses_common.dynamodb attribute value codec
+#
+# Compares the table-driven codec in Table.convert_to_item/convert_from_item against the
+# previous recursive implementation on realistic nested artist records.
+#
+# python benchmarks/dynamodb_codec.py
+# python benchmarks/dynamodb_codec.py --items 20000 --repeat 5
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib-layer'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+import moses_common.__init__ as common
+import moses_common.dynamodb
+
+
+class LegacyCodec:
+	"""
+	The recursive codec that Table used before the table-driven converters.
+	"""
+	def convert_to_num(self, value):
+		if type(value) is int or type(value) is float:
+			return value
+		return int(0)
+	
+	def convert_to_attribute_value(self, value, attribute_type=None):
+		if attribute_type:
+			if attribute_type == 'S':
+				return { 'S': str(value) }
+			elif attribute_type == 'N':
+				return { 'N': str(self.convert_to_num(value)) }
+			elif attribute_type == 'M':
+				new_map = {}
+				for key, item in value.items():
+					new_map[key] = self.convert_to_attribute_value(item)
+				return { 'M': new_map }
+			elif attribute_type == 'L':
+				new_list = []
+				for item in value:
+					new_list.append(self.convert_to_attribute_value(item))
+				return { 'L': new_list }
+			elif attribute_type == 'NULL':
+				return { 'NULL': True }
+			elif attribute_type == 'BOOL':
+				return { 'BOOL': bool(value) }
+		if type(value) is str:
+			return self.convert_to_attribute_value(value, 'S')
+		elif type(value) is int or type(value) is float:
+			return self.convert_to_attribute_value(value, 'N')
+		elif type(value) is dict:
+			return self.convert_to_attribute_value(value, 'M')
+		elif type(value) is list:
+			return self.convert_to_attribute_value(value, 'L')
+		elif value is None:
+			return self.convert_to_attribute_value(value, 'NULL')
+		elif type(value) is bool:
+			return self.convert_to_attribute_value(value, 'BOOL')
+		return self.convert_to_attribute_value(value, 'S')
+	
+	def convert_to_item(self, record):
+		new_record = {}
+		for key, value in record.items():
+			new_record[key] = self.convert_to_attribute_value(value)
+		return new_record
+	
+	def convert_from_attribute_value(self, attribute_value):
+		if type(attribute_value) is not dict:
+			return attribute_value
+		if 'NULL' in attribute_value:
+			return None
+		elif 'BOOL' in attribute_value:
+			return attribute_value['BOOL']
+		elif 'S' in attribute_value:
+			return str(attribute_value['S'])
+		elif 'N' in attribute_value:
+			if re.search(r'\.', attribute_value['N']):
+				return common.convert_to_float(attribute_value['N'])
+			else:
+				return common.convert_to_int(attribute_value['N'])
+		elif 'M' in attribute_value:
+			new_map = {}
+			for key, item in attribute_value['M'].items():
+				new_map[key] = self.convert_from_attribute_value(item)
+			return new_map
+		elif 'L' in attribute_value:
+			new_list = []
+			for item in attribute_value['L']:
+				new_list.append(self.convert_from_attribute_value(item))
+			return new_list
+		return None
+	
+	def convert_from_item(self, record):
+		new_record = {}
+		for key, value in record.items():
+			new_record[key] = self.convert_from_attribute_value(value)
+		return new_record
+
+
+def make_record(i):
+	return {
+		"id": f"artist-{i:06d}",
+		"name": f"Artist Number {i}",
+		"sort_name": f"Number {i}, Artist",
+		"bio": "Painter and printmaker working in oil and woodcut. " * 8,
+		"born": 1850 + i % 150,
+		"rating": round(3 + (i % 200) / 100, 2),
+		"is_active": bool(i % 2),
+		"deleted": None,
+		"tags": ["1:landscape", "2:portrait", "still life", "3:abstract"],
+		"images": [
+			{
+				"url": f"https://example.com/images/{i}/{n}.jpg",
+				"width": 1024,
+				"height": 768 + n,
+				"score": 0.5 + n / 10,
+				"prompt": {
+					"text": "a quiet harbor at dawn, muted palette",
+					"seed": 1234567 + n,
+					"steps": 30,
+					"cfg_scale": 7.5
+				}
+			} for n in range(4)
+		],
+		"stats": {
+			"views": i * 7,
+			"likes": i % 97,
+			"history": [i, i + 1, i + 2, i + 3.5]
+		}
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the DynamoDB attribute value codec")
+	parser.add_argument('--items', type=int, default=5000, help="records per run")
+	parser.add_argument('--repeat', type=int, default=3, help="runs per codec; the best is reported")
+	args = parser.parse_args()
+	
+	# Table.__init__ would call DescribeTable; the codec doesn't need the schema
+	table = moses_common.dynamodb.Table.__new__(moses_common.dynamodb.Table)
+	legacy = LegacyCodec()
+	
+	records = [make_record(i) for i in range(args.items)]
+	items = [legacy.convert_to_item(record) for record in records]
+	
+	# Same output for the same input
+	for record, item in zip(records[:100], items[:100]):
+		assert table.convert_to_item(record) == item
+		assert table.convert_from_item(item) == legacy.convert_from_item(item)
+	
+	cases = [
+		("to_item", lambda codec: [codec.convert_to_item(record) for record in records]),
+		("from_item", lambda codec: [codec.convert_from_item(item) for item in items])
+	]
+	print(f"{args.items} records, best of {args.repeat}")
+	for label, run in cases:
+		legacy_time = min(timeit.repeat(lambda: run(legacy), number=1, repeat=args.repeat))
+		table_time = min(timeit.repeat(lambda: run(table), number=1, repeat=args.repeat))
+		print("{:<10} legacy {:8.1f} us/item   table-driven {:8.1f} us/item   {:.1f}x".format(
+			label,
+			legacy_time / args.items * 1000000,
+			table_time / args.items * 1000000,
+			legacy_time / table_time
+		))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+# Per-item cost of the moses_common.dynamodb.Table write path
+#
+# Compares the current write path against the previous one (LegacyTable below) on large map records.
+# put_item and update_item run against the in-process engine in moses_common.dynamodb_memory;
+# "build update" times update expression building alone, which is the part that grows with the
+# size of the record.
+#
+# python benchmarks/dynamodb_writes.py
+# python benchmarks/dynamodb_writes.py --items 2000 --fields 60 --repeat 5
+
+import argparse
+import copy
+import decimal
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib-layer'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+from botocore.exceptions import ClientError
+
+
+class LegacyTable(moses_common.dynamodb.Table):
+	"""
+	The write path that Table used before items were converted once.
+	
+	put_item converts the record twice and get_update_expression pops the key fields out of the
+	caller's dict, so update_item changes the records it is given.
+	"""
+	def get_update_expression(self, item, remove_keys=None, add_values=None):
+		if item and type(item) is not dict:
+			raise TypeError("item must be dict")
+		
+		# Remove keys from item
+		if self.partition_key.name in item:
+			item.pop(self.partition_key.name)
+		if self.sort_key and self.sort_key.name in item:
+			item.pop(self.sort_key.name)
+		
+		count = 0
+		expression_list = []
+		attribute_names = {}
+		attribute_values = {}
+		for key, value in item.items():
+			count += 1
+			attribute_names["#k" + str(count)] = key
+			attribute_values[":v" + str(count)] = self.convert_to_attribute_value(value)
+			expression = "#k{} = :v{}".format(str(count), str(count))
+			expression_list.append(expression)
+		update_expression = ''
+		if len(expression_list):
+			update_expression = "SET " + ', '.join(expression_list)
+		
+		if remove_keys:
+			remove_list = []
+			for key in remove_keys:
+				count += 1
+				attribute_names["#k" + str(count)] = key
+				expression = "#k{}".format(str(count))
+				remove_list.append(expression)
+			if len(remove_list):
+				if update_expression:
+					update_expression += ' '
+				update_expression += "REMOVE " + ', '.join(remove_list)
+		
+		if add_values:
+			if type(add_values) is not dict:
+				raise TypeError("add_values must be dict")
+			add_list = []
+			for key, value in add_values.items():
+				if type(value) not in [int, float, decimal.Decimal]:
+					raise TypeError("add value for '{}' must be a number".format(key))
+				count += 1
+				attribute_names["#k" + str(count)] = key
+				attribute_values[":v" + str(count)] = self.convert_to_attribute_value(value)
+				add_list.append("#k{} :v{}".format(str(count), str(count)))
+			if update_expression:
+				update_expression += ' '
+			update_expression += "ADD " + ', '.join(add_list)
+		
+		if not update_expression:
+			return True, True, True
+		return update_expression, attribute_names, attribute_values
+	
+	def put_item(self, item, condition=None, return_values=None):
+		if type(item) is not dict:
+			return
+		new_item = self.convert_to_item(item)
+		if self.dry_run:
+			self.ui.dry_run("Put item: {}".format(item))
+			if condition:
+				self.ui.dry_run("Condition: {}".format(condition))
+			return True
+		request_args = {
+			"TableName": self.name,
+			"Item": self.convert_to_item(item)
+		}
+		self._add_condition_args(request_args, condition)
+		if return_values:
+			request_args['ReturnValues'] = return_values.upper()
+		self.invalidate_cached_item(item.get(self.partition_key.name), item.get(self.sort_key.name) if self.sort_key else None)
+		try:
+			response = self._request('put_item', 'write', **request_args)
+		except ClientError as e:
+			if self._is_condition_failure(e):
+				return False
+			raise ConnectionError("Failed to put item DynamodDB", self.name)
+		else:
+			return self._get_write_result(response, return_values)
+		return False
+
+
+def make_record(i, fields):
+	record = {
+		"artist_id": f"artist-{i % 50:04d}",
+		"artwork_id": i,
+		"title": f"Study number {i}",
+		"dimensions": { "width": 40 + i % 20, "height": 30 + i % 15, "unit": "cm" },
+		"tags": ["landscape", "harbor", "oil"]
+	}
+	for field in range(fields):
+		record[f"field_{field:03d}"] = { "value": field * i, "label": f"label {field}", "flags": [True, False, None] }
+	return record
+
+
+def time_case(function, make_input, repeat):
+	best = None
+	for i in range(repeat):
+		# Fresh input per run, outside the timing, since the legacy update path changes its records
+		records = make_input()
+		start = time.perf_counter()
+		function(records)
+		seconds = time.perf_counter() - start
+		if best is None or seconds < best:
+			best = seconds
+	return best
+
+
+def run_case(label, function, legacy_function, make_input, make_legacy_input, operations, repeat):
+	before = time_case(legacy_function, make_legacy_input, repeat) / operations * 1000000
+	after = time_case(function, make_input, repeat) / operations * 1000000
+	print("{:<16} {:12.1f} {:12.1f} {:9.2f}x".format(label, before, after, before / after))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark dynamodb.Table put_item and update_item against the previous write path")
+	parser.add_argument('--items', type=int, default=1000, help="records written per run")
+	parser.add_argument('--fields', type=int, default=30, help="extra map fields per record")
+	parser.add_argument('--repeat', type=int, default=3, help="runs per case; the best is reported")
+	args = parser.parse_args()
+
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	legacy_table = LegacyTable('artwork', ui=moses_common.ui.Interface())
+
+	records = [make_record(i, args.fields) for i in range(args.items)]
+	original = copy.deepcopy(records)
+	count = len(records)
+	print(f"{count} records with {args.fields} extra map fields, best of {args.repeat}")
+	print("{:<16} {:>12} {:>12} {:>10}".format("case", "before us/op", "after us/op", "speedup"))
+
+	def make_input():
+		return records
+	def make_legacy_input():
+		return copy.deepcopy(original)
+
+	def build_update(table):
+		return lambda records: [table.get_update_expression(record) for record in records]
+	def put(table):
+		return lambda records: [table.put_item(record) for record in records]
+	def update(table):
+		return lambda records: [table.update_item(record) for record in records]
+
+	run_case("build update", build_update(table), build_update(legacy_table), make_input, make_legacy_input, count, args.repeat)
+	run_case("put_item", put(table), put(legacy_table), make_input, make_legacy_input, count, args.repeat)
+	run_case("update_item", update(table), update(legacy_table), make_input, make_legacy_input, count, args.repeat)
+
+	# The write path must leave the caller's records alone
+	legacy_records = copy.deepcopy(original)
+	update(legacy_table)(legacy_records)
+	print("records unchanged: before {}, after {}".format(legacy_records == original, records == original))
+
+
+if __name__ == '__main__':
+	main()
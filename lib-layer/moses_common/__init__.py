@@ -1737,6 +1737,64 @@ def get_epoch_ms(dt=None):
 
 ## Input checking
 
+class CompiledInput(tuple):
+	"""
+	Parsed field specs returned by compile_input(). check_input() uses them as they are; any
+	other tuple is not a valid field list.
+	"""
+
+"""
+Parses a check_input() field list once, e.g. when an API schema is loaded, so that repeated
+check_input() calls skip re-reading each field spec. Pass the result in place of the field list.
+field_specs = common.compile_input(field_list)
+output, errors = common.check_input(field_specs, body)
+"""
+def compile_input(field_list):
+	if type(field_list) is not list:
+		return field_list
+	return CompiledInput(_parse_input_field(field) for field in field_list)
+
+def _parse_input_field(field):
+	# Read args and set variables
+	value_list = None
+	children = None
+	if type(field) is dict:
+		key = field['name']
+		ftype = field.get('type', 'str')
+		required = field.get('required', False)
+		min_length = field.get('min', 0)
+		max_length = field.get('max', 0)
+		if field.get('values'):
+			value_list = field['values']
+		if ftype in ['dict', 'list'] and field.get('children'):
+			children = field['children']
+	else:
+		key = field[0]
+		ftype = field[1]
+		required = False
+		value_list = None
+		if len(field) >= 3:
+			if type(field[2]) is bool:
+				required = field[2]
+			elif type(field[2]) is list:
+				value_list = field[2]
+		min_length = 0
+		if len(field) >= 4:
+			if type(field[3]) is int:
+				min_length = field[3]
+			elif ftype in ['dict', 'list']:
+				children = field[3]
+		max_length = 0
+		if len(field) >= 5 and type(field[4]) is int:
+			max_length = field[4]
+	
+	if ftype == 'int' and max_length == 0:
+		max_length = 2147483647
+	if ftype == 'bool':
+		ftype = 'boolean'
+	return key, ftype, required, value_list, min_length, max_length, compile_input(children)
+
+
 """
 output, errors = common.check_input(
 	[
@@ -1776,53 +1834,22 @@ Field types:
 	doc_id
 
 """
+# Wraps field names in check_input error messages
+quote_mark = "'"
+
 def check_input(field_list, body, allow_none=False, remove_none=False, process_query=False, required_or=None):
 	output = {}
 	errors = []
 	field_map = {}
-	if type(field_list) is not list:
+	if type(field_list) is CompiledInput:
+		field_specs = field_list
+	elif type(field_list) is list:
+		field_specs = [ _parse_input_field(field) for field in field_list ]
+	else:
 		return {}, ["Invalid schema for check_input"]
-	if not field_list:
+	if not field_specs:
 		return {}, []
-	for field in field_list:
-		# Read args and set variables
-		value_list = None
-		children = None
-		if type(field) is dict:
-			key = field['name']
-			ftype = field.get('type', 'str')
-			required = field.get('required', False)
-			min_length = field.get('min', 0)
-			max_length = field.get('max', 0)
-			if field.get('values'):
-				value_list = field['values']
-			if ftype in ['dict', 'list'] and field.get('children'):
-				children = field['children']
-		else:
-			key = field[0]
-			ftype = field[1]
-			required = False
-			value_list = None
-			if len(field) >= 3:
-				if type(field[2]) is bool:
-					required = field[2]
-				elif type(field[2]) is list:
-					value_list = field[2]
-			min_length = 0
-			if len(field) >= 4:
-				if type(field[3]) is int:
-					min_length = field[3]
-				elif ftype in ['dict', 'list']:
-					children = field[3]
-			max_length = 0
-			if len(field) >= 5 and type(field[4]) is int:
-				max_length = field[4]
-		
-		if ftype == 'int' and max_length == 0:
-			max_length = 2147483647
-		if ftype == 'bool':
-			ftype = 'boolean'
-
+	for key, ftype, required, value_list, min_length, max_length, children in field_specs:
 		# Undo query lists into values
 		if process_query:
 			if key in body and type(body[key]) is list and len(body[key]) == 1 and ftype != 'list':
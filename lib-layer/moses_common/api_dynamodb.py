@@ -2,15 +2,72 @@
 
 from __future__ import annotations
 
+import base64
+import decimal
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
 from botocore.exceptions import ClientError
 
 import moses_common.__init__ as common
+import moses_common.dynamodb
+import moses_common.ui
+
+# Prepared actions kept per processor, keyed by action definition
+prepared_cache_size = 512
+
+# Auth decisions are cached for auth_cache_ttl seconds unless the auth block sets "cache_ttl";
+# 0 disables. Each auth table keeps up to auth_cache_size decisions, and writes to an auth
+# table through the processor clear its decisions. Denials are only cached if
+# auth_negative_cache_ttl or the block's "negative_cache_ttl" is set, since access granted
+# outside the processor would otherwise stay denied until the entry expires.
+auth_cache_ttl = 0
+auth_negative_cache_ttl = 0
+auth_cache_size = 1024
+
+# GET actions with "speculative": true run the auth query and the read concurrently on up to
+# speculative_workers threads per processor; the read is dropped if auth fails.
+speculative_workers = 4
+
+# Most elements accepted by a "batch" action unless it sets "batch_max"; atomic batches are
+# also capped by TransactWriteItems at moses_common.dynamodb.transact_max_items
+batch_max_items = 100
+
+# GET list actions with "stream" return NDJSON, following pages until stream_max_items or
+# stream_max_bytes (unless the action sets "max_items"/"max_bytes"). Bytes are counted as the
+# body will appear once the Lambda proxy response JSON-encodes it (quotes and newlines escaped),
+# so 4 MB leaves room for the response envelope under Lambda's 6 MB limit.
+stream_max_items = 10000
+stream_max_bytes = 4 * 1024 * 1024
+
+# Batch actions call the low-level client, so values are converted here
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def json_default(value: Any) -> Any:
+	"""
+	json.dumps() default for values read through the resource API: Decimal becomes int or float,
+	sets become lists and Binary/bytes become base64 strings.
+
+	json.dumps(item, default=moses_common.api_dynamodb.json_default)
+	"""
+	if isinstance(value, decimal.Decimal):
+		if value == value.to_integral_value():
+			return int(value)
+		return float(value)
+	if isinstance(value, (set, frozenset)):
+		return sorted(value, key=str)
+	if hasattr(value, "value") and isinstance(value.value, (bytes, bytearray)):
+		value = value.value
+	if isinstance(value, (bytes, bytearray)):
+		return base64.b64encode(value).decode("ascii")
+	raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 
 def _utc_now_iso() -> str:
@@ -20,6 +77,196 @@ def _utc_now_iso() -> str:
 	return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+class _KeyCondition:
+	"""
+	Prebuilt KeyConditionExpression for equality on a partition key and, when the sort key
+	value is present, the sort key. bind() returns Query kwargs for one request.
+	"""
+
+	def __init__(self, pk: Optional[str], sk: Optional[str] = None, index_name: Optional[str] = None):
+		self.pk = pk
+		self.sk = sk
+		self._pk_args: Dict[str, Any] = {
+			"KeyConditionExpression": "#pk = :pk",
+			"ExpressionAttributeNames": {"#pk": pk}
+		}
+		self._sk_args: Dict[str, Any] = {}
+		if sk:
+			self._sk_args = {
+				"KeyConditionExpression": "#pk = :pk AND #sk = :sk",
+				"ExpressionAttributeNames": {"#pk": pk, "#sk": sk}
+			}
+		if index_name:
+			self._pk_args["IndexName"] = index_name
+			self._sk_args["IndexName"] = index_name
+
+	def bind(self, validated: Dict[str, Any]) -> Dict[str, Any]:
+		if self.sk and self.sk in validated:
+			kwargs = dict(self._sk_args)
+			kwargs["ExpressionAttributeValues"] = {":pk": validated[self.pk], ":sk": validated[self.sk]}
+		else:
+			kwargs = dict(self._pk_args)
+			kwargs["ExpressionAttributeValues"] = {":pk": validated[self.pk]}
+		return kwargs
+
+
+class PreparedAuth:
+	"""
+	The auth block of a prepared action: compiled field specs, and once the auth table's
+	key schema is known, its key condition and filter templates.
+	"""
+
+	def __init__(self, auth_block: Dict[str, Any]):
+		self.table_name = auth_block.get("table_name")
+		self.index_name = auth_block.get("index_name")
+		self.key_schema = auth_block.get("key_schema")
+		self.field_specs = common.compile_input(auth_block.get("fields", []))
+		self.cache_ttl = common.convert_to_float(auth_block.get("cache_ttl", auth_cache_ttl)) or 0
+		self.negative_cache_ttl = common.convert_to_float(auth_block.get("negative_cache_ttl", auth_negative_cache_ttl)) or 0
+		self.table = None
+		self.key_condition: Optional[_KeyCondition] = None
+		self.error: Optional[str] = None
+		self._filters: List[Tuple[str, str, str]] = []
+
+	def bind_schema(self, schema: Dict[str, Any]) -> None:
+		# Determine keys for query (index if provided, else table)
+		if self.index_name:
+			index_keys = schema["indices"].get(self.index_name)
+			if not index_keys:
+				self.error = f"Auth misconfigured: unknown index '{self.index_name}'"
+				return
+			pk_name = index_keys.get("pk")
+			sk_name = index_keys.get("sk")
+		else:
+			pk_name = schema["table"].get("pk")
+			sk_name = schema["table"].get("sk")
+
+		if not pk_name:
+			self.error = "Auth misconfigured: missing partition key"
+			return
+		self.key_condition = _KeyCondition(pk_name, sk_name, self.index_name)
+
+		field_names = [spec[0] for spec in self.field_specs] if isinstance(self.field_specs, common.CompiledInput) else []
+		for i, name in enumerate(field_names):
+			if name not in (pk_name, sk_name):
+				self._filters.append((name, f"#f{i}", f":f{i}"))
+
+	def get_cache_key(self, validated: Dict[str, Any]) -> str:
+		return json.dumps([self.index_name, validated], sort_keys=True, default=str)
+
+	def bind_filter(self, kwargs: Dict[str, Any], validated: Dict[str, Any]) -> None:
+		parts = []
+		for name, name_token, value_token in self._filters:
+			if name in validated:
+				if not parts:
+					kwargs["ExpressionAttributeNames"] = dict(kwargs["ExpressionAttributeNames"])
+				kwargs["ExpressionAttributeNames"][name_token] = name
+				kwargs["ExpressionAttributeValues"][value_token] = validated[name]
+				parts.append(f"{name_token} = {value_token}")
+		if parts:
+			kwargs["FilterExpression"] = " AND ".join(parts)
+
+
+class PreparedAction:
+	"""
+	An action definition compiled by DynamoDBActionProcessor.prepare(), so per-request work is
+	binding values: compiled field specs for common.check_input(), the auth block, and (after
+	DynamoDBActionProcessor._resolve()) the table handle, key names, key condition, condition
+	expression and update expression templates.
+	"""
+
+	def __init__(self, action_def: Dict[str, Any]):
+		self.action_def = action_def
+		self.table_name = action_def.get("table_name")
+		self.index_name = action_def.get("index_name")
+		self.key_schema = action_def.get("key_schema")
+		self.error: Optional[Tuple[Any, ...]] = None
+		if action_def.get("source") != "ddb":
+			self.error = ("bad_request", "Unsupported source in action", {"source": action_def.get("source")})
+		elif not self.table_name:
+			self.error = ("bad_request", "Missing table_name in action")
+
+		self.field_specs = common.compile_input(action_def.get("fields", []))
+		auth_block = action_def.get("auth")
+		self.auth = PreparedAuth(auth_block) if auth_block else None
+		self.speculative = bool(action_def.get("speculative")) and self.auth is not None
+		self.batch = bool(action_def.get("batch"))
+		self.batch_max = common.convert_to_int(action_def.get("batch_max")) or batch_max_items
+		self.atomic = action_def.get("atomic", True) is not False
+		stream = action_def.get("stream")
+		self.stream = bool(stream)
+		stream_options = stream if isinstance(stream, dict) else {}
+		self.stream_max_items = common.convert_to_int(stream_options.get("max_items")) or stream_max_items
+		self.stream_max_bytes = common.convert_to_int(stream_options.get("max_bytes")) or stream_max_bytes
+
+		# Set by bind_schema()
+		self.table = None
+		self.table_pk: Optional[str] = None
+		self.table_sk: Optional[str] = None
+		self.key_names: Tuple[str, ...] = ()
+		self.cursor_names: Tuple[str, ...] = ()
+		self.partition_condition: Optional[_KeyCondition] = None
+		self.index_condition: Optional[_KeyCondition] = None
+		self.exists_condition = ""
+		self.not_exists_condition = ""
+		self._update_tokens: Dict[str, Tuple[str, str, str]] = {}
+
+	def bind_schema(self, schema: Dict[str, Any]) -> None:
+		self.table_pk = schema["table"].get("pk")
+		self.table_sk = schema["table"].get("sk")
+		self.key_names = tuple(name for name in (self.table_pk, self.table_sk) if name)
+		self.partition_condition = _KeyCondition(self.table_pk)
+		self.cursor_names = self.key_names
+		if self.index_name:
+			index_keys = schema.get("indices", {}).get(self.index_name)
+			if index_keys:
+				self.index_condition = _KeyCondition(index_keys.get("pk"), index_keys.get("sk"), self.index_name)
+				# An index cursor needs the index and table keys
+				self.cursor_names = tuple(dict.fromkeys(name for name in (index_keys.get("pk"), index_keys.get("sk")) + self.key_names if name))
+
+		self.exists_condition = " AND ".join(f"attribute_exists({name})" for name in self.key_names)
+		self.not_exists_condition = " AND ".join(f"attribute_not_exists({name})" for name in self.key_names)
+
+		field_names = [spec[0] for spec in self.field_specs] if isinstance(self.field_specs, common.CompiledInput) else []
+		for i, name in enumerate(field_names + ["update_time"]):
+			if name not in self.key_names and name not in self._update_tokens:
+				self._update_tokens[name] = (f"#n{i}", f":v{i}", f"#n{i} = :v{i}")
+
+	def has_key(self, validated: Dict[str, Any]) -> bool:
+		return self.table_pk in validated and (not self.table_sk or self.table_sk in validated)
+
+	def get_key(self, validated: Dict[str, Any]) -> Dict[str, Any]:
+		return {name: validated[name] for name in self.key_names}
+
+	def bind_update(self, values: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+		"""
+		Fields set to None are removed; the rest are set. Returns ('', {}, {}) if there is nothing to update.
+		"""
+		set_parts = []
+		remove_parts = []
+		names: Dict[str, str] = {}
+		attribute_values: Dict[str, Any] = {}
+		for field, value in values.items():
+			tokens = self._update_tokens.get(field)
+			if tokens is None:
+				# Not a declared field
+				count = len(names)
+				tokens = (f"#x{count}", f":x{count}", f"#x{count} = :x{count}")
+			names[tokens[0]] = field
+			if value is None:
+				remove_parts.append(tokens[0])
+				continue
+			attribute_values[tokens[1]] = value
+			set_parts.append(tokens[2])
+
+		update_expr = []
+		if set_parts:
+			update_expr.append("SET " + ", ".join(set_parts))
+		if remove_parts:
+			update_expr.append("REMOVE " + ", ".join(remove_parts))
+		return " ".join(update_expr), names, attribute_values
+
+
 class DynamoDBActionProcessor:
 	"""
 	Generic DynamoDB action processor that executes actions defined in an API schema.
@@ -32,12 +279,21 @@ class DynamoDBActionProcessor:
 	- DELETE deletes by key with existence check
 	- Timestamps are ISO 8601 UTC with 'Z'
 	- key_schema in action definitions is optional; DescribeTable is used (and cached) if absent
+	- warmup(api_schema) describes every table up front, concurrently
+	- Actions are compiled once (prepare() / prepare_schema()) and reused across requests
+	- Batch actions take a list of elements: BatchGetItem, TransactWriteItems or BatchWriteItem
+	- Stream actions return GET list queries as NDJSON, following pages up to a budget
 
 	Action definition (relevant fields):
 	{
 		"source": "ddb",
 		"table_name": "...",
 		"index_name": "...",					# optional, for GET list queries
+		"speculative": true,					# optional; GET with auth reads data while auth is checked
+		"batch": true,							# optional; data_dict["items"] holds a list of elements
+		"batch_max": 100,						# optional; most elements per batch request
+		"atomic": false,						# optional; batch DELETE via BatchWriteItem, not a transaction
+		"stream": { "max_items": 10000, "max_bytes": 4194304 },  # optional (or true); GET list queries as NDJSON
 		"key_schema": {							# optional; if omitted, DescribeTable is used
 			"table": { "pk": "pk_name", "sk": "sk_name" },  # "sk" optional if table has no sort key
 			"indices": {
@@ -49,7 +305,9 @@ class DynamoDBActionProcessor:
 			"table_name": "...",
 			"index_name": "...",				# optional
 			"key_schema": { ... },				# optional; DescribeTable if missing
-			"fields": [ [name, type, required_or_list], ... ]  # used to gather values for auth
+			"fields": [ [name, type, required_or_list], ... ],  # used to gather values for auth
+			"cache_ttl": 60,					# optional; seconds to cache decisions (default auth_cache_ttl)
+			"negative_cache_ttl": 5				# optional; seconds to cache denials (default auth_negative_cache_ttl, 0)
 		}
 	}
 	"""
@@ -63,6 +321,12 @@ class DynamoDBActionProcessor:
 		self.ddb_client = self.ddb.meta.client
 		# Cache of discovered schemas by table name
 		self._schema_cache: Dict[str, Dict[str, Any]] = {}
+		# Prepared actions by id(action_def)
+		self._prepared: Dict[int, PreparedAction] = {}
+		# Auth decisions by auth table name
+		self._auth_caches: Dict[str, moses_common.dynamodb.ItemCache] = {}
+		# Runs auth queries for speculative GETs
+		self._executor: Optional[ThreadPoolExecutor] = None
 
 	# ---------- Public API ----------
 
@@ -70,6 +334,9 @@ class DynamoDBActionProcessor:
 		"""
 		Execute the action.
 
+		The action definition is compiled by prepare() on first use and reused afterwards,
+		so a request only validates input against the prepared field specs and binds values.
+
 		:param method: HTTP method (GET, POST, PATCH, DELETE)
 		:param action_def: The action definition from the API schema (see class docstring)
 		:param path_vars: Dict of path variables (authoritative)
@@ -77,43 +344,55 @@ class DynamoDBActionProcessor:
 		:return: normalized success dict or {"errors":[...]} on failure
 		"""
 		try:
-			if action_def.get("source") != "ddb":
-				return self._error("bad_request", "Unsupported source in action", details={"source": action_def.get("source")})
-
-			table_name = action_def.get("table_name")
-			if not table_name:
-				return self._error("bad_request", "Missing table_name in action")
+			prepared = self.prepare(action_def)
+			if prepared.error:
+				return self._error(*prepared.error)
+			if prepared.batch:
+				return self._process_batch(method.upper().strip(), prepared, path_vars, data_dict or {})
 
 			# Merge inputs: path vars override data_dict
 			merged_input = self._merge_inputs(path_vars, data_dict)
 
 			# Validate inputs for the action
-			field_defs = action_def.get("fields", [])
-			validated, input_errors = common.check_input(field_defs, merged_input)
+			validated, input_errors = common.check_input(prepared.field_specs, merged_input)
 			if input_errors:
 				return self._error("bad_request", "Validation failed", details=input_errors)
 
+			method_upper = method.upper().strip()
+
 			# Perform optional auth check
-			auth_block = action_def.get("auth")
-			if auth_block:
-				auth_ok, auth_err = self._perform_auth_check(auth_block, path_vars, data_dict)
-				if not auth_ok:
+			auth_validated: Dict[str, Any] = {}
+			speculate = False
+			if prepared.auth:
+				auth_validated, decision = self._start_auth_check(prepared.auth, merged_input)
+				if decision is None:
+					# Speculative reads query auth alongside the read below
+					speculate = prepared.speculative and method_upper == "GET"
+					if not speculate:
+						decision = self._query_auth(prepared.auth, auth_validated)
+				if decision is not None and not decision[0]:
 					# Return structured auth error
-					return self._error("auth_failed", auth_err or "Authorization failed")
+					return self._error("auth_failed", decision[1] or "Authorization failed")
+
+			self.ui.debug_payload(f"{method_upper} {prepared.table_name} input", validated)
+			if speculate:
+				return self._handle_speculative_get(prepared, validated, data_dict, auth_validated)
 
 			# Resolve table and schema (table + indices)
-			table_obj = self.ddb.Table(table_name)
-			schema = self._get_or_describe_schema(table_name, action_def.get("key_schema"))
+			self._resolve(prepared)
 
-			method_upper = method.upper().strip()
 			if method_upper == "GET":
-				return self._handle_get(action_def, table_obj, schema, validated, data_dict)
-			elif method_upper == "POST":
-				return self._handle_post(table_obj, schema, validated)
-			elif method_upper == "PATCH":
-				return self._handle_patch(table_obj, schema, validated)
-			elif method_upper == "DELETE":
-				return self._handle_delete(table_obj, schema, validated)
+				return self._handle_get(prepared, validated, data_dict)
+			elif method_upper in ("POST", "PATCH", "DELETE"):
+				try:
+					if method_upper == "POST":
+						return self._handle_post(prepared, validated)
+					elif method_upper == "PATCH":
+						return self._handle_patch(prepared, validated)
+					return self._handle_delete(prepared, validated)
+				finally:
+					# Decisions read from this table may have changed
+					self.invalidate_auth_cache(prepared.table_name)
 			else:
 				return self._error("bad_request", f"Unsupported method: {method}")
 		except ClientError as e:
@@ -122,6 +401,101 @@ class DynamoDBActionProcessor:
 			# Unknown error; do not leak stack traces
 			return self._error("internal_error", "Unexpected error", details=str(e))
 
+	def prepare(self, action_def: Dict[str, Any]) -> PreparedAction:
+		"""
+		Compile an action definition once: field specs, auth, and (on first use) the table handle,
+		key schema and expression templates. Results are cached per action_def object, so edits
+		to an action_def after it has been used are not seen.
+
+		:param action_def: The action definition from the API schema (see class docstring)
+		:return: PreparedAction
+		"""
+		prepared = self._prepared.get(id(action_def))
+		if prepared is not None and prepared.action_def is action_def:
+			return prepared
+		prepared = PreparedAction(action_def)
+		if len(self._prepared) >= prepared_cache_size:
+			self._prepared.pop(next(iter(self._prepared)))
+		self._prepared[id(action_def)] = prepared
+		return prepared
+
+	def invalidate_auth_cache(self, table_name: Optional[str] = None) -> None:
+		"""
+		Drop cached auth decisions read from an auth table, or from all auth tables. Writes through
+		process() do this automatically; call it after writing an auth table some other way.
+
+		:param table_name: auth table name; None for all
+		"""
+		if table_name is None:
+			for cache in self._auth_caches.values():
+				cache.invalidate()
+		elif table_name in self._auth_caches:
+			self._auth_caches[table_name].invalidate()
+
+	def prepare_schema(self, api_schema: Dict[str, Any], warmup: bool = True) -> Dict[str, Any]:
+		"""
+		Prepare every ddb action in an API schema when it loads, so no request pays for compiling.
+		With warmup, tables are described concurrently first (see warmup()) and each action's key
+		schema and templates are resolved up front.
+
+		:param api_schema: {route: {method: action_def}}, as passed to moses_common.api.API
+		:param warmup: describe tables and resolve templates now rather than on first use
+		:return: warmup() result, or {} without warmup
+		"""
+		result: Dict[str, Any] = {}
+		if warmup:
+			result = self.warmup(api_schema)
+		for methods in (api_schema or {}).values():
+			if not isinstance(methods, dict):
+				continue
+			for action_def in methods.values():
+				if not isinstance(action_def, dict) or action_def.get("source") != "ddb":
+					continue
+				prepared = self.prepare(action_def)
+				if warmup and not prepared.error and prepared.table_name not in result.get("errors", {}):
+					self._resolve(prepared)
+		return result
+
+	def warmup(self, api_schema: Dict[str, Any], workers: int = 8, cache_file: Optional[str] = None) -> Dict[str, Any]:
+		"""
+		Describe every table the API schema's actions use (table_name and auth.table_name) concurrently,
+		filling the schema cache so the first request on each route doesn't pay for DescribeTable.
+		Tables whose key_schema is declared in the action, or that are already cached, are skipped.
+		DescribeTable results are shared with moses_common.dynamodb.describe_table().
+
+		:param api_schema: {route: {method: action_def}}, as passed to moses_common.api.API
+		:param workers: maximum concurrent DescribeTable calls
+		:param cache_file: DescribeTable snapshot to load from and save to; defaults to
+			moses_common.dynamodb.table_info_snapshot_file
+		:return: {"described": [...], "cached": [...], "errors": {table_name: message}}
+		"""
+		cache_file = cache_file or moses_common.dynamodb.table_info_snapshot_file
+		if cache_file:
+			moses_common.dynamodb.load_table_info_snapshot(cache_file)
+
+		table_names = self._get_schema_table_names(api_schema)
+		result: Dict[str, Any] = {
+			"described": [],
+			"cached": [name for name in table_names if name in self._schema_cache],
+			"errors": {}
+		}
+		pending = [name for name in table_names if name not in self._schema_cache]
+		if pending:
+			with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+				futures = [(name, executor.submit(self._describe_schema, name)) for name in pending]
+				for name, future in futures:
+					try:
+						self._schema_cache[name] = future.result()
+						result["described"].append(name)
+					except ClientError as e:
+						result["errors"][name] = e.response.get("Error", {}).get("Message", str(e))
+					except ConnectionError as e:
+						result["errors"][name] = str(e)
+			if cache_file and result["described"]:
+				moses_common.dynamodb.save_table_info_snapshot(cache_file)
+		self.ui.debug_payload("warmup", result)
+		return result
+
 	# ---------- Internal helpers ----------
 
 	def _merge_inputs(self, path_vars: Dict[str, Any], data_dict: Dict[str, Any]) -> Dict[str, Any]:
@@ -141,7 +515,8 @@ class DynamoDBActionProcessor:
 			"table": {"pk": "pk_name", "sk": "sk_name_or_None"},
 			"indices": {"IndexName": {"pk": "...", "sk": "... or None"}, ...}
 		}
-		If declared_key_schema is present, use it; otherwise DescribeTable (cached).
+		If declared_key_schema is present, use it; otherwise DescribeTable through
+		moses_common.dynamodb.describe_table(), which caches it across processors.
 		"""
 		if declared_key_schema:
 			# Normalize to our internal shape
@@ -155,7 +530,14 @@ class DynamoDBActionProcessor:
 		if table_name in self._schema_cache:
 			return self._schema_cache[table_name]
 
-		desc = self.ddb_client.describe_table(TableName=table_name)["Table"]
+		schema = self._describe_schema(table_name)
+		self._schema_cache[table_name] = schema
+		return schema
+
+	def _describe_schema(self, table_name: str) -> Dict[str, Any]:
+		desc = moses_common.dynamodb.describe_table(table_name, client=self.ddb_client)
+		if not desc:
+			raise ConnectionError(f"Failed to describe table '{table_name}'")
 		table_pk, table_sk = self._extract_keypair(desc.get("KeySchema", []))
 		indices: Dict[str, Dict[str, Optional[str]]] = {}
 
@@ -169,12 +551,30 @@ class DynamoDBActionProcessor:
 			pk, sk = self._extract_keypair(lsi.get("KeySchema", []))
 			indices[name] = {"pk": pk, "sk": sk}
 
-		schema = {
+		return {
 			"table": {"pk": table_pk, "sk": table_sk},
 			"indices": indices
 		}
-		self._schema_cache[table_name] = schema
-		return schema
+
+	@staticmethod
+	def _get_schema_table_names(api_schema: Dict[str, Any]) -> List[str]:
+		"""
+		Table names of ddb actions (and their auth blocks) that have no declared key_schema.
+		"""
+		table_names: List[str] = []
+		for methods in (api_schema or {}).values():
+			if not isinstance(methods, dict):
+				continue
+			for action_def in methods.values():
+				if not isinstance(action_def, dict) or action_def.get("source") != "ddb":
+					continue
+				for block in (action_def, action_def.get("auth")):
+					if not isinstance(block, dict):
+						continue
+					table_name = block.get("table_name")
+					if table_name and not block.get("key_schema") and table_name not in table_names:
+						table_names.append(table_name)
+		return table_names
 
 	@staticmethod
 	def _extract_keypair(key_schema_list: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
@@ -186,71 +586,84 @@ class DynamoDBActionProcessor:
 				sk = ks.get("AttributeName")
 		return pk, sk
 
-	def _perform_auth_check(self, auth_block: Dict[str, Any], path_vars: Dict[str, Any], data_dict: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+	def _resolve(self, prepared: PreparedAction) -> None:
+		"""
+		Attach the table handle, key schema and expression templates to a prepared action.
+		Runs once per action; DescribeTable results come from the schema cache.
+		"""
+		if prepared.table is not None:
+			return
+		schema = self._get_or_describe_schema(prepared.table_name, prepared.key_schema)
+		prepared.bind_schema(schema)
+		prepared.table = self.ddb.Table(prepared.table_name)
+
+	def _perform_auth_check(self, auth: PreparedAuth, merged_input: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
 		"""
 		Validate auth input, then Query the auth table (optionally via index).
 		If at least one row matches (after optional attribute filters), auth passes.
 		"""
-		merged = self._merge_inputs(path_vars, data_dict)
-		field_defs = auth_block.get("fields", [])
-		validated, errors = common.check_input(field_defs, merged)
-		if errors:
-			return False, "Auth validation failed"
+		validated, decision = self._start_auth_check(auth, merged_input)
+		if decision is not None:
+			return decision
+		return self._query_auth(auth, validated)
 
-		auth_table_name = auth_block.get("table_name")
-		if not auth_table_name:
-			return False, "Auth misconfigured: missing table_name"
-
-		# Resolve schema for the auth target
-		auth_schema = self._get_or_describe_schema(auth_table_name, auth_block.get("key_schema"))
-		auth_table = self.ddb.Table(auth_table_name)
-		index_name = auth_block.get("index_name")
+	def _start_auth_check(self, auth: PreparedAuth, merged_input: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Tuple[bool, Optional[str]]]]:
+		"""
+		The part of the auth check that doesn't query: validation, resolving the auth table, and
+		the decision cache. Returns (validated, decision); decision is None if _query_auth() is needed.
+		"""
+		validated, errors = common.check_input(auth.field_specs, merged_input)
+		if errors:
+			return validated, (False, "Auth validation failed")
 
-		# Determine keys for query (index if provided, else table)
-		if index_name:
-			index_keys = auth_schema["indices"].get(index_name)
-			if not index_keys:
-				return False, f"Auth misconfigured: unknown index '{index_name}'"
-			pk_name = index_keys.get("pk")
-			sk_name = index_keys.get("sk")
-		else:
-			pk_name = auth_schema["table"].get("pk")
-			sk_name = auth_schema["table"].get("sk")
+		if not auth.table_name:
+			return validated, (False, "Auth misconfigured: missing table_name")
 
-		if not pk_name:
-			return False, "Auth misconfigured: missing partition key"
+		# Resolve schema and templates for the auth target
+		if auth.table is None:
+			auth_schema = self._get_or_describe_schema(auth.table_name, auth.key_schema)
+			auth.bind_schema(auth_schema)
+			auth.table = self.ddb.Table(auth.table_name)
+		if auth.error:
+			return validated, (False, auth.error)
 
 		# Build KeyConditionExpression from provided values
-		if pk_name not in validated:
-			return False, f"Auth requires '{pk_name}'"
-
-		key_cond = Key(pk_name).eq(validated[pk_name])
-		if sk_name and sk_name in validated:
-			key_cond = key_cond & Key(sk_name).eq(validated[sk_name])
-
-		# Build optional FilterExpression for any other provided auth fields
-		filter_expr = None
-		for name in (v[0] for v in field_defs):
-			if name not in (pk_name, sk_name) and name in validated:
-				expr = Attr(name).eq(validated[name])
-				filter_expr = expr if filter_expr is None else (filter_expr & expr)
-
-		kwargs = {
-			"KeyConditionExpression": key_cond
-		}
-		if index_name:
-			kwargs["IndexName"] = index_name
-		if filter_expr is not None:
-			kwargs["FilterExpression"] = filter_expr
+		if auth.key_condition.pk not in validated:
+			return validated, (False, f"Auth requires '{auth.key_condition.pk}'")
+
+		# Cached decision for the same auth values
+		if auth.cache_ttl > 0:
+			cache = self._auth_caches.get(auth.table_name)
+			if cache is not None:
+				found, allowed = cache.get(auth.get_cache_key(validated))
+				if found:
+					return validated, (allowed, None if allowed else "Authorization failed")
+		return validated, None
+
+	def _query_auth(self, auth: PreparedAuth, validated: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+		kwargs = auth.key_condition.bind(validated)
+		# Optional FilterExpression for any other provided auth fields
+		auth.bind_filter(kwargs, validated)
 		kwargs["Limit"] = 1
 
-		resp = auth_table.query(**kwargs)
-		count = resp.get("Count", 0)
-		return (count > 0, None if count > 0 else "Authorization failed")
+		resp = auth.table.query(**kwargs)
+		allowed = resp.get("Count", 0) > 0
+		ttl = auth.cache_ttl if allowed else auth.negative_cache_ttl
+		if auth.cache_ttl > 0 and ttl > 0:
+			cache = self._auth_caches.get(auth.table_name)
+			if cache is None:
+				cache = self._auth_caches.setdefault(auth.table_name, moses_common.dynamodb.ItemCache(max_size=auth_cache_size, ttl=auth.cache_ttl))
+			cache.set(auth.get_cache_key(validated), allowed, ttl=ttl)
+		return (allowed, None if allowed else "Authorization failed")
+
+	def _get_executor(self) -> ThreadPoolExecutor:
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=speculative_workers)
+		return self._executor
 
 	# ---------- Method handlers ----------
 
-	def _handle_get(self, action_def: Dict[str, Any], table, schema: Dict[str, Any], validated: Dict[str, Any], raw_input: Dict[str, Any]) -> Dict[str, Any]:
+	def _handle_get(self, prepared: PreparedAction, validated: Dict[str, Any], raw_input: Dict[str, Any]) -> Dict[str, Any]:
 		"""
 		GET semantics:
 		- If full table key present: GetItem
@@ -261,44 +674,36 @@ class DynamoDBActionProcessor:
 			- If insufficient key info: error
 		Supports 'limit' and 'last_evaluated_key' (raw_input).
 		"""
-		index_name = action_def.get("index_name")
-		table_pk = schema["table"].get("pk")
-		table_sk = schema["table"].get("sk")
+		table_pk = prepared.table_pk
+		table_sk = prepared.table_sk
 
 		# If we have a full table key, try GetItem
 		if table_pk and table_pk in validated and ((table_sk is None) or (table_sk in validated)):
-			key = {table_pk: validated[table_pk]}
-			if table_sk:
-				key[table_sk] = validated[table_sk]
-			resp = table.get_item(Key=key)
+			resp = prepared.table.get_item(Key=prepared.get_key(validated))
+			self.ui.debug_payload("get_item response", resp)
 			item = resp.get("Item")
 			if not item:
 				return self._error("not_found", "Item not found")
 			return {"item": item}
 
 		# Else perform a Query (index or table)
-		if index_name:
-			indices = schema.get("indices", {})
-			idx = indices.get(index_name)
-			if not idx:
-				return self._error("bad_request", f"Unknown index '{index_name}'")
-			pk_name = idx.get("pk")
-			sk_name = idx.get("sk")
+		if prepared.index_name:
+			index_condition = prepared.index_condition
+			if not index_condition:
+				return self._error("bad_request", f"Unknown index '{prepared.index_name}'")
+			pk_name = index_condition.pk
 			if not pk_name or pk_name not in validated:
 				return self._error("bad_request", f"Missing required index partition key '{pk_name}'")
-			key_cond = Key(pk_name).eq(validated[pk_name])
-			if sk_name and sk_name in validated:
-				key_cond = key_cond & Key(sk_name).eq(validated[sk_name])
-			return self._paged_query(table, key_cond, raw_input, index_name=index_name)
+			return self._query(prepared, index_condition.bind(validated), raw_input)
 
 		# Query base table by PK if possible
 		if table_pk and table_pk in validated:
 			if table_sk:
-				key_cond = Key(table_pk).eq(validated[table_pk])
-				return self._paged_query(table, key_cond, raw_input, index_name=None)
+				return self._query(prepared, prepared.partition_condition.bind(validated), raw_input)
 			else:
 				# No SK in table: a GetItem by PK is correct for a single row table
-				resp = table.get_item(Key={table_pk: validated[table_pk]})
+				resp = prepared.table.get_item(Key={table_pk: validated[table_pk]})
+				self.ui.debug_payload("get_item response", resp)
 				item = resp.get("Item")
 				if not item:
 					return self._error("not_found", "Item not found")
@@ -306,14 +711,32 @@ class DynamoDBActionProcessor:
 
 		return self._error("bad_request", "Insufficient key information for GET")
 
-	def _handle_post(self, table, schema: Dict[str, Any], validated: Dict[str, Any]) -> Dict[str, Any]:
-		table_pk = schema["table"].get("pk")
-		table_sk = schema["table"].get("sk")
-		if not table_pk:
+	def _handle_speculative_get(self, prepared: PreparedAction, validated: Dict[str, Any], raw_input: Dict[str, Any], auth_validated: Dict[str, Any]) -> Dict[str, Any]:
+		"""
+		GET with the auth query running on a worker thread while the read runs here, so the
+		request takes about one round trip instead of two. The read's result (data, not_found or
+		an error) is dropped if auth fails.
+		"""
+		future = self._get_executor().submit(self._query_auth, prepared.auth, auth_validated)
+		try:
+			self._resolve(prepared)
+			result = self._handle_get(prepared, validated, raw_input)
+		except Exception:
+			auth_ok, auth_err = future.result()
+			if not auth_ok:
+				return self._error("auth_failed", auth_err or "Authorization failed")
+			raise
+		auth_ok, auth_err = future.result()
+		if not auth_ok:
+			return self._error("auth_failed", auth_err or "Authorization failed")
+		return result
+
+	def _handle_post(self, prepared: PreparedAction, validated: Dict[str, Any]) -> Dict[str, Any]:
+		if not prepared.table_pk:
 			return self._error("bad_request", "Table partition key is undefined")
 
 		# Ensure keys are present
-		if table_pk not in validated or (table_sk and table_sk not in validated):
+		if not prepared.has_key(validated):
 			return self._error("bad_request", "Missing required key(s) for create")
 
 		# Build item: include all validated fields
@@ -323,30 +746,22 @@ class DynamoDBActionProcessor:
 		item.setdefault("update_time", now)
 
 		# Conditional: must not already exist
-		cond = f"attribute_not_exists({table_pk})"
-		if table_sk:
-			cond = cond + f" AND attribute_not_exists({table_sk})"
-
 		try:
-			table.put_item(Item=item, ConditionExpression=cond)
+			prepared.table.put_item(Item=item, ConditionExpression=prepared.not_exists_condition)
 			return {"item": item}
 		except ClientError as e:
 			if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
 				return self._error("already_exists", "Item already exists")
 			raise
 
-	def _handle_patch(self, table, schema: Dict[str, Any], validated: Dict[str, Any]) -> Dict[str, Any]:
-		table_pk = schema["table"].get("pk")
-		table_sk = schema["table"].get("sk")
-		if not table_pk:
+	def _handle_patch(self, prepared: PreparedAction, validated: Dict[str, Any]) -> Dict[str, Any]:
+		if not prepared.table_pk:
 			return self._error("bad_request", "Table partition key is undefined")
 
-		if table_pk not in validated or (table_sk and table_sk not in validated):
+		if not prepared.has_key(validated):
 			return self._error("bad_request", "Missing required key(s) for update")
 
-		key = {table_pk: validated[table_pk]}
-		if table_sk:
-			key[table_sk] = validated[table_sk]
+		key = prepared.get_key(validated)
 
 		# Determine non-key fields present in validated
 		non_keys = {k: v for k, v in validated.items() if k not in key}
@@ -354,92 +769,44 @@ class DynamoDBActionProcessor:
 		# Always set update_time
 		non_keys["update_time"] = _utc_now_iso()
 
-		# Build UpdateExpression with SET and DELETE
-		set_expr_parts = []
-		del_expr_names = []
-		expr_attr_names = {}
-		expr_attr_values = {}
-
-		name_counter = 0
-		value_counter = 0
-
-		for field, value in non_keys.items():
-			# Skip keys defensively
-			if field in key:
-				continue
-			if value is None:
-				# DELETE attribute
-				del_expr_names.append(field)
-				continue
-			# SET attribute
-			name_token = f"#n{name_counter}"
-			val_token = f":v{value_counter}"
-			name_counter += 1
-			value_counter += 1
-			expr_attr_names[name_token] = field
-			expr_attr_values[val_token] = value
-			set_expr_parts.append(f"{name_token} = {val_token}")
-
-		if not set_expr_parts and not del_expr_names:
+		# Bind values to the prebuilt SET and REMOVE templates
+		update_expr_str, expr_attr_names, expr_attr_values = prepared.bind_update(non_keys)
+		if not update_expr_str:
 			return self._error("no_fields", "No updatable fields provided")
 
-		update_expr = []
-		if set_expr_parts:
-			update_expr.append("SET " + ", ".join(set_expr_parts))
-		if del_expr_names:
-			# Map each delete name to an expression name
-			del_name_tokens = []
-			for field in del_expr_names:
-				name_token = f"#n{name_counter}"
-				name_counter += 1
-				expr_attr_names[name_token] = field
-				del_name_tokens.append(name_token)
-			update_expr.append("DELETE " + ", ".join(del_name_tokens))
-
-		update_expr_str = " ".join(update_expr)
-
-		# Ensure the item exists
-		cond = f"attribute_exists({table_pk})"
-		if table_sk:
-			cond = cond + f" AND attribute_exists({table_sk})"
+		kwargs: Dict[str, Any] = {
+			"Key": key,
+			"UpdateExpression": update_expr_str,
+			"ExpressionAttributeNames": expr_attr_names,
+			# Ensure the item exists
+			"ConditionExpression": prepared.exists_condition,
+			"ReturnValues": "ALL_NEW"
+		}
+		if expr_attr_values:
+			kwargs["ExpressionAttributeValues"] = expr_attr_values
 
 		try:
-			resp = table.update_item(
-				Key=key,
-				UpdateExpression=update_expr_str,
-				ExpressionAttributeNames=expr_attr_names or None,
-				ExpressionAttributeValues=expr_attr_values or None,
-				ConditionExpression=cond,
-				ReturnValues="ALL_NEW"
-			)
+			resp = prepared.table.update_item(**kwargs)
 			return {"item": resp.get("Attributes")}
 		except ClientError as e:
 			if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
 				return self._error("not_found", "Item not found")
 			raise
 
-	def _handle_delete(self, table, schema: Dict[str, Any], validated: Dict[str, Any]) -> Dict[str, Any]:
-		table_pk = schema["table"].get("pk")
-		table_sk = schema["table"].get("sk")
-		if not table_pk:
+	def _handle_delete(self, prepared: PreparedAction, validated: Dict[str, Any]) -> Dict[str, Any]:
+		if not prepared.table_pk:
 			return self._error("bad_request", "Table partition key is undefined")
 
-		if table_pk not in validated or (table_sk and table_sk not in validated):
+		if not prepared.has_key(validated):
 			return self._error("bad_request", "Missing required key(s) for delete")
 
-		key = {table_pk: validated[table_pk]}
-		if table_sk:
-			key[table_sk] = validated[table_sk]
+		key = prepared.get_key(validated)
 
 		# Ensure exists; return deleted key on success
-		cond = f"attribute_exists({table_pk})"
-		if table_sk:
-			cond = cond + f" AND attribute_exists({table_sk})"
-
 		try:
-			resp = table.delete_item(
+			resp = prepared.table.delete_item(
 				Key=key,
-				ConditionExpression=cond,
+				ConditionExpression=prepared.exists_condition,
 				ReturnValues="ALL_OLD"
 			)
 			if "Attributes" not in resp:
@@ -451,18 +818,282 @@ class DynamoDBActionProcessor:
 				return self._error("not_found", "Item not found")
 			raise
 
-	# ---------- Query/pagination helpers ----------
+	# ---------- Batch handlers ----------
 
-	def _paged_query(self, table, key_condition, raw_input: Dict[str, Any], index_name: Optional[str]) -> Dict[str, Any]:
-		kwargs: Dict[str, Any] = {"KeyConditionExpression": key_condition}
-		if index_name:
-			kwargs["IndexName"] = index_name
+	def _process_batch(self, method_upper: str, prepared: PreparedAction, path_vars: Dict[str, Any], data_dict: Dict[str, Any]) -> Dict[str, Any]:
+		"""
+		Batch action: data_dict["items"] is a list of elements, each validated and auth-checked
+		like a single request (path vars and other top-level inputs apply to every element).
+
+		- GET reads the elements' keys with BatchGetItem
+		- POST, PATCH and DELETE write all elements in one TransactWriteItems, all or nothing, with
+		  the same conditions as single requests
+		- With "atomic": false, DELETE uses BatchWriteItem instead, each element succeeding or failing
+		  on its own. BatchWriteItem has no conditions, so the keys are read first and missing ones
+		  are reported not_found without being deleted; an item deleted by another request between
+		  the read and the write is still reported deleted. POST batches must be atomic, since a
+		  plain put would overwrite an existing item instead of failing like a single create
+
+		:return: {"results": [...], "count": successes}; one single-request style result per element
+		"""
+		if method_upper not in ("GET", "POST", "PATCH", "DELETE"):
+			return self._error("bad_request", f"Unsupported method: {method_upper}")
+		elements = (data_dict or {}).get("items")
+		if not isinstance(elements, list) or not elements:
+			return self._error("bad_request", "Batch requires a non-empty 'items' list")
+		atomic = method_upper == "PATCH" or (method_upper != "GET" and prepared.atomic)
+		max_items = prepared.batch_max
+		if atomic:
+			max_items = min(max_items, moses_common.dynamodb.transact_max_items)
+		if len(elements) > max_items:
+			return self._error("bad_request", f"Batch is limited to {max_items} items")
+		if method_upper == "POST" and not atomic:
+			return self._error("bad_request", "POST batches must be atomic")
+
+		results: List[Optional[Dict[str, Any]]] = [None] * len(elements)
+		valid = self._validate_batch(prepared, elements, path_vars, data_dict, results)
+
+		self._resolve(prepared)
+		if not prepared.table_pk:
+			return self._error("bad_request", "Table partition key is undefined")
 
-		# Pagination inputs: limit, last_evaluated_key
-		limit = raw_input.get("limit")
-		if isinstance(limit, int) and limit > 0:
-			kwargs["Limit"] = limit
+		# One operation per item per request
+		seen: Dict[Tuple[Any, ...], int] = {}
+		unique = []
+		for index, validated in valid:
+			if not prepared.has_key(validated):
+				results[index] = self._error("bad_request", "Missing required key(s)")
+				continue
+			key_id = self._get_key_id(prepared, prepared.get_key(validated))
+			if key_id in seen and method_upper != "GET":
+				results[index] = self._error("bad_request", "Duplicate key in batch", details={"item": seen[key_id]})
+				continue
+			seen.setdefault(key_id, index)
+			unique.append((index, validated))
+
+		if method_upper == "GET":
+			self._batch_get(prepared, unique, results)
+		else:
+			try:
+				if atomic and len(unique) < len(elements):
+					# Something already failed, so nothing is written
+					for index, validated in unique:
+						results[index] = self._error("transaction_canceled", "Not written; another item in the batch failed")
+				elif atomic:
+					self._batch_transact(method_upper, prepared, unique, results)
+				else:
+					self._batch_delete(prepared, unique, results)
+			finally:
+				self.invalidate_auth_cache(prepared.table_name)
+
+		return {
+			"results": results,
+			"count": sum(1 for result in results if result and "errors" not in result)
+		}
+
+	def _validate_batch(self, prepared: PreparedAction, elements: List[Any], path_vars: Dict[str, Any], data_dict: Dict[str, Any], results: List[Optional[Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+		"""
+		Validate and auth-check each element; failures are written to results.
+		Auth queries are shared between elements with the same auth values.
+		"""
+		shared = {k: v for k, v in data_dict.items() if k != "items"}
+		decisions: Dict[str, Tuple[bool, Optional[str]]] = {}
+		valid = []
+		for index, element in enumerate(elements):
+			if not isinstance(element, dict):
+				results[index] = self._error("bad_request", "Batch items must be objects")
+				continue
+			merged_input = self._merge_inputs(path_vars, dict(shared, **element))
+			validated, input_errors = common.check_input(prepared.field_specs, merged_input)
+			if input_errors:
+				results[index] = self._error("bad_request", "Validation failed", details=input_errors)
+				continue
+			if prepared.auth:
+				auth_validated, decision = self._start_auth_check(prepared.auth, merged_input)
+				if decision is None:
+					cache_key = prepared.auth.get_cache_key(auth_validated)
+					decision = decisions.get(cache_key)
+					if decision is None:
+						decision = decisions[cache_key] = self._query_auth(prepared.auth, auth_validated)
+				if not decision[0]:
+					results[index] = self._error("auth_failed", decision[1] or "Authorization failed")
+					continue
+			valid.append((index, validated))
+		return valid
+
+	@staticmethod
+	def _get_key_id(prepared: PreparedAction, key: Dict[str, Any]) -> Tuple[Any, ...]:
+		# Serialized values, so 1 and Decimal('1') match
+		return tuple(tuple(_serializer.serialize(key[name]).items())[0] for name in prepared.key_names)
 
+	@staticmethod
+	def _serialize(record: Dict[str, Any]) -> Dict[str, Any]:
+		return {name: _serializer.serialize(value) for name, value in record.items()}
+
+	@staticmethod
+	def _get_raw_key_id(prepared: PreparedAction, raw: Dict[str, Any]) -> Tuple[Any, ...]:
+		# Same as _get_key_id() for an item or key already in low-level format
+		return tuple(tuple(raw[name].items())[0] for name in prepared.key_names)
+
+	def _batch_read(self, prepared: PreparedAction, keys: List[Dict[str, Any]], keys_only: bool = False) -> Tuple[Dict[Tuple[Any, ...], Dict[str, Any]], set]:
+		"""
+		BatchGetItem the keys (low-level format) in chunks, retrying UnprocessedKeys.
+
+		:return: (found raw items by key id, ids of keys still unprocessed after batch_max_retries)
+		"""
+		found: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+		unprocessed: set = set()
+		projection: Dict[str, Any] = {}
+		if keys_only:
+			projection = {
+				"ProjectionExpression": ", ".join(f"#k{i}" for i in range(len(prepared.key_names))),
+				"ExpressionAttributeNames": {f"#k{i}": name for i, name in enumerate(prepared.key_names)}
+			}
+		chunk_size = moses_common.dynamodb.batch_get_max_keys
+		for start in range(0, len(keys), chunk_size):
+			request = {prepared.table_name: dict(projection, Keys=keys[start:start + chunk_size])}
+			attempt = 0
+			while request:
+				resp = self.ddb_client.batch_get_item(RequestItems=request)
+				for raw in resp.get("Responses", {}).get(prepared.table_name, []):
+					found[self._get_raw_key_id(prepared, raw)] = raw
+				request = resp.get("UnprocessedKeys") or {}
+				if request:
+					attempt += 1
+					if attempt > moses_common.dynamodb.batch_max_retries:
+						unprocessed.update(self._get_raw_key_id(prepared, raw) for raw in request[prepared.table_name]["Keys"])
+						break
+					time.sleep(moses_common.dynamodb._backoff_delay(attempt))
+		return found, unprocessed
+
+	def _batch_get(self, prepared: PreparedAction, elements: List[Tuple[int, Dict[str, Any]]], results: List[Optional[Dict[str, Any]]]) -> None:
+		indexes_by_key: Dict[Tuple[Any, ...], List[int]] = {}
+		keys = []
+		for index, validated in elements:
+			key = prepared.get_key(validated)
+			key_id = self._get_key_id(prepared, key)
+			if key_id not in indexes_by_key:
+				indexes_by_key[key_id] = []
+				keys.append(self._serialize(key))
+			indexes_by_key[key_id].append(index)
+
+		found, unprocessed_ids = self._batch_read(prepared, keys)
+		for key_id, indexes in indexes_by_key.items():
+			if key_id in found:
+				result = {"item": {name: _deserializer.deserialize(value) for name, value in found[key_id].items()}}
+			elif key_id in unprocessed_ids:
+				result = self._error("throttled", "Throughput exceeded")
+			else:
+				result = self._error("not_found", "Item not found")
+			for index in indexes:
+				results[index] = result
+
+	def _batch_transact(self, method_upper: str, prepared: PreparedAction, elements: List[Tuple[int, Dict[str, Any]]], results: List[Optional[Dict[str, Any]]]) -> None:
+		transact_items = []
+		successes = []
+		now = _utc_now_iso()
+		for index, validated in elements:
+			key = prepared.get_key(validated)
+			if method_upper == "POST":
+				item = dict(validated)
+				item.setdefault("create_time", now)
+				item.setdefault("update_time", now)
+				transact_items.append({"Put": {
+					"TableName": prepared.table_name,
+					"Item": self._serialize(item),
+					"ConditionExpression": prepared.not_exists_condition
+				}})
+				successes.append({"item": item})
+			elif method_upper == "PATCH":
+				non_keys = {k: v for k, v in validated.items() if k not in key}
+				non_keys["update_time"] = now
+				update_expr_str, expr_attr_names, expr_attr_values = prepared.bind_update(non_keys)
+				request = {
+					"TableName": prepared.table_name,
+					"Key": self._serialize(key),
+					"UpdateExpression": update_expr_str,
+					"ExpressionAttributeNames": expr_attr_names,
+					"ConditionExpression": prepared.exists_condition
+				}
+				if expr_attr_values:
+					request["ExpressionAttributeValues"] = self._serialize(expr_attr_values)
+				transact_items.append({"Update": request})
+				successes.append({"updated": key})
+			else:
+				transact_items.append({"Delete": {
+					"TableName": prepared.table_name,
+					"Key": self._serialize(key),
+					"ConditionExpression": prepared.exists_condition
+				}})
+				successes.append({"deleted": key})
+		if not transact_items:
+			return
+
+		try:
+			self.ddb_client.transact_write_items(TransactItems=transact_items)
+		except ClientError as e:
+			if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+				raise
+			reasons = e.response.get("CancellationReasons") or []
+			for position, (index, validated) in enumerate(elements):
+				code = reasons[position].get("Code") if position < len(reasons) else None
+				if code == "ConditionalCheckFailed":
+					if method_upper == "POST":
+						results[index] = self._error("already_exists", "Item already exists")
+					else:
+						results[index] = self._error("not_found", "Item not found")
+				elif code and code != "None":
+					results[index] = self._error("transaction_canceled", reasons[position].get("Message") or "Transaction canceled", details={"code": code})
+				else:
+					results[index] = self._error("transaction_canceled", "Not written; another item in the batch failed")
+			return
+
+		for (index, validated), result in zip(elements, successes):
+			results[index] = result
+
+	def _batch_delete(self, prepared: PreparedAction, elements: List[Tuple[int, Dict[str, Any]]], results: List[Optional[Dict[str, Any]]]) -> None:
+		# BatchWriteItem can't check that an item exists, so read the keys first
+		keys = [self._serialize(prepared.get_key(validated)) for index, validated in elements]
+		found, unprocessed_ids = self._batch_read(prepared, keys, keys_only=True)
+
+		requests = []
+		indexes_by_key: Dict[Tuple[Any, ...], int] = {}
+		for (index, validated), raw_key in zip(elements, keys):
+			key_id = self._get_raw_key_id(prepared, raw_key)
+			if key_id in unprocessed_ids:
+				results[index] = self._error("throttled", "Throughput exceeded")
+			elif key_id not in found:
+				results[index] = self._error("not_found", "Item not found")
+			else:
+				indexes_by_key[key_id] = index
+				requests.append({"DeleteRequest": {"Key": raw_key}})
+				results[index] = {"deleted": prepared.get_key(validated)}
+
+		chunk_size = moses_common.dynamodb.batch_write_max_items
+		for start in range(0, len(requests), chunk_size):
+			request = {prepared.table_name: requests[start:start + chunk_size]}
+			attempt = 0
+			while request:
+				resp = self.ddb_client.batch_write_item(RequestItems=request)
+				request = resp.get("UnprocessedItems") or {}
+				if request:
+					attempt += 1
+					if attempt > moses_common.dynamodb.batch_max_retries:
+						for unprocessed in request[prepared.table_name]:
+							index = indexes_by_key[self._get_raw_key_id(prepared, unprocessed["DeleteRequest"]["Key"])]
+							results[index] = self._error("throttled", "Throughput exceeded")
+						break
+					time.sleep(moses_common.dynamodb._backoff_delay(attempt))
+
+	# ---------- Query/pagination helpers ----------
+
+	def _query(self, prepared: PreparedAction, kwargs: Dict[str, Any], raw_input: Dict[str, Any]) -> Dict[str, Any]:
+		if prepared.stream:
+			return self._streamed_query(prepared, kwargs, raw_input)
+		return self._paged_query(prepared.table, kwargs, raw_input)
+
+	@staticmethod
+	def _get_start_key(raw_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 		lek = raw_input.get("last_evaluated_key")
 		if isinstance(lek, str):
 			# Support JSON-encoded string for convenience
@@ -471,9 +1102,26 @@ class DynamoDBActionProcessor:
 			except Exception:
 				pass
 		if isinstance(lek, dict):
+			return lek
+		return None
+
+	def _paged_query(self, table, kwargs: Dict[str, Any], raw_input: Dict[str, Any]) -> Dict[str, Any]:
+		"""
+		:param kwargs: Query kwargs with the key condition (and IndexName), from _KeyCondition.bind()
+		"""
+
+		# Pagination inputs: limit, last_evaluated_key
+		limit = raw_input.get("limit")
+		if isinstance(limit, int) and limit > 0:
+			kwargs["Limit"] = limit
+
+		lek = self._get_start_key(raw_input)
+		if lek:
 			kwargs["ExclusiveStartKey"] = lek
 
+		self.ui.debug_payload("query request", kwargs)
 		resp = table.query(**kwargs)
+		self.ui.debug_payload("query response", resp)
 		items = resp.get("Items", [])
 		out: Dict[str, Any] = {
 			"items": items,
@@ -485,6 +1133,66 @@ class DynamoDBActionProcessor:
 			out["last_evaluated_key"] = None
 		return out
 
+	def _streamed_query(self, prepared: PreparedAction, kwargs: Dict[str, Any], raw_input: Dict[str, Any]) -> Dict[str, Any]:
+		"""
+		Follow Query pages, serializing each item as one line of NDJSON as it is read, until the
+		results end or the item or byte budget runs out. 'limit' in the input lowers the item budget.
+		"bytes" is the size of the body once JSON-encoded in the response, which the budget limits.
+
+		:return: {"format": "ndjson", "body": "...", "count": n, "bytes": n, "last_evaluated_key": cursor or None}
+		"""
+		max_items = prepared.stream_max_items
+		limit = raw_input.get("limit")
+		if isinstance(limit, int) and limit > 0:
+			max_items = min(max_items, limit)
+		max_bytes = prepared.stream_max_bytes
+
+		lek = self._get_start_key(raw_input)
+		if lek:
+			kwargs["ExclusiveStartKey"] = lek
+
+		lines: List[str] = []
+		size = 0
+		last_item = None
+		cursor = None
+		pages = 0
+		while True:
+			kwargs["Limit"] = max_items - len(lines)
+			resp = prepared.table.query(**kwargs)
+			pages += 1
+			over_budget = False
+			for item in resp.get("Items", []):
+				line = json.dumps(item, default=json_default, separators=(",", ":")) + "\n"
+				# The line is ASCII; encoding it as a JSON string adds the escapes, less the quotes
+				line_size = len(json.dumps(line)) - 2
+				if size + line_size > max_bytes:
+					over_budget = True
+					break
+				lines.append(line)
+				size += line_size
+				last_item = item
+			if over_budget:
+				if last_item is None:
+					return self._error("payload_too_large", "Item is larger than the stream byte budget", details={"max_bytes": max_bytes})
+				# Resume after the last item sent
+				cursor = {name: last_item[name] for name in prepared.cursor_names if name in last_item}
+				break
+			cursor = resp.get("LastEvaluatedKey")
+			if not cursor or len(lines) >= max_items:
+				break
+			kwargs["ExclusiveStartKey"] = cursor
+		self.ui.debug_payload("streamed query", {"pages": pages, "count": len(lines), "bytes": size})
+
+		if cursor:
+			cursor = json.loads(json.dumps(cursor, default=json_default))
+		return {
+			"format": "ndjson",
+			"body": "".join(lines),
+			"count": len(lines),
+			"bytes": size,
+			"last_evaluated_key": cursor or None
+		}
+
 	# ---------- Error helpers ----------
 
 	def _handle_client_error(self, e: ClientError) -> Dict[str, Any]:
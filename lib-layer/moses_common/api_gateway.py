@@ -450,6 +450,7 @@ class Request:
 	def format_response(self, output, type='json'):
 		"""
 		output = api.format_response(output, 'json')
+		output = api.format_response(result['body'], 'ndjson')  # Streamed DynamoDBActionProcessor result
 		"""
 		content_type = ''
 		body = output
@@ -461,6 +462,8 @@ class Request:
 			body = json.dumps(output)
 		elif type == 'text':
 			content_type = "text/plain"
+		elif type == 'ndjson':
+			content_type = "application/x-ndjson"
 		else:
 			raise("Invalid type '{}' passed to aws.api_gateway.format_response()".format(type))
 
@@ -510,6 +513,7 @@ class Request:
 		query_string = self.get_query()
 		page_size = None
 		page_number = None
+		cursor = None
 		order_by = None
 		if query_string and type(query_string) is dict:
 			if 'page_size' in query_string:
@@ -520,6 +524,8 @@ class Request:
 					page_number = int(query_string['page_number'])
 					if page_number < 1:
 						page_number = 1
+			if 'cursor' in query_string and query_string['cursor']:
+				cursor = str(query_string['cursor'])
 			if 'order_by' in query_string:
 				order_parts = query_string['order_by'].split(',')
 				order_by = []
@@ -539,7 +545,11 @@ class Request:
 			pagination['limit'] = page_size
 		if page_number:
 			pagination['page_number'] = page_number
-		if offset:
+		if cursor:
+			# A cursor replaces page_number/offset
+			pagination['cursor'] = cursor
+			pagination.pop('page_number', None)
+		elif offset:
 			pagination['offset'] = offset
 		if order_by:
 			pagination['order_by'] = order_by
@@ -566,7 +576,13 @@ class Request:
 			offset = int(page_size * (page_number-1)) + 1
 		return limit, offset
 
-	def get_pagination_links(self, count=None, pagination={}):
+	"""
+	Page number links:
+	meta_data = api.get_pagination_links(count, pagination)
+	Cursor links, using next_cursor from dynamodb query_page():
+	meta_data = api.get_pagination_links(count, pagination, next_cursor=next_cursor)
+	"""
+	def get_pagination_links(self, count=None, pagination={}, next_cursor=None):
 		if count and (type(count) is int or type(count) is str):
 			count = int(count)
 		if type(count) is None:
@@ -576,6 +592,10 @@ class Request:
 		}
 
 		if not pagination or type(pagination) is not dict:
+			pagination = {}
+		if next_cursor or pagination.get('cursor'):
+			return self.get_cursor_links(count, pagination, next_cursor)
+		if not pagination:
 			return meta_data
 		page_size = None
 		if 'page_size' in pagination and (type(pagination['page_size']) is int or type(pagination['page_size']) is str):
@@ -637,6 +657,56 @@ class Request:
 
 		return meta_data
 
+	"""
+	Cursor pages only link forward, so there is no last page or previous page.
+	meta_data = api.get_cursor_links(count, pagination, next_cursor)
+	"""
+	def get_cursor_links(self, count=None, pagination={}, next_cursor=None):
+		meta_data = {}
+		if count is not None:
+			meta_data['count'] = count
+		
+		params = []
+		if pagination and 'page_size' in pagination and (type(pagination['page_size']) is int or type(pagination['page_size']) is str):
+			page_size = int(pagination['page_size'])
+			if page_size > 0:
+				meta_data['page_size'] = page_size
+				params.append("page_size={}".format(page_size))
+		if pagination:
+			order_by = self._get_order_by_param(pagination)
+			if order_by:
+				params.append(order_by)
+		
+		path = self.path
+		meta_data['pagination_links'] = {
+			"first_page": path
+		}
+		if params:
+			meta_data['pagination_links']['first_page'] = "{}?{}".format(path, '&'.join(params))
+		if next_cursor:
+			meta_data['next_cursor'] = next_cursor
+			params.insert(0, "cursor={}".format(urllib.parse.quote(next_cursor, safe="")))
+			meta_data['pagination_links']['next_page'] = "{}?{}".format(path, '&'.join(params))
+		return meta_data
+
+	"""
+	order_by = api._get_order_by_param(pagination)  # 'order_by=field%20asc,field2%20desc' or ''
+	"""
+	def _get_order_by_param(self, pagination):
+		order_by = ''
+		if 'order_by' in pagination:
+			for element in pagination['order_by']:
+				order = 'asc'
+				if 'order' in element and element['order'] == 'desc':
+					order = 'desc'
+				if 'field' in element:
+					if len(order_by):
+						order_by += ','
+					else:
+						order_by = 'order_by='
+					order_by += "{}%20{}".format(element['field'], order)
+		return order_by
+
 
 class API:
 	"""
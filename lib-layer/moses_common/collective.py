@@ -13,12 +13,14 @@ import moses_common.google_search
 import moses_common.openai
 import moses_common.ui
 
-settings_table = moses_common.dynamodb.Table('artintelligence.gallery-settings')
-artist_table = moses_common.dynamodb.Table('artintelligence.gallery-collective')
+settings_table = moses_common.dynamodb.Table('artintelligence.gallery-settings', lazy=True)
+artist_table = moses_common.dynamodb.Table('artintelligence.gallery-collective', lazy=True)
 artist_list = None
-genres_table = moses_common.dynamodb.Table('artintelligence.gallery-works')
+genres_table = moses_common.dynamodb.Table('artintelligence.gallery-works', lazy=True)
 genres_list = None
 unique_genre_names = None
+# Last stream sequence number applied per (table name, key), so replayed or late records are skipped
+stream_sequences = {}
 
 """
 import moses_common.collective as collective
@@ -75,20 +77,18 @@ class Collective:
 		global artist_list
 		
 		if not artist_list or self.artists_were_updated():
-			artist_records = artist_table.scan()
-			artist_records = sorted(artist_records, key=lambda artist: artist['sort_name'])
-			
 			self.artists_last_update = common.get_dt_now()
 			
-			artist_list = []
-			for artist_data in artist_records:
+			artists = []
+			for artist_data in artist_table.iter_scan():
 				artist = Artist(
 					self,
 					artist_data,
 					log_level = self.log_level,
 					dry_run = self.dry_run
 				)
-				artist_list.append(artist)
+				artists.append(artist)
+			artist_list = sorted(artists, key=lambda artist: artist.sort_name)
 		return artist_list
 	
 	@property
@@ -118,7 +118,7 @@ class Collective:
 		return genres_list
 	
 	def get_all_artist_ids(self):
-		artists_ids = artist_table.get_keys_as_list()
+		artists_ids = artist_table.get_keys_as_list(segments=4)
 		return artists_ids
 	
 	def get_artist_by_id(self, artist_id):
@@ -136,6 +136,76 @@ class Collective:
 				return artist
 		return None
 	
+	"""
+	Applies a DynamoDB Streams event from the collective or works table to the loaded artist and
+	genre lists, so a warm container sees the change without rescanning either table.
+	Lists that haven't been loaded yet are left alone; they load in full on first use.
+	A record older than one already applied for the same key is skipped.
+	collective.apply_stream_event(event)
+	"""
+	def apply_stream_event(self, event):
+		global artist_list, genres_list
+		
+		artist_changes = artist_table.convert_stream_records(event)
+		if artist_changes and artist_list:
+			artists = { artist.id: artist for artist in artist_list }
+			for change in artist_changes:
+				if not self._is_new_stream_change(artist_table, change):
+					continue
+				artist_id = change['key'].get('id')
+				data = self._get_stream_data(artist_table, change)
+				if data is None:
+					artists.pop(artist_id, None)
+				elif artist_id in artists:
+					artists[artist_id].data = data
+				else:
+					artists[artist_id] = Artist(self, data, log_level=self.log_level, dry_run=self.dry_run)
+			artist_list = sorted(artists.values(), key=lambda artist: artist.sort_name)
+			self.artists_last_update = common.get_dt_now()
+		
+		genre_changes = genres_table.convert_stream_records(event)
+		if genre_changes and genres_list:
+			genres = { (genre.artist_id, genre.name): genre for genre in genres_list }
+			for change in genre_changes:
+				if not self._is_new_stream_change(genres_table, change):
+					continue
+				genre_id = (change['key'].get('artist_id'), change['key'].get('name'))
+				data = self._get_stream_data(genres_table, change)
+				if data is None:
+					genres.pop(genre_id, None)
+				elif genre_id in genres:
+					genres[genre_id].data = data
+				else:
+					artist = self.get_artist_by_id(data.get('artist_id'))
+					if artist:
+						genres[genre_id] = Genre(artist, data, log_level=self.log_level, dry_run=self.dry_run)
+			genres_list = sorted(genres.values(), key=lambda genre: genre.name)
+			self.genres_last_update = common.get_dt_now()
+	
+	def _is_new_stream_change(self, table, change):
+		if change['sequence'] is None:
+			return True
+		stream_id = (table.name,) + table.split_key(change['key'])
+		if stream_id in stream_sequences and change['sequence'] <= stream_sequences[stream_id]:
+			return False
+		stream_sequences[stream_id] = change['sequence']
+		return True
+	
+	def _get_stream_data(self, table, change):
+		if change['event'] == 'REMOVE':
+			return None
+		if change['new'] is not None:
+			return change['new']
+		# KEYS_ONLY or OLD_IMAGE stream
+		return table.get_item(*table.split_key(change['key']))
+	
+	def _set_last_update(self, name):
+		# Stored and compared as the same string, so the condition orders them as times
+		now = common.convert_datetime_to_string(common.get_dt_now())
+		# Never move the timestamp back if another writer stored a later one
+		if not settings_table.update_item({ "name": name, "value": now }, condition={ "name": "value", "operator": "<", "value": now }):
+			settings_table.put_item({ "name": name, "value": now }, condition='not_exists')
+	
 	def artists_were_updated(self):
 		if self.artists_last_checked + datetime.timedelta(minutes=2) > common.get_dt_now():
 # 			print("artists recently checked")
@@ -150,10 +220,7 @@ class Collective:
 		return False
 	
 	def set_artists_update(self):
-		settings_table.update_item({
-			"name": "artists_last_update",
-			"value": common.get_dt_now()
-		})
+		self._set_last_update('artists_last_update')
 		self.artists_last_checked = common.get_dt_past(1)
 	
 	def genres_were_updated(self):
@@ -170,10 +237,7 @@ class Collective:
 		return False
 	
 	def set_genres_update(self):
-		settings_table.update_item({
-			"name": "genres_last_update",
-			"value": common.get_dt_now()
-		})
+		self._set_last_update('genres_last_update')
 		self.genres_last_checked = common.get_dt_past(1)
 	
 	def images_were_read(self):
@@ -194,10 +258,7 @@ class Collective:
 		return False
 	
 	def set_images_update(self):
-		settings_table.update_item({
-			"name": "images_last_update",
-			"value": common.get_dt_now()
-		})
+		self._set_last_update('images_last_update')
 		self.images_last_checked = common.get_dt_past(1)
 	
 	def choose_category(self, tags):
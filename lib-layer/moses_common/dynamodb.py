@@ -1,15 +1,61 @@
 # print("Loaded DynamoDB module")
 
+import base64
 import boto3
+import collections
+import copy
 import datetime
+import decimal
+import heapq
+import json
+import os
+import queue
+import random
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from boto3.dynamodb.conditions import Key, Attr
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
 
 import moses_common.__init__ as common
 import moses_common.ui
 
-boto3_client = boto3.client('dynamodb', region_name="us-west-2")
+# botocore's own retries are turned off so that Table._request() sees every throttle and
+# owns the retry policy; retrying in both layers would multiply the attempts
+client_config = Config(retries={ "total_max_attempts": 1 })
+
+boto3_client = boto3.client('dynamodb', region_name="us-west-2", config=client_config)
+
+# Limits set by DynamoDB
+batch_get_max_keys = 100
+batch_write_max_items = 25
+
+# Retries for unprocessed batch keys/items
+batch_max_retries = 8
+transact_max_items = 100
+
+# Throttled requests, server errors and dropped connections are retried with full-jitter
+# backoff, up to throttle_max_retries times
+throttle_error_codes = ['ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded']
+transient_error_codes = ['InternalServerError', 'ServiceUnavailable']
+throttle_max_retries = 8
+
+# Key conditions kept by a Table's query_count() cache (see Table count_cache_ttl)
+count_cache_size = 256
+
+# Seconds that DescribeTable results are shared between Table instances
+table_info_ttl = 300
+
+# Optional JSON snapshot of DescribeTable results, e.g. '/tmp/dynamodb_tables.json',
+# so cold starts in the same sandbox can skip DescribeTable
+table_info_snapshot_file = None
+
+_table_info_cache = {}
+_table_info_lock = threading.Lock()
+_table_info_snapshot_loaded = False
 
 def is_valid_name(name):
 	if type(name) is not str:
@@ -18,15 +64,306 @@ def is_valid_name(name):
 		return False
 	return True
 
+"""
+Exponential backoff with full jitter
+seconds = _backoff_delay(attempt)
+"""
+def _backoff_delay(attempt, base=0.05, cap=5.0):
+	return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+"""
+Returns 'throttle' or 'transient' for errors that are worth retrying, otherwise None.
+retry_kind = _get_retry_kind(error)
+"""
+def _get_retry_kind(error):
+	if isinstance(error, ClientError):
+		code = error.response.get('Error', {}).get('Code')
+		if code in throttle_error_codes:
+			return 'throttle'
+		if code in transient_error_codes or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500:
+			return 'transient'
+		return None
+	if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+		return 'transient'
+	return None
+
+"""
+units = _get_consumed_capacity(response)
+"""
+def _get_consumed_capacity(response):
+	consumed = response.get('ConsumedCapacity')
+	if type(consumed) is dict:
+		consumed = [consumed]
+	if type(consumed) is not list:
+		return None
+	units = 0
+	for table_consumed in consumed:
+		units += table_consumed.get('CapacityUnits') or 0
+	return units
+
+"""
+chunks = _chunk_list(items, size)
+"""
+def _chunk_list(items, size):
+	return [items[i:i + size] for i in range(0, len(items), size)]
+
+"""
+Attribute value codec
+
+Values are converted by looking up their exact type in a table of converters rather than
+walking a chain of type checks. Types without a converter are stored as strings.
+
+Numbers: int, float and decimal.Decimal are written as N using str(), which round-trips
+floats exactly and keeps a Decimal's digits. N values are read back as int when the text has
+no decimal point or exponent, and as float otherwise.
+
+attribute_value = _convert_to_attribute_value(value)
+value = _convert_from_attribute_value(attribute_value)
+"""
+def _convert_string_to_attribute_value(value):
+	return { 'S': value }
+
+def _convert_number_to_attribute_value(value):
+	return { 'N': str(value) }
+
+def _convert_bool_to_attribute_value(value):
+	return { 'BOOL': value }
+
+def _convert_none_to_attribute_value(value):
+	return { 'NULL': True }
+
+def _convert_other_to_attribute_value(value):
+	return { 'S': str(value) }
+
+def _convert_dict_to_attribute_value(value):
+	get_converter = _to_attribute_value_converters.get
+	return { 'M': { key: get_converter(type(item), _convert_other_to_attribute_value)(item) for key, item in value.items() } }
+
+def _convert_list_to_attribute_value(value):
+	get_converter = _to_attribute_value_converters.get
+	return { 'L': [ get_converter(type(item), _convert_other_to_attribute_value)(item) for item in value ] }
+
+_to_attribute_value_converters = {
+	str: _convert_string_to_attribute_value,
+	int: _convert_number_to_attribute_value,
+	float: _convert_number_to_attribute_value,
+	decimal.Decimal: _convert_number_to_attribute_value,
+	bool: _convert_bool_to_attribute_value,
+	type(None): _convert_none_to_attribute_value,
+	dict: _convert_dict_to_attribute_value,
+	list: _convert_list_to_attribute_value
+}
+
+def _convert_to_attribute_value(value):
+	return _to_attribute_value_converters.get(type(value), _convert_other_to_attribute_value)(value)
+
+def _convert_number_from_attribute_value(value):
+	if '.' in value or 'e' in value or 'E' in value:
+		return float(value)
+	return int(value)
+
+def _convert_map_from_attribute_value(value):
+	return { key: _convert_from_attribute_value(item) for key, item in value.items() }
+
+def _convert_list_from_attribute_value(value):
+	return [ _convert_from_attribute_value(item) for item in value ]
+
+def _convert_unknown_from_attribute_value(value):
+	return None
+
+_from_attribute_value_converters = {
+	'NULL': _convert_unknown_from_attribute_value,
+	'BOOL': bool,
+	'S': str,
+	'N': _convert_number_from_attribute_value,
+	'M': _convert_map_from_attribute_value,
+	'L': _convert_list_from_attribute_value
+}
+
+def _convert_from_attribute_value(attribute_value):
+	if type(attribute_value) is not dict:
+		return attribute_value
+	for attribute_type, value in attribute_value.items():
+		return _from_attribute_value_converters.get(attribute_type, _convert_unknown_from_attribute_value)(value)
+	return None
+
+"""
+Opaque continuation token for query_page()
+cursor = _encode_cursor(last_evaluated_key, seen)
+last_evaluated_key, seen = _decode_cursor(cursor)
+"""
+def _encode_cursor(last_evaluated_key, seen=0):
+	token = json.dumps({ "k": last_evaluated_key, "n": seen }, separators=(',', ':'))
+	return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+	try:
+		token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+		data = json.loads(token)
+	except (TypeError, ValueError):
+		raise AttributeError("Invalid cursor")
+	if type(data) is not dict or type(data.get('k')) is not dict:
+		raise AttributeError("Invalid cursor")
+	for value in data['k'].values():
+		if type(value) is not dict or len(value) != 1:
+			raise AttributeError("Invalid cursor")
+	return data['k'], max(common.convert_to_int(data.get('n')) or 0, 0)
+
+"""
+Returns the DescribeTable 'Table' dict, shared by all Table instances and
+DynamoDBActionProcessors for table_info_ttl seconds. client defaults to the backend.
+info = moses_common.dynamodb.describe_table(table_name)
+info = moses_common.dynamodb.describe_table(table_name, max_age=0)  # Always call DescribeTable
+info = moses_common.dynamodb.describe_table(table_name, client=ddb_resource.meta.client)
+"""
+def describe_table(table_name, max_age=None, client=None):
+	global _table_info_snapshot_loaded
+	if max_age is None:
+		max_age = table_info_ttl
+	
+	if table_info_snapshot_file and not _table_info_snapshot_loaded:
+		_table_info_snapshot_loaded = True
+		load_table_info_snapshot(table_info_snapshot_file)
+	
+	with _table_info_lock:
+		cached = _table_info_cache.get(table_name)
+	if cached and time.time() - cached['time'] < max_age:
+		return cached['info']
+	
+	# A client passed in keeps its own botocore retries
+	max_retries = 0 if client else throttle_max_retries
+	attempt = 0
+	while True:
+		try:
+			response = (client or boto3_client).describe_table(
+				TableName = table_name
+			)
+			break
+		except (ClientError, BotocoreConnectionError, HTTPClientError) as e:
+			if not _get_retry_kind(e) or attempt >= max_retries:
+				raise
+			attempt += 1
+			time.sleep(_backoff_delay(attempt))
+	if not common.is_success(response) or 'Table' not in response or type(response['Table']) is not dict:
+		return None
+	
+	with _table_info_lock:
+		_table_info_cache[table_name] = {
+			"time": time.time(),
+			"info": response['Table']
+		}
+	if table_info_snapshot_file:
+		save_table_info_snapshot(table_info_snapshot_file)
+	return response['Table']
+
+"""
+moses_common.dynamodb.invalidate_table_info(table_name)
+moses_common.dynamodb.invalidate_table_info()  # All tables
+"""
+def invalidate_table_info(table_name=None):
+	with _table_info_lock:
+		if table_name:
+			_table_info_cache.pop(table_name, None)
+		else:
+			_table_info_cache.clear()
+
+"""
+success = moses_common.dynamodb.save_table_info_snapshot('/tmp/dynamodb_tables.json')
+"""
+def save_table_info_snapshot(filepath):
+	with _table_info_lock:
+		snapshot = dict(_table_info_cache)
+	
+	# Write then rename, so a concurrent cold start never reads a partial file
+	filepath = os.path.expanduser(filepath)
+	temp_filepath = "{}.{}.{}".format(filepath, os.getpid(), threading.get_ident())
+	try:
+		common.write_file(temp_filepath, snapshot, format='json')
+		os.replace(temp_filepath, filepath)
+	except OSError as e:
+		print("error:", e)
+		try:
+			os.remove(temp_filepath)
+		except OSError:
+			pass
+		return False
+	return True
+
+"""
+Loads entries that are newer than what is already cached. Entries keep their original
+timestamps, so table_info_ttl still applies.
+count = moses_common.dynamodb.load_table_info_snapshot('/tmp/dynamodb_tables.json')
+"""
+def load_table_info_snapshot(filepath):
+	try:
+		snapshot = common.read_file(filepath)
+	except (OSError, ValueError) as e:
+		print("error:", e)
+		return 0
+	if type(snapshot) is not dict:
+		return 0
+	
+	count = 0
+	with _table_info_lock:
+		for table_name, cached in snapshot.items():
+			if type(cached) is not dict or type(cached.get('info')) is not dict or not common.is_float(cached.get('time')):
+				continue
+			if table_name in _table_info_cache and _table_info_cache[table_name]['time'] >= cached['time']:
+				continue
+			_table_info_cache[table_name] = cached
+			count += 1
+	return count
+
+"""
+Replaces the low-level client that every Table sends requests through, e.g. with the
+in-process engine in moses_common.dynamodb_memory. Cached DescribeTable results are dropped.
+moses_common.dynamodb.set_backend(moses_common.dynamodb_memory.MemoryClient())
+moses_common.dynamodb.set_backend(boto3.client('dynamodb', region_name="us-east-1", config=moses_common.dynamodb.client_config))
+"""
+def set_backend(client):
+	global boto3_client
+	boto3_client = client
+	invalidate_table_info()
+
+"""
+client = moses_common.dynamodb.get_backend()
+"""
+def get_backend():
+	return boto3_client
+
+"""
+Loads lazy tables concurrently so a handler can pay for several DescribeTable calls at once.
+Every table is tried; each failure is printed with its table name and the first is raised.
+Tables that failed stay unloaded and try again on first use.
+moses_common.dynamodb.warm_tables([table1, table2, table3])
+"""
+def warm_tables(tables, workers=None):
+	tables = [table for table in tables if not table.is_loaded]
+	if not tables:
+		return
+	with ThreadPoolExecutor(max_workers=workers or len(tables)) as executor:
+		futures = [(table, executor.submit(table.warm)) for table in tables]
+	errors = []
+	for table, future in futures:
+		error = future.exception()
+		if error:
+			print("error: failed to load table '{}': {}".format(table.name, error))
+			errors.append(error)
+	if errors:
+		raise errors[0]
+
 """
 Permissions needed:
 	DescribeTable
+	BatchGetItem
+	BatchWriteItem
 	GetItem
 	Query
 	Scan
 	DeleteItem
 	PutItem
 	UpdateItem
+	ConditionCheckItem (transact_write check actions)
 """
 
 
@@ -35,22 +372,52 @@ class Table:
 	import moses_common.dynamodb
 	table = moses_common.dynamodb.Table(table_name)
 	table = moses_common.dynamodb.Table(table_name, ui=ui, dry_run=dry_run)
+	
+	With lazy=True, DescribeTable is deferred until the table's schema or data is first used.
+	table = moses_common.dynamodb.Table(table_name, lazy=True)
+	
+	With item_cache_size, get_item() results are kept in an LRU cache for item_cache_ttl seconds.
+	Writes through this Table object invalidate the cached item.
+	table = moses_common.dynamodb.Table(table_name, item_cache_size=64, item_cache_ttl=30)
+	
+	With count_cache_ttl, query_count() results (and query() totals) are cached for that many
+	seconds. Only writes through this Table object clear them.
+	table = moses_common.dynamodb.Table(table_name, count_cache_ttl=30)
 	"""
-	def __init__(self, table_name, ui=None, dry_run=False):
+	def __init__(self, table_name, ui=None, dry_run=False, lazy=False, item_cache_size=None, item_cache_ttl=60, count_cache_ttl=None):
 		self.dry_run = dry_run
 		self.ui = ui or moses_common.ui.Interface()
 		
 		if not is_valid_name(table_name):
 			raise AttributeError("Invalid table name")
 		self.name = table_name
+		self._info = None
 		self._indexes = None
-		self.attributes = None
-		self.partition_key = None
-		self.sort_key = None
-		if self.load():
-			self.exists = True
-		else:
-			self.exists = False
+		self._attributes = None
+		self._partition_key = None
+		self._sort_key = None
+		self._exists = None
+		self._max_limit = None
+		self._load_lock = threading.Lock()
+		self.item_cache = None
+		if item_cache_size:
+			self.item_cache = ItemCache(max_size=item_cache_size, ttl=item_cache_ttl)
+		self.count_cache = None
+		if count_cache_ttl:
+			self.count_cache = ItemCache(max_size=count_cache_size, ttl=count_cache_ttl)
+		self.read_limiter = None
+		self.write_limiter = None
+		self._metrics = {
+			"requests": 0,
+			"throttles": 0,
+			"retries": 0,
+			"retry_seconds": 0,
+			"consumed_read": 0,
+			"consumed_write": 0
+		}
+		self._metrics_lock = threading.Lock()
+		if not lazy:
+			self.warm()
 		
 	'''
 	{
@@ -76,35 +443,78 @@ class Table:
 		"TableStatus": "ACTIVE"
 	}
 	'''
-	def load(self):
-		response = boto3_client.describe_table(
-			TableName = self.name
-		)
-		if common.is_success(response) and 'Table' in response and type(response['Table']) is dict:
-			self.info = response['Table']
-			if 'AttributeDefinitions' in response['Table'] and type(response['Table']['AttributeDefinitions']) is list:
-				self.attributes = {}
-				for attribute_info in response['Table']['AttributeDefinitions']:
+	def load(self, refresh=False):
+		max_age = None
+		if refresh:
+			max_age = 0
+		table_info = describe_table(self.name, max_age=max_age)
+		self._max_limit = None
+		if table_info:
+			self._info = table_info
+			if 'AttributeDefinitions' in table_info and type(table_info['AttributeDefinitions']) is list:
+				self._attributes = {}
+				for attribute_info in table_info['AttributeDefinitions']:
 					if 'AttributeName' in attribute_info:
-						self.attributes[attribute_info['AttributeName']] = Attribute(self, attribute_info, ui=self.ui, dry_run=self.dry_run)
-				if 'KeySchema' in response['Table'] and type(response['Table']['KeySchema']) is list:
-					for i in range(len(response['Table']['KeySchema'])):
-						key_info = response['Table']['KeySchema'][i]
+						self._attributes[attribute_info['AttributeName']] = Attribute(self, dict(attribute_info), ui=self.ui, dry_run=self.dry_run)
+				if 'KeySchema' in table_info and type(table_info['KeySchema']) is list:
+					for i in range(len(table_info['KeySchema'])):
+						key_info = table_info['KeySchema'][i]
 						if key_info and type(key_info) is dict:
 							if 'AttributeName' in key_info:
-								self.attributes[key_info['AttributeName']].info['key_type'] = key_info['KeyType']
+								self._attributes[key_info['AttributeName']].info['key_type'] = key_info['KeyType']
 						if i == 0:
-							self.partition_key = self.attributes[key_info['AttributeName']]
+							self._partition_key = self._attributes[key_info['AttributeName']]
 						if i == 1:
-							self.sort_key = self.attributes[key_info['AttributeName']]
-			if 'GlobalSecondaryIndexes' in response['Table'] and type(response['Table']['GlobalSecondaryIndexes']) is list:
+							self._sort_key = self._attributes[key_info['AttributeName']]
+			if 'GlobalSecondaryIndexes' in table_info and type(table_info['GlobalSecondaryIndexes']) is list:
 				self._indexes = {}
-				for index_info in response['Table']['GlobalSecondaryIndexes']:
+				for index_info in table_info['GlobalSecondaryIndexes']:
 					index = Index(self, index_info, ui=self.ui, dry_run=self.dry_run)
 					self._indexes[index.name] = index
+			self._exists = True
 			return True
+		self._exists = False
 		return False
 	
+	"""
+	Loads the table schema if it hasn't been loaded yet.
+	exists = table.warm()
+	"""
+	def warm(self):
+		if self._exists is None:
+			with self._load_lock:
+				if self._exists is None:
+					self.load()
+		return self._exists
+	
+	@property
+	def is_loaded(self):
+		return self._exists is not None
+	
+	@property
+	def exists(self):
+		return self.warm()
+	
+	@property
+	def info(self):
+		self.warm()
+		return self._info
+	
+	@property
+	def attributes(self):
+		self.warm()
+		return self._attributes
+	
+	@property
+	def partition_key(self):
+		self.warm()
+		return self._partition_key
+	
+	@property
+	def sort_key(self):
+		self.warm()
+		return self._sort_key
+	
 	@property
 	def arn(self):
 		if not self.exists and 'TableArn' not in self.info:
@@ -121,6 +531,90 @@ class Table:
 			return None
 		return self._indexes
 	
+	"""
+	Paces requests from this Table object toward a target rate of capacity units per second.
+	Consumed capacity is requested from DynamoDB and debited after each call, so bulk scans and
+	loads share the budget. None removes the limit.
+	table.set_capacity_target(read=100, write=50)
+	"""
+	def set_capacity_target(self, read=None, write=None):
+		self.read_limiter = None
+		self.write_limiter = None
+		if read:
+			self.read_limiter = RateLimiter(read)
+		if write:
+			self.write_limiter = RateLimiter(write)
+	
+	"""
+	{
+		"requests": 120,
+		"throttles": 3,
+		"retries": 5,
+		"retry_seconds": 0.82,
+		"consumed_read": 480.5,
+		"consumed_write": 0
+	}
+	"""
+	@property
+	def metrics(self):
+		with self._metrics_lock:
+			metrics = dict(self._metrics)
+		metrics['retry_seconds'] = round(metrics['retry_seconds'], 3)
+		return metrics
+	
+	def _add_metrics(self, **counts):
+		with self._metrics_lock:
+			for name, value in counts.items():
+				self._metrics[name] += value
+	
+	"""
+	Sleeps for a full-jitter backoff and records it as a retry.
+	table._backoff(attempt)
+	"""
+	def _backoff(self, attempt):
+		delay = _backoff_delay(attempt)
+		self._add_metrics(retries=1, retry_seconds=delay)
+		time.sleep(delay)
+	
+	"""
+	Every DynamoDB data call from Table, Index and BatchWriter goes through here.
+	Throttles and transient errors are retried up to throttle_max_retries times; other errors are raised.
+	response = table._request('query', 'read', **query_args)
+	"""
+	def _request(self, operation, capacity, **kwargs):
+		limiter = None
+		if capacity == 'read':
+			limiter = self.read_limiter
+		elif capacity == 'write':
+			limiter = self.write_limiter
+		if limiter:
+			kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+		
+		attempt = 0
+		while True:
+			if limiter:
+				limiter.wait()
+			try:
+				response = getattr(boto3_client, operation)(**kwargs)
+			except (ClientError, BotocoreConnectionError, HTTPClientError) as e:
+				retry_kind = _get_retry_kind(e)
+				self._add_metrics(requests=1, throttles=1 if retry_kind == 'throttle' else 0)
+				if not retry_kind or attempt >= throttle_max_retries:
+					raise
+				attempt += 1
+				self.ui.debug(f"{operation} {self.name}: {retry_kind} error, retry {attempt}")
+				self._backoff(attempt)
+				continue
+			
+			self._add_metrics(requests=1)
+			units = None
+			if limiter:
+				units = _get_consumed_capacity(response)
+				limiter.consume(units if units is not None else 1)
+			if units:
+				self._add_metrics(**{ f"consumed_{capacity}": units })
+			return response
+	
 	def get_ts(self):
 		return datetime.datetime.utcnow().isoformat(' ')
 	
@@ -153,18 +647,6 @@ class Table:
 				return { 'S': str(value) }
 			elif attribute_type == 'N':
 				return { 'N': str(self.convert_to_num(value)) }
-			elif attribute_type == 'M':
-				if type(value) is dict:
-					new_map = {}
-					for key, item in value.items():
-						new_map[key] = self.convert_to_attribute_value(item)
-					return { 'M': new_map }
-			elif attribute_type == 'L':
-				if type(value) is list:
-					new_list = []
-					for item in value:
-						new_list.append(self.convert_to_attribute_value(item))
-					return { 'L': new_list }
 			elif attribute_type == 'NULL':
 				return { 'NULL': True }
 			elif attribute_type == 'BOOL':
@@ -172,85 +654,112 @@ class Table:
 					return { 'BOOL': True }
 				else:
 					return { 'BOOL': False }
-		if type(value) is str:
-			return self.convert_to_attribute_value(value, 'S')
-		elif type(value) is int or type(value) is float:
-			return self.convert_to_attribute_value(value, 'N')
-		elif type(value) is dict:
-			return self.convert_to_attribute_value(value, 'M')
-		elif type(value) is list:
-			return self.convert_to_attribute_value(value, 'L')
-		elif value is None:
-			return self.convert_to_attribute_value(value, 'NULL')
-		elif type(value) is bool:
-			return self.convert_to_attribute_value(value, 'BOOL')
-		return self.convert_to_attribute_value(value, 'S')
+		return _convert_to_attribute_value(value)
 	
 	def convert_to_item(self, record):
 		if type(record) is dict:
-			new_record = {}
-			for key, value in record.items():
-				new_record[key] = self.convert_to_attribute_value(value)
-			return new_record
+			get_converter = _to_attribute_value_converters.get
+			return { key: get_converter(type(value), _convert_other_to_attribute_value)(value) for key, value in record.items() }
 		if type(record) is list:
-			new_record = []
-			for value in record:
-				new_record.append(self.convert_to_item(value))
-			return new_record
+			return [ self.convert_to_item(value) for value in record ]
 	
 	def convert_from_attribute_value(self, attribute_value):
-		if type(attribute_value) is not dict:
-			return attribute_value
-		if 'NULL' in attribute_value:
-			return None
-		elif 'BOOL' in attribute_value:
-			return attribute_value['BOOL']
-		elif 'S' in attribute_value:
-			return str(attribute_value['S'])
-		elif 'N' in attribute_value:
-			if re.search(r'\.', attribute_value['N']):
-				return common.convert_to_float(attribute_value['N'])
-			else:
-				return common.convert_to_int(attribute_value['N'])
-		elif 'M' in attribute_value:
-			new_map = {}
-			for key, item in attribute_value['M'].items():
-				new_map[key] = self.convert_from_attribute_value(item)
-			return new_map
-		elif 'L' in attribute_value:
-			new_list = []
-			for item in attribute_value['L']:
-				new_list.append(self.convert_from_attribute_value(item))
-			return new_list
-		return None
+		return _convert_from_attribute_value(attribute_value)
 	
 	def convert_from_item(self, record):
 		if type(record) is dict:
-			new_record = {}
-			for key, value in record.items():
-				new_record[key] = self.convert_from_attribute_value(value)
-			return new_record
+			return { key: _convert_from_attribute_value(value) for key, value in record.items() }
 		if type(record) is list:
-			new_record = []
-			for value in record:
-				new_record.append(self.convert_from_item(value))
-			return new_record
+			return [ self.convert_from_item(value) for value in record ]
 	
 	
 	"""
-	record = table.get_item(key_value, sort_value=None)
+	key_object = table.get_key_object(key_value, sort_value=None)
 	"""
-	def get_item(self, key_value, sort_value=None):
+	def get_key_object(self, key_value, sort_value=None):
 		key_object = {
 			self.partition_key.name: self.convert_to_attribute_value(key_value, self.partition_key.type)
 		}
 		if self.sort_key:
-			if sort_value:
+			if sort_value is not None:
 				key_object[self.sort_key.name] = self.convert_to_attribute_value(sort_value, self.sort_key.type)
 			else:
 				raise AttributeError("Table '{}' with sort key '{}' requires a sort key value".format(self.name, self.sort_key.name))
+		return key_object
+	
+	"""
+	Accepts a partition key value, a (partition, sort) tuple or list, or a dict containing the key fields.
+	key_value, sort_value = table.split_key(key)
+	"""
+	def split_key(self, key):
+		if type(key) is dict:
+			sort_value = None
+			if self.sort_key:
+				sort_value = key.get(self.sort_key.name)
+			return key.get(self.partition_key.name), sort_value
+		if type(key) is tuple or type(key) is list:
+			if len(key) > 1:
+				return key[0], key[1]
+			return key[0], None
+		return key, None
+	
+	"""
+	projection_expression, attribute_names = table.get_projection_expression(['field1', 'field2'])
+	projection_expression, attribute_names = table.get_projection_expression(['field1'], include_keys=True)
+	"""
+	def get_projection_expression(self, fields=None, include_keys=False):
+		projection_list = []
+		attribute_names = {}
+		key_names = []
+		if include_keys:
+			projection_list.append("#p")
+			attribute_names["#p"] = self.partition_key.name
+			key_names.append(self.partition_key.name)
+			if self.sort_key:
+				projection_list.append("#s")
+				attribute_names["#s"] = self.sort_key.name
+				key_names.append(self.sort_key.name)
+		if fields:
+			cnt = 0
+			for field in fields:
+				if field in key_names:
+					continue
+				key = f"#f{cnt}"
+				projection_list.append(key)
+				attribute_names[key] = field
+				cnt += 1
+		return ', '.join(projection_list), attribute_names
+	
+	"""
+	Adds a ProjectionExpression for fields to query or scan args, merging the attribute names.
+	table._add_projection_args(request_args, ['field1', 'field2'])
+	"""
+	def _add_projection_args(self, request_args, fields=None):
+		if not fields:
+			return request_args
+		if type(fields) is str:
+			fields = [fields]
+		projection_expression, attribute_names = self.get_projection_expression(fields)
+		request_args['ProjectionExpression'] = projection_expression
+		request_args['ExpressionAttributeNames'] = dict(request_args.get('ExpressionAttributeNames') or {}, **attribute_names)
+		if 'Select' in request_args:
+			request_args['Select'] = 'SPECIFIC_ATTRIBUTES'
+		return request_args
+	
+	"""
+	record = table.get_item(key_value, sort_value=None)
+	"""
+	def get_item(self, key_value, sort_value=None):
+		key_object = self.get_key_object(key_value, sort_value)
+		cache_key = None
+		if self.item_cache is not None:
+			cache_key = self._get_key_id(key_object, key_object.keys())
+			found, record = self.item_cache.get(cache_key)
+			if found:
+				return copy.deepcopy(record)
+			cache_version = self.item_cache.version
 		try:
-			response = boto3_client.get_item(
+			response = self._request('get_item', 'read',
 				TableName = self.name,
 				Key = key_object
 			)
@@ -262,8 +771,121 @@ class Table:
 			if common.is_success(response) and 'Item' in response:
 				results = self.convert_from_item(response['Item'])
 				self.ui.debug("get_item: {}".format(len(results)))
+				if cache_key is not None:
+					# Not cached if a write invalidated the cache while this read was in flight
+					self.item_cache.set(cache_key, copy.deepcopy(results), version=cache_version)
 				return results
-			self.ui.debug(f"get_item response: {response}")
+			self.ui.debug_payload(f"get_item {self.name} response", response)
+	
+	"""
+	Drops an item from the get_item() cache, if there is one, and clears cached counts.
+	table.invalidate_cached_item(partition_key_value, sort_key_value=None)
+	"""
+	def invalidate_cached_item(self, key_value, sort_value=None):
+		if self.count_cache is not None:
+			self.count_cache.invalidate()
+		if self.item_cache is None:
+			return
+		try:
+			key_object = self.get_key_object(key_value, sort_value)
+		except AttributeError:
+			# Missing sort key; the item can't be cached under a partial key
+			return
+		self.item_cache.invalidate(self._get_key_id(key_object, key_object.keys()))
+	
+	"""
+	Fetches up to 100 keys per BatchGetItem request, with requests sent concurrently.
+	Keys may be partition key values, (partition, sort) tuples, or dicts with the key fields.
+	Records are returned in the order of the requested keys; missing items are skipped.
+	The key fields are always included in a projection.
+	records = table.batch_get_items(keys)
+	records = table.batch_get_items(keys, projection=['field1', 'field2'], consistent=True)
+	"""
+	def batch_get_items(self, keys, projection=None, consistent=False, workers=4):
+		if not keys:
+			return []
+		
+		# BatchGetItem rejects duplicate keys
+		key_names = [self.partition_key.name]
+		if self.sort_key:
+			key_names.append(self.sort_key.name)
+		key_order = []
+		key_objects = []
+		seen = set()
+		for key in keys:
+			key_value, sort_value = self.split_key(key)
+			key_object = self.get_key_object(key_value, sort_value)
+			key_id = self._get_key_id(key_object, key_names)
+			if key_id in seen:
+				continue
+			seen.add(key_id)
+			key_order.append(key_id)
+			key_objects.append(key_object)
+		
+		request_args = {}
+		if consistent:
+			request_args['ConsistentRead'] = True
+		if projection:
+			projection_expression, attribute_names = self.get_projection_expression(projection, include_keys=True)
+			request_args['ProjectionExpression'] = projection_expression
+			request_args['ExpressionAttributeNames'] = attribute_names
+		
+		chunks = _chunk_list(key_objects, batch_get_max_keys)
+		items = []
+		if len(chunks) == 1:
+			items = self._batch_get_chunk(chunks[0], request_args)
+		else:
+			with ThreadPoolExecutor(max_workers=min(workers or 1, len(chunks))) as executor:
+				for chunk_items in executor.map(lambda chunk: self._batch_get_chunk(chunk, request_args), chunks):
+					items.extend(chunk_items)
+		
+		items_by_key = {}
+		for item in items:
+			items_by_key[self._get_key_id(item, key_names)] = item
+		records = []
+		for key_id in key_order:
+			if key_id in items_by_key:
+				records.append(self.convert_from_item(items_by_key[key_id]))
+		self.ui.debug(f"batch_get_items {self.name}: {len(records)} of {len(key_order)}")
+		return records
+	
+	def _invalidate_cached_item(self, key_object):
+		if self.count_cache is not None:
+			self.count_cache.invalidate()
+		if self.item_cache is not None:
+			self.item_cache.invalidate(self._get_key_id(key_object, key_object.keys()))
+	
+	def _get_key_id(self, item, key_names):
+		key_id = []
+		for name in key_names:
+			attribute_value = item.get(name) or {}
+			key_id.extend(attribute_value.values())
+		return tuple(key_id)
+	
+	def _batch_get_chunk(self, key_objects, request_args):
+		request = dict(request_args, Keys=key_objects)
+		items = []
+		attempt = 0
+		while True:
+			try:
+				response = self._request('batch_get_item', 'read',
+					RequestItems = { self.name: request }
+				)
+			except ClientError as e:
+				print("error:", e)
+				raise ConnectionError("Failed to batch get items from table '{}'".format(self.name))
+			
+			items.extend(response.get('Responses', {}).get(self.name, []))
+			unprocessed = response.get('UnprocessedKeys', {}).get(self.name)
+			if not unprocessed or not unprocessed.get('Keys'):
+				return items
+			
+			attempt += 1
+			if attempt > batch_max_retries:
+				raise ConnectionError("Failed to batch get {} keys from table '{}'".format(len(unprocessed['Keys']), self.name))
+			self.ui.debug(f"batch_get_items {self.name}: retry {len(unprocessed['Keys'])} unprocessed keys")
+			self._backoff(attempt)
+			request = unprocessed
 	
 	"""
 	max_id = table.get_max_range_value(key_value)
@@ -278,7 +900,7 @@ class Table:
 		attribute_values = {":key_value":self.convert_to_attribute_value(key_value)}
 		projection = '{},{}'.format(self.partition_key.name, self.sort_key.name)
 		try:
-			response = boto3_client.query(
+			response = self._request('query', 'read',
 				TableName = self.name,
 				ProjectionExpression = projection,
 				KeyConditionExpression = key_condition,
@@ -292,7 +914,7 @@ class Table:
 # 			raise ConnectionError("Failed to get item from DynamodDB " + self.name)
 			pass
 		else:
-			self.ui.debug(f"get_max_range_value: {response}")
+			self.ui.debug_payload(f"get_max_range_value {self.name} response", response)
 			if common.is_success(response) and 'Items' in response:
 				records = self.convert_from_item(response['Items'])
 				if len(records) and records[0] and self.sort_key.name in records[0]:
@@ -300,12 +922,15 @@ class Table:
 		return int(0)
 	
 	def get_max_limit(self):
+		if self._max_limit is not None:
+			return self._max_limit
 		max_limit = 1000
-		if 'TableSizeBytes' in self.info and 'ItemCount' in self.info:
+		if self.info.get('TableSizeBytes') and self.info.get('ItemCount'):
 			safe_ddb_limit = 1000000 * .75
 			avg_record_size = self.info['TableSizeBytes'] / self.info['ItemCount']
 			max_limit = int(safe_ddb_limit / avg_record_size)
-		return round(max_limit, -2)
+		self._max_limit = max(round(max_limit, -2), 100)
+		return self._max_limit
 	
 	"""
 	Same args as query() except limit and offset.
@@ -376,28 +1001,112 @@ class Table:
 		return filter_expression, attribute_names, attribute_values
 	
 	"""
-	update_expression, attribute_names, attribute_values = table.get_update_expression(dict, remove_keys=None)
+	Conditions are a dict or list of dicts joined with AND. Comparison operators are
+	=, <>, <, <=, >, >=, begins_with, contains, and between (value is [low, high]).
+	attribute_exists and attribute_not_exists take no value.
+	'exists' and 'not_exists' are shorthand for the partition key (not) existing.
+	condition_expression, attribute_names, attribute_values = table.get_condition_expression([ {
+		"name": "version",
+		"operator": "=",
+		"value": 3
+	} ])
+	condition_expression, attribute_names, attribute_values = table.get_condition_expression('not_exists')
+	"""
+	def get_condition_expression(self, conditions=None):
+		if conditions in ['exists', 'not_exists']:
+			conditions = {
+				"name": self.partition_key.name,
+				"operator": "attribute_" + conditions
+			}
+		if type(conditions) is dict:
+			conditions = [conditions]
+		if not conditions:
+			return '', {}, {}
+		if type(conditions) is not list:
+			raise TypeError("condition must be a dict or list of dicts")
+		
+		count = 0
+		expression_list = []
+		attribute_names = {}
+		attribute_values = {}
+		for condition in conditions:
+			if type(condition) is not dict or 'name' not in condition:
+				raise AttributeError("Each condition requires a name")
+			count += 1
+			name = "#c" + str(count)
+			value = ":c" + str(count)
+			attribute_names[name] = condition['name']
+			operator = condition.get('operator', '=')
+			operator_function = common.convert_to_snakecase(operator.lower())
+			if operator_function in ['attribute_exists', 'attribute_not_exists']:
+				expression_list.append("{} ({})".format(operator_function, name))
+				continue
+			if 'value' not in condition:
+				raise AttributeError("Condition operator '{}' requires a value".format(operator))
+			if operator_function in ['begins_with', 'contains']:
+				attribute_values[value] = self.convert_to_attribute_value(condition['value'])
+				expression_list.append("{} ({}, {})".format(operator_function, name, value))
+			elif operator_function == 'between':
+				if type(condition['value']) not in [list, tuple] or len(condition['value']) != 2:
+					raise AttributeError("'between' condition requires a [low, high] value")
+				attribute_values[value] = self.convert_to_attribute_value(condition['value'][0])
+				attribute_values[value + "b"] = self.convert_to_attribute_value(condition['value'][1])
+				expression_list.append("{} BETWEEN {} AND {}b".format(name, value, value))
+			elif operator in ['=', '<>', '<', '<=', '>', '>=']:
+				attribute_values[value] = self.convert_to_attribute_value(condition['value'])
+				expression_list.append("{} {} {}".format(name, operator, value))
+			else:
+				raise AttributeError("Invalid condition operator '{}'".format(operator))
+		
+		return ' AND '.join(expression_list), attribute_names, attribute_values
+	
+	def _add_condition_args(self, request_args, condition):
+		condition_expression, attribute_names, attribute_values = self.get_condition_expression(condition)
+		if not condition_expression:
+			return
+		request_args['ConditionExpression'] = condition_expression
+		request_args['ExpressionAttributeNames'] = dict(request_args.get('ExpressionAttributeNames', {}), **attribute_names)
+		if attribute_values:
+			request_args['ExpressionAttributeValues'] = dict(request_args.get('ExpressionAttributeValues', {}), **attribute_values)
+	
+	def _get_key_from_item(self, item):
+		if self.partition_key.name not in item:
+			raise AttributeError("Item is missing partition key for table '{}'".format(self.name))
+		key_object = {
+			self.partition_key.name: self.convert_to_attribute_value(item[self.partition_key.name], self.partition_key.type)
+		}
+		if self.sort_key:
+			if self.sort_key.name not in item:
+				raise AttributeError("Item is missing sort key for table '{}'".format(self.name))
+			key_object[self.sort_key.name] = self.convert_to_attribute_value(item[self.sort_key.name], self.sort_key.type)
+		return key_object
+	
+	"""
+	Key fields in item are skipped; item itself is not changed.
+	add_values are added to numeric fields (atomic counters), which are created at 0 if missing.
+	update_expression, attribute_names, attribute_values = table.get_update_expression(dict, remove_keys=None, add_values=None)
+	update_expression, attribute_names, attribute_values = table.get_update_expression({ "name": "a" }, add_values={ "views": 1 })
 	"""
-	def get_update_expression(self, item, remove_keys=None):
+	def get_update_expression(self, item, remove_keys=None, add_values=None):
 		if item and type(item) is not dict:
 			raise TypeError("item must be dict")
 		
-		# Remove keys from item
-		if self.partition_key.name in item:
-			item.pop(self.partition_key.name)
-		if self.sort_key and self.sort_key.name in item:
-			item.pop(self.sort_key.name)
+		key_names = [self.partition_key.name]
+		if self.sort_key:
+			key_names.append(self.sort_key.name)
 		
 		count = 0
 		expression_list = []
 		attribute_names = {}
 		attribute_values = {}
+		get_converter = _to_attribute_value_converters.get
 		for key, value in item.items():
+			if key in key_names:
+				continue
 			count += 1
-			attribute_names["#k" + str(count)] = key
-			attribute_values[":v" + str(count)] = self.convert_to_attribute_value(value)
-			expression = "#k{} = :v{}".format(str(count), str(count))
-			expression_list.append(expression)
+			attribute_names[f"#k{count}"] = key
+			attribute_values[f":v{count}"] = get_converter(type(value), _convert_other_to_attribute_value)(value)
+			expression_list.append(f"#k{count} = :v{count}")
 		update_expression = ''
 		if len(expression_list):
 			update_expression = "SET " + ', '.join(expression_list)
@@ -414,52 +1123,162 @@ class Table:
 					update_expression += ' '
 				update_expression += "REMOVE " + ', '.join(remove_list)
 		
+		if add_values:
+			if type(add_values) is not dict:
+				raise TypeError("add_values must be dict")
+			add_list = []
+			for key, value in add_values.items():
+				if type(value) not in [int, float, decimal.Decimal]:
+					raise TypeError("add value for '{}' must be a number".format(key))
+				count += 1
+				attribute_names["#k" + str(count)] = key
+				attribute_values[":v" + str(count)] = self.convert_to_attribute_value(value)
+				add_list.append("#k{} :v{}".format(str(count), str(count)))
+			if update_expression:
+				update_expression += ' '
+			update_expression += "ADD " + ', '.join(add_list)
+		
 		if not update_expression:
 			return True, True, True
 		return update_expression, attribute_names, attribute_values
 	
 	"""
 	Same args as query() except limit and offset.
+	Follows LastEvaluatedKey, so partitions larger than 1 MB are counted in full.
+	With segments and a numeric sort key, the matching sort key range is split into that many
+	sub-ranges that are counted in parallel.
+	If the Table has a count_cache_ttl, counts are cached; writes through this Table clear the cache.
 	count = table.query_count(partition_key_value, args=None)
+	count = table.query_count(partition_key_value, args, segments=8)
 	"""
-	def query_count(self, partition_key_value, args={}):
+	def query_count(self, partition_key_value, args={}, segments=None):
+		return self._query_count(self, None, partition_key_value, args, segments=segments)
+	
+	def _query_count(self, key_source, index_name, partition_key_value, args={}, segments=None):
 		if args and type(args) is not dict:
 			raise AttributeError("args must be dict")
 		
-		key_condition, attribute_names, attribute_values = self.get_key_condition_expressions(partition_key_value, args)
+		key_condition, attribute_names, attribute_values = key_source.get_key_condition_expressions(partition_key_value, args or {})
+		return self._count_key_condition(key_source, index_name, key_condition, attribute_names, attribute_values, segments=segments)
+	
+	def _count_key_condition(self, key_source, index_name, key_condition, attribute_names, attribute_values, segments=None):
+		cache_key = None
+		if self.count_cache is not None:
+			cache_key = (index_name, key_condition, json.dumps(attribute_values, sort_keys=True))
+			found, count = self.count_cache.get(cache_key)
+			if found:
+				return count
 		
-		try:
-			response = boto3_client.query(
-				TableName = self.name,
-				Select = 'COUNT',
-				KeyConditionExpression = key_condition,
-				ExpressionAttributeNames = attribute_names,
-				ExpressionAttributeValues = attribute_values
-			)
+		count_args = {
+			"TableName": self.name,
+			"Select": 'COUNT',
+			"KeyConditionExpression": key_condition,
+			"ExpressionAttributeNames": attribute_names,
+			"ExpressionAttributeValues": attribute_values
+		}
+		if index_name:
+			count_args['IndexName'] = index_name
 		
-		except ClientError as e:
-			print("error:", e)
-			raise ConnectionError("Failed to query table '{}'".format(self.name))
+		count = None
+		segments = common.convert_to_int(segments) or 1
+		if segments > 1 and key_source.sort_key and key_source.sort_key.type == 'N':
+			count = self._parallel_query_count(count_args, key_source.sort_key, segments)
+		if count is None:
+			count = self._paged_query_count(count_args)
 		
-		else:
-			self.ui.debug(f"query_count: {response}")
-			if common.is_success(response) and 'Count' in response:
-				return response['Count']
-				
+		self.ui.debug(f"query_count {self.name}: {count}")
+		if cache_key is not None:
+			self.count_cache.set(cache_key, count)
+		return count
+	
+	def _paged_query_count(self, count_args):
+		count_args = dict(count_args)
+		count = 0
+		while True:
+			try:
+				response = self._request('query', 'read', **count_args)
+			except ClientError as e:
+				print("error:", e)
+				raise ConnectionError("Failed to query table '{}'".format(self.name))
+			
+			if not common.is_success(response) or 'Count' not in response:
+				return count
+			count += response['Count']
+			if 'LastEvaluatedKey' not in response:
+				return count
+			count_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+	
 	"""
-	records, total = table.query(partition_key_value)
-	records, total = table.query(partition_key_value, {
-		"sort_key_value": value,
-		"sort_key_value_end": value,  # Required by sort_key_operator 'between'
-		"sort_key_operator": '='|'<'|'<='|'>'|'>='|'begins_with'|'between',  # defaults to '='
-		"limit": int,
-		"offset": int
-	})
+	Finds the lowest and highest matching sort key values, splits that range at boundary values
+	b0 < b1 < ... < bn, and counts each inclusive BETWEEN range in parallel. Items equal to an
+	inner boundary are counted by two ranges, so they are counted once more and subtracted.
+	Returns None when the range can't be split.
 	"""
-	def query(self, partition_key_value, args={}):
-		if args and type(args) is not dict:
-			raise AttributeError("args must be dict")
+	def _parallel_query_count(self, count_args, sort_key, segments):
+		bounds = []
+		for forward in [True, False]:
+			probe_args = dict(count_args,
+				ProjectionExpression = '#sbound',
+				ExpressionAttributeNames = dict(count_args['ExpressionAttributeNames'], **{ "#sbound": sort_key.name }),
+				ScanIndexForward = forward,
+				Limit = 1
+			)
+			probe_args.pop('Select')
+			try:
+				response = self._request('query', 'read', **probe_args)
+			except ClientError as e:
+				print("error:", e)
+				raise ConnectionError("Failed to query table '{}'".format(self.name))
+			if not response.get('Items'):
+				return 0
+			bounds.append(_convert_from_attribute_value(response['Items'][0].get(sort_key.name)))
+		low, high = bounds
+		if type(low) not in [int, float] or type(high) not in [int, float] or low >= high:
+			return None
 		
+		if type(low) is int and type(high) is int:
+			boundaries = [low + (high - low) * i // segments for i in range(segments)]
+		else:
+			boundaries = [low + (high - low) * i / segments for i in range(segments)]
+		boundaries = sorted(set(boundaries + [high]))
+		
+		partition_condition = '#pkey = :pvalue'
+		range_args = []
+		for i in range(len(boundaries) - 1):
+			range_args.append((1, boundaries[i], boundaries[i + 1]))
+		for boundary in boundaries[1:-1]:
+			range_args.append((-1, boundary, None))
+		
+		def count_range(range_info):
+			sign, start, end = range_info
+			sub_args = dict(count_args,
+				ExpressionAttributeNames = { "#pkey": count_args['ExpressionAttributeNames']['#pkey'], "#sbound": sort_key.name },
+				ExpressionAttributeValues = { ":pvalue": count_args['ExpressionAttributeValues'][':pvalue'], ":slow": _convert_to_attribute_value(start) }
+			)
+			sub_args.pop('ExclusiveStartKey', None)
+			if end is None:
+				sub_args['KeyConditionExpression'] = partition_condition + ' AND #sbound = :slow'
+			else:
+				sub_args['KeyConditionExpression'] = partition_condition + ' AND #sbound BETWEEN :slow AND :shigh'
+				sub_args['ExpressionAttributeValues'][':shigh'] = _convert_to_attribute_value(end)
+			return sign * self._paged_query_count(sub_args)
+		
+		with ThreadPoolExecutor(max_workers=min(len(range_args), segments * 2)) as executor:
+			return sum(executor.map(count_range, range_args))
+	
+	"""
+	Compiles query args once into a QueryPlan that only binds key values per call.
+	plan = table.prepare_query({ "sort_key_operator": "begins_with", "limit": 50, "fields": ['id', 'name'] })
+	records, total = plan.query(partition_key_value, sort_key_value)
+	"""
+	def prepare_query(self, args={}):
+		return QueryPlan(self, args=args)
+	
+	"""
+	The Query request that query() sends, and the offset it applies to the results.
+	query_args, offset = table.get_query_args(partition_key_value, args)
+	"""
+	def get_query_args(self, partition_key_value, args={}):
 		key_condition, attribute_names, attribute_values = self.get_key_condition_expressions(partition_key_value, args)
 		
 		limit = None
@@ -476,8 +1295,6 @@ class Table:
 			elif limit:
 				limit += offset
 		
-		self.ui.debug("args {}: {}".format(type(args), args))
-		self.ui.debug("self.sort_key.name {}: {}".format(type(self.sort_key.name), self.sort_key.name))
 		sort_forward = True
 		if 'order_by' in args and type(args['order_by']) is list:
 			for element in args['order_by']:
@@ -488,22 +1305,43 @@ class Table:
 		if not limit:
 			limit = self.get_max_limit()
 		
-		try:
-			response = boto3_client.query(
-				TableName = self.name,
-				Select = 'ALL_ATTRIBUTES',
-				KeyConditionExpression = key_condition,
-				ExpressionAttributeNames = attribute_names,
-				ExpressionAttributeValues = attribute_values,
-				ScanIndexForward = sort_forward,
-				Limit = limit
-			)
-		
-		except ClientError as e:
-			print("error:", e)
-			raise ConnectionError("Failed to query table '{}'".format(self.name))
-		
-		else:
+		query_args = {
+			"TableName": self.name,
+			"Select": 'ALL_ATTRIBUTES',
+			"KeyConditionExpression": key_condition,
+			"ExpressionAttributeNames": attribute_names,
+			"ExpressionAttributeValues": attribute_values,
+			"ScanIndexForward": sort_forward,
+			"Limit": limit
+		}
+		self._add_projection_args(query_args, args.get('fields'))
+		return query_args, offset
+	
+	"""
+	records, total = table.query(partition_key_value)
+	records, total = table.query(partition_key_value, {
+		"sort_key_value": value,
+		"sort_key_value_end": value,  # Required by sort_key_operator 'between'
+		"sort_key_operator": '='|'<'|'<='|'>'|'>='|'begins_with'|'between',  # defaults to '='
+		"limit": int,
+		"offset": int,
+		"fields": ['field1', 'field2']  # Only return these fields
+	})
+	"""
+	def query(self, partition_key_value, args={}):
+		if args and type(args) is not dict:
+			raise AttributeError("args must be dict")
+		
+		self.ui.debug_payload(f"query {self.name} args", args)
+		query_args, offset = self.get_query_args(partition_key_value, args)
+		try:
+			response = self._request('query', 'read', **query_args)
+		
+		except ClientError as e:
+			print("error:", e)
+			raise ConnectionError("Failed to query table '{}'".format(self.name))
+		
+		else:
 			if common.is_success(response) and 'Items' in response:
 				records = self.convert_from_item(response['Items'])
 				
@@ -528,69 +1366,312 @@ class Table:
 					offset_records.append(records[i])
 				self.ui.debug(f"query with offset: {count}")
 				return offset_records, count
-			self.ui.debug(f"query: {response}")
+			self.ui.debug_payload(f"query {self.name} response", response)
 				
 	
 	"""
-	records = table.get_keys()
-	records = table.get_keys(['extra_fields'])
+	Runs query() for several partition key values on a thread pool and yields the records as each
+	query completes. With sort=True, waits for all of them and yields one stream merge-sorted by the
+	sort key, honoring a descending order_by on the sort key. If args fields leaves out the sort key,
+	it is read for the merge and removed from the records.
+	args are passed to each query(), so limit and offset apply per partition.
+	for record in table.query_many(['id1', 'id2', 'id3']):
+	for record in table.query_many(partition_values, args, workers=8, sort=True):
 	"""
-	def get_keys(self, included_fields=None):
-		response = {}
-		items = []
+	def query_many(self, partition_values, args={}, workers=8, sort=False):
+		return self._query_many(self, partition_values, args, workers=workers, sort=sort)
+	
+	def _query_many(self, key_source, partition_values, args={}, workers=8, sort=False):
+		# Skip repeated values but keep their order
+		partition_values = list(dict.fromkeys(partition_values))
+		if not partition_values:
+			return
+		
+		# The merge needs the sort key, so project it if fields leaves it out and strip it afterwards
+		strip_sort_key = False
+		if sort and key_source.sort_key and args and args.get('fields'):
+			fields = [args['fields']] if type(args['fields']) is str else list(args['fields'])
+			if key_source.sort_key.name not in fields:
+				args = dict(args, fields=fields + [key_source.sort_key.name])
+				strip_sort_key = True
+		
+		executor = ThreadPoolExecutor(max_workers=min(workers or 1, len(partition_values)))
 		try:
-			projection_expression = "#p"
-			expression_attribute_names = {
-				"#p": self.partition_key.name
-			}
-			if self.sort_key:
-				projection_expression = "#p, #s"
-				expression_attribute_names = {
-					"#p": self.partition_key.name,
-					"#s": self.sort_key.name
-				}
-			if included_fields:
-				cnt = 0
-				for field in included_fields:
-					key = f"#f{cnt}"
-					projection_expression += f", {key}"
-					expression_attribute_names[key] = field
-					cnt += 1
+			futures = [executor.submit(key_source.query, value, args) for value in partition_values]
+			if not sort or not key_source.sort_key:
+				for future in as_completed(futures):
+					records, count = future.result() or ([], 0)
+					yield from records
+				return
 			
-			response = boto3_client.scan(
-				TableName = self.name,
-				ProjectionExpression = projection_expression,
-				ExpressionAttributeNames = expression_attribute_names
-			)
+			results = []
+			for future in futures:
+				records, count = future.result() or ([], 0)
+				results.append(records)
+			sort_name = key_source.sort_key.name
+			reverse = False
+			# Only Table.query() honors order_by
+			if key_source is self and args and type(args.get('order_by')) is list:
+				for element in args['order_by']:
+					if element.get('field') == sort_name and element.get('order') == 'desc':
+						reverse = True
+			for record in heapq.merge(*results, key=lambda record: record[sort_name], reverse=reverse):
+				if strip_sort_key:
+					record.pop(sort_name, None)
+				yield record
+		finally:
+			executor.shutdown(wait=False, cancel_futures=True)
+	
+	"""
+	Pages through a partition with an opaque cursor built from LastEvaluatedKey, so deeper pages
+	don't re-read earlier items. Pass the returned next_cursor back to get the following page;
+	it is None on the last page. A cursor that doesn't decode, or came from another partition,
+	raises AttributeError.
+	count is None unless requested:
+		'estimate' - items returned so far plus one more page if there is one; no extra reads
+		'exact' - query_count() of the whole key condition
+	records, next_cursor, count = table.query_page(partition_key_value)
+	records, next_cursor, count = table.query_page(partition_key_value, {
+		"sort_key_value": value,
+		"sort_key_value_end": value,  # Required by sort_key_operator 'between'
+		"sort_key_operator": '='|'<'|'<='|'>'|'>='|'begins_with'|'between',  # defaults to '='
+		"limit": int,
+		"cursor": next_cursor,
+		"count": 'estimate'|'exact',
+		"fields": ['field1', 'field2']  # Only return these fields
+	})
+	"""
+	def query_page(self, partition_key_value, args={}):
+		return self._query_page(self, None, partition_key_value, args)
+	
+	def _query_page(self, key_source, index_name, partition_key_value, args={}):
+		if args and type(args) is not dict:
+			raise AttributeError("args must be dict")
+		
+		key_condition, attribute_names, attribute_values = key_source.get_key_condition_expressions(partition_key_value, args)
+		
+		limit = None
+		if 'limit' in args:
+			limit = common.convert_to_int(args['limit'])
+			if limit is not None and limit < 1:
+				limit = None
+		if not limit:
+			limit = self.get_max_limit()
+		
+		# Like Index.query(), order_by only applies to table queries
+		sort_forward = True
+		if 'order_by' in args and type(args['order_by']) is list and key_source is self and self.sort_key:
+			for element in args['order_by']:
+				if 'field' in element and element['field'] == self.sort_key.name:
+					if 'order' in element and element['order'] == 'desc':
+						sort_forward = False
+		
+		query_args = {
+			"TableName": self.name,
+			"KeyConditionExpression": key_condition,
+			"ExpressionAttributeNames": attribute_names,
+			"ExpressionAttributeValues": attribute_values,
+			"ScanIndexForward": sort_forward,
+			"Limit": limit
+		}
+		if index_name:
+			query_args['IndexName'] = index_name
+		self._add_projection_args(query_args, args.get('fields'))
+		seen = 0
+		if args.get('cursor'):
+			query_args['ExclusiveStartKey'], seen = self._get_cursor_start_key(key_source, args['cursor'], attribute_values[':pvalue'])
+		
+		try:
+			response = self._request('query', 'read', **query_args)
 		except ClientError as e:
 			print("error:", e)
-			raise ConnectionError("Failed to scan DynamodDB", self.name)
+			raise ConnectionError("Failed to query table '{}'".format(self.name))
 		
-		self.ui.debug(f"get_keys: {response}")
 		if not common.is_success(response) or 'Items' not in response:
-			return None
+			return [], None, None
+		records = self.convert_from_item(response['Items'])
 		
-		items = response['Items']
-		while 'LastEvaluatedKey' in response:
-			response = boto3_client.scan(
-				TableName = self.name,
-				ProjectionExpression = projection_expression,
-				ExpressionAttributeNames = expression_attribute_names,
-				ExclusiveStartKey=response['LastEvaluatedKey']
-			)
+		next_cursor = None
+		if 'LastEvaluatedKey' in response:
+			next_cursor = _encode_cursor(response['LastEvaluatedKey'], seen + len(records))
+		
+		count = None
+		if args.get('count') == 'exact':
+			count = key_source.query_count(partition_key_value, args)
+		elif args.get('count') == 'estimate':
+			count = seen + len(records)
+			if next_cursor:
+				count += limit
+		self.ui.debug(f"query_page {self.name}: {len(records)}")
+		return records, next_cursor, count
+	
+	"""
+	Decodes a query_page() cursor, checking it continues a query of the same partition and has
+	every key attribute ExclusiveStartKey needs; raises AttributeError if not.
+	start_key, seen = table._get_cursor_start_key(key_source, cursor, partition_attribute_value)
+	"""
+	def _get_cursor_start_key(self, key_source, cursor, partition_attribute_value):
+		start_key, seen = _decode_cursor(cursor)
+		key_names = [key.name for key in [self.partition_key, self.sort_key, key_source.partition_key, key_source.sort_key] if key]
+		if start_key.get(key_source.partition_key.name) != partition_attribute_value or not set(key_names) <= set(start_key):
+			raise AttributeError("Invalid cursor")
+		return start_key, seen
+	
+	"""
+	for response in table._scan_pages(scan_args, page_size=None):
+	"""
+	def _scan_pages(self, scan_args, page_size=None):
+		scan_args = dict(scan_args)
+		scan_args['TableName'] = self.name
+		if page_size:
+			scan_args['Limit'] = page_size
+		while True:
+			try:
+				response = self._request('scan', 'read', **scan_args)
+			except ClientError as e:
+				print("error:", e)
+				raise ConnectionError("Failed to scan DynamodDB", self.name)
+			
+			if not common.is_success(response) or 'Items' not in response:
+				self.ui.debug(f"scan {self.name}: no response")
+				return
+			yield response
+			
+			if 'LastEvaluatedKey' not in response:
+				return
+			scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+	
+	"""
+	Runs a segmented scan on a thread pool and yields pages as each segment returns them.
+	for response in table._parallel_scan_pages(scan_args, segments, workers=None, page_size=None):
+	"""
+	def _parallel_scan_pages(self, scan_args, segments, workers=None, page_size=None):
+		segments = max(common.convert_to_int(segments) or 1, 1)
+		workers = min(common.convert_to_int(workers) or segments, segments)
+		
+		# Bounded so fast segments can't buffer the whole table ahead of the consumer
+		pages = queue.Queue(maxsize=workers * 2)
+		stop = threading.Event()
+		segment_done = object()
+		
+		def put(page):
+			while not stop.is_set():
+				try:
+					pages.put(page, timeout=0.1)
+					return True
+				except queue.Full:
+					continue
+			return False
+		
+		def scan_segment(segment):
+			try:
+				segment_args = dict(scan_args, Segment=segment, TotalSegments=segments)
+				for response in self._scan_pages(segment_args, page_size):
+					if not put(response):
+						return
+			except Exception as e:
+				put(e)
+			put(segment_done)
+		
+		executor = ThreadPoolExecutor(max_workers=workers)
+		try:
+			for segment in range(segments):
+				executor.submit(scan_segment, segment)
+			remaining = segments
+			while remaining:
+				page = pages.get()
+				if page is segment_done:
+					remaining -= 1
+				elif isinstance(page, Exception):
+					raise page
+				else:
+					yield page
+		finally:
+			stop.set()
+			executor.shutdown(wait=False, cancel_futures=True)
+	
+	"""
+	for record in table._iter_scan_records(scan_args, page_size=None, max_items=None, segments=None, workers=None):
+	"""
+	def _iter_scan_records(self, scan_args, page_size=None, max_items=None, segments=None, workers=None):
+		page_size = common.convert_to_int(page_size) or None
+		max_items = common.convert_to_int(max_items) or None
+		# Without a filter every scanned item is returned, so don't read past max_items
+		if max_items and 'FilterExpression' not in scan_args:
+			page_size = min(page_size or max_items, max_items)
+		
+		if segments and common.convert_to_int(segments) > 1:
+			page_source = self._parallel_scan_pages(scan_args, segments, workers=workers, page_size=page_size)
+		else:
+			page_source = self._scan_pages(scan_args, page_size)
+		
+		# Close the page source as soon as we stop, so parallel segments stop scanning too
+		count = 0
+		try:
+			for response in page_source:
+				for item in response['Items']:
+					yield self.convert_from_item(item)
+					count += 1
+					if max_items and count >= max_items:
+						return
+		finally:
+			page_source.close()
+	
+	def _get_scan_filter_args(self, filters=None, fields=None):
+		scan_args = {}
+		filter_expression, attribute_names, attribute_values = self.get_filter_expression(filters)
+		if filter_expression:
+			scan_args = {
+				"FilterExpression": filter_expression,
+				"ExpressionAttributeNames": attribute_names,
+				"ExpressionAttributeValues": attribute_values
+			}
+		return self._add_projection_args(scan_args, fields)
+	
+	def _get_keys_projection_args(self, included_fields=None):
+		projection_expression, expression_attribute_names = self.get_projection_expression(included_fields, include_keys=True)
+		return {
+			"ProjectionExpression": projection_expression,
+			"ExpressionAttributeNames": expression_attribute_names
+		}
+	
+	"""
+	records = table.get_keys()
+	records = table.get_keys(['extra_fields'])
+	"""
+	def get_keys(self, included_fields=None):
+		items = []
+		found = False
+		for response in self._scan_pages(self._get_keys_projection_args(included_fields)):
+			found = True
 			items.extend(response['Items'])
+		if not found:
+			return None
+		
 		final_items = self.convert_from_item(items)
+		self.ui.debug(f"get_keys {self.name}: {len(final_items)}")
 		if self.sort_key:
 			final_items = sorted(final_items, key=lambda x: x[self.sort_key.name])
 		return final_items
 	
+	"""
+	Yields key records page by page without holding the whole table in memory.
+	Records are in scan order, not sorted like get_keys().
+	Pass segments to scan in parallel; see parallel_scan().
+	for record in table.iter_keys():
+	for record in table.iter_keys(['extra_fields'], page_size=500, max_items=10000):
+	for record in table.iter_keys(segments=8, workers=4):
+	"""
+	def iter_keys(self, included_fields=None, page_size=None, max_items=None, segments=None, workers=None):
+		return self._iter_scan_records(self._get_keys_projection_args(included_fields), page_size=page_size, max_items=max_items, segments=segments, workers=workers)
+	
 	"""
 	list_of_keys = table.get_keys_as_list()
+	list_of_keys = table.get_keys_as_list(segments=8)
 	"""
-	def get_keys_as_list(self):
-		full_key_list = self.get_keys()
+	def get_keys_as_list(self, segments=None, workers=None):
 		key_list = []
-		for key_set in full_key_list:
+		for key_set in self.iter_keys(segments=segments, workers=workers):
 			key_list.append(key_set[self.partition_key.name])
 		return key_list
 	
@@ -602,59 +1683,65 @@ class Table:
 		"operator": "contains" | "begins_with",
 		"value": field_value
 	}])
+	records = table.scan(filters, fields=['field1', 'field2'])
 	"""
-	def scan(self, filters=None, scan_all=True):
-		response = {}
+	def scan(self, filters=None, scan_all=True, fields=None):
 		items = []
-		
-		filter_expression, attribute_names, attribute_values = self.get_filter_expression(filters)
-		
-		try:
-			if filter_expression:
-				response = boto3_client.scan(
-					TableName = self.name,
-					FilterExpression=filter_expression,
-					ExpressionAttributeNames=attribute_names,
-					ExpressionAttributeValues=attribute_values
-				)
-			else:
-				response = boto3_client.scan(
-					TableName = self.name
-				)
-		except ClientError as e:
-			print("error:", e)
-			raise ConnectionError("Failed to scan DynamodDB", self.name)
-		
-		if not common.is_success(response) or 'Items' not in response:
-			self.ui.debug(f"scan {self.name}: no response")
+		found = False
+		for response in self._scan_pages(self._get_scan_filter_args(filters, fields)):
+			found = True
+			items.extend(response['Items'])
+			if not scan_all:
+				break
+		if not found:
 			return None
 		
-		items = response['Items']
-		if scan_all:
-			while 'LastEvaluatedKey' in response:
-				if filter_expression:
-					response = boto3_client.scan(
-						TableName = self.name,
-						ExclusiveStartKey=response['LastEvaluatedKey'],
-						FilterExpression=filter_expression,
-						ExpressionAttributeNames=attribute_names,
-						ExpressionAttributeValues=attribute_values
-					)
-				else:
-					response = boto3_client.scan(
-						TableName = self.name,
-						ExclusiveStartKey=response['LastEvaluatedKey']
-					)
-				items.extend(response['Items'])
 		results = self.convert_from_item(items)
 		self.ui.debug("scan {}: {}".format(self.name, len(results)))
 		return results
 	
+	"""
+	Same filters as scan(). Yields converted records page by page so large tables can be
+	processed in constant memory.
+	Pass segments to scan in parallel; see parallel_scan().
+	for record in table.iter_scan():
+	for record in table.iter_scan(filters, page_size=500, max_items=10000):
+	for record in table.iter_scan(filters, segments=8, workers=4):
+	for record in table.iter_scan(filters, fields=['field1', 'field2']):
+	"""
+	def iter_scan(self, filters=None, page_size=None, max_items=None, segments=None, workers=None, fields=None):
+		return self._iter_scan_records(self._get_scan_filter_args(filters, fields), page_size=page_size, max_items=max_items, segments=segments, workers=workers)
+	
+	"""
+	Same filters as scan(). Splits the table into segments (Segment/TotalSegments) and scans
+	them on a thread pool of workers (defaults to one per segment). Records from different
+	segments are interleaved in arrival order.
+	records = table.parallel_scan()
+	records = table.parallel_scan(filters, segments=8, workers=4)
+	for record in table.parallel_scan(filters, segments=8, as_list=False):
+	records = table.parallel_scan(filters, fields=['field1', 'field2'])
+	"""
+	def parallel_scan(self, filters=None, segments=4, workers=None, as_list=True, fields=None):
+		records = self.iter_scan(filters, segments=segments, workers=workers, fields=fields)
+		if not as_list:
+			return records
+		results = list(records)
+		self.ui.debug("parallel_scan {}: {}".format(self.name, len(results)))
+		return results
+	
 	
 	"""
+	condition takes the same format as get_condition_expression(). Returns False if the condition fails.
+	With return_values (ALL_OLD, UPDATED_OLD, ALL_NEW, UPDATED_NEW), returns those attributes as a dict.
+	If item has only key fields and no condition, nothing is written and True is returned. With a
+	condition, an UpdateItem with no update expression checks it: an existing item is left as is,
+	and like any update, a missing item is created (key fields only) if the condition allows it.
 	table.update_item(item)
+	table.update_item(item, remove_keys=['old_field'])
+	table.update_item({ "id": "a" }, add={ "views": 1 }, return_values='UPDATED_NEW')
+	table.update_item(item, condition={ "name": "version", "operator": "=", "value": 3 })
 	"""
-	def update_item(self, item, remove_keys=None):
+	def update_item(self, item, remove_keys=None, add=None, condition=None, return_values=None):
 		if type(item) is not dict:
 			raise TypeError("item must be a dict")
 			return
@@ -672,66 +1759,112 @@ class Table:
 				return
 			key_object[self.sort_key.name] = self.convert_to_attribute_value(item[self.sort_key.name], self.sort_key.type)
 		
-		update_expression, attribute_names, attribute_values = self.get_update_expression(item, remove_keys)
+		update_expression, attribute_names, attribute_values = self.get_update_expression(item, remove_keys, add)
 		if update_expression and type(update_expression) == type(True):
-			return True
-		self.ui.debug("key_object {}: {}".format(type(key_object), key_object))
-		self.ui.debug("update_expression {}: {}".format(type(update_expression), update_expression))
-		self.ui.debug("attribute_names {}: {}".format(type(attribute_names), attribute_names))
-		self.ui.debug("attribute_values {}: {}".format(type(attribute_values), attribute_values))
+			if not condition:
+				return True
+			# Nothing to update, but the condition still decides the result
+			update_expression, attribute_names, attribute_values = None, {}, {}
+		self.ui.debug_payload(f"update_item {self.name} key", key_object)
+		self.ui.debug_payload(f"update_item {self.name} expression", update_expression)
+		self.ui.debug_payload(f"update_item {self.name} names", attribute_names)
+		self.ui.debug_payload(f"update_item {self.name} values", attribute_values)
 		
 		if self.dry_run:
 			self.ui.dry_run("Update item: {}".format(item))
 			if remove_keys:
 				self.ui.dry_run("Remove keys: ['{}']".format("', '".join(remove_keys)))
+			if add:
+				self.ui.dry_run("Add: {}".format(add))
+			if condition:
+				self.ui.dry_run("Condition: {}".format(condition))
 			return True
+		request_args = {
+			"TableName": self.name,
+			"Key": key_object
+		}
+		if update_expression:
+			request_args['UpdateExpression'] = update_expression
+			request_args['ExpressionAttributeNames'] = attribute_names
+		if attribute_values:
+			request_args['ExpressionAttributeValues'] = attribute_values
+		self._add_condition_args(request_args, condition)
+		if return_values:
+			request_args['ReturnValues'] = return_values.upper()
 		try:
-			response = boto3_client.update_item(
-				TableName = self.name,
-				Key = key_object,
-				UpdateExpression = update_expression,
-				ExpressionAttributeNames = attribute_names,
-				ExpressionAttributeValues = attribute_values
-			)
+			response = self._request('update_item', 'write', **request_args)
 		except ClientError as e:
+			if self._is_condition_failure(e):
+				self.ui.debug(f"update_item {self.name}: condition failed")
+				return False
 			self.ui.debug(f"error: {e}")
 			raise ConnectionError("Failed to update DynamodDB", self.name)
 		else:
-			self.ui.debug(f"response: {response}")
-			if common.is_success(response):
-				return True
+			self.ui.debug_payload(f"update_item {self.name} response", response)
+			return self._get_write_result(response, return_values)
+		finally:
+			# After the write, so a get_item() running alongside it can't cache the old item
+			self._invalidate_cached_item(key_object)
 		return False
 	
+	def _is_condition_failure(self, error):
+		return error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+	
+	def _get_write_result(self, response, return_values):
+		if not common.is_success(response):
+			return False
+		if return_values and return_values.upper() != 'NONE':
+			return self.convert_from_item(response.get('Attributes', {}))
+		return True
+	
 	"""
+	condition takes the same format as get_condition_expression(). Returns False if the condition fails.
+	With return_values='ALL_OLD', returns the replaced item as a dict.
 	table.put_item(item)
+	table.put_item(item, condition='not_exists')
 	"""
-	def put_item(self, item):
+	def put_item(self, item, condition=None, return_values=None):
 		if type(item) is not dict:
 			return
-		new_item = self.convert_to_item(item)
-# 		print("new_item {}: {}".format(type(new_item), new_item))
 		if self.dry_run:
 			self.ui.dry_run("Put item: {}".format(item))
+			if condition:
+				self.ui.dry_run("Condition: {}".format(condition))
 			return True
+		new_item = self.convert_to_item(item)
+		request_args = {
+			"TableName": self.name,
+			"Item": new_item
+		}
+		self._add_condition_args(request_args, condition)
+		if return_values:
+			request_args['ReturnValues'] = return_values.upper()
+		key_object = { self.partition_key.name: new_item.get(self.partition_key.name) }
+		if self.sort_key:
+			key_object[self.sort_key.name] = new_item.get(self.sort_key.name)
 		try:
-			response = boto3_client.put_item(
-				TableName = self.name,
-				Item = self.convert_to_item(item)
-			)
+			response = self._request('put_item', 'write', **request_args)
 		except ClientError as e:
+			if self._is_condition_failure(e):
+				self.ui.debug(f"put_item {self.name}: condition failed")
+				return False
 			self.ui.debug(f"error: {e}")
 			raise ConnectionError("Failed to put item DynamodDB", self.name)
 		else:
-			self.ui.debug(f"response: {response}")
-			if common.is_success(response):
-				return True
+			self.ui.debug_payload(f"put_item {self.name} response", response)
+			return self._get_write_result(response, return_values)
+		finally:
+			self._invalidate_cached_item(key_object)
 		return False
 
 	"""
+	condition takes the same format as get_condition_expression(). Returns False if the condition fails.
+	With return_values='ALL_OLD', returns the deleted item as a dict.
 	table.delete_item(partition_key_value)
 	table.delete_item(partition_key_value, sort_key_value)
+	table.delete_item(partition_key_value, condition={ "name": "status", "value": "draft" })
 	"""
-	def delete_item(self, partition_key_value, sort_key_value=None):
+	def delete_item(self, partition_key_value, sort_key_value=None, condition=None, return_values=None):
 		key_hash = {
 			self.partition_key.name: partition_key_value
 		}
@@ -745,19 +1878,844 @@ class Table:
 			else:
 				self.ui.dry_run(f"Delete item {self.name}.{partition_key_value}")
 			return True
+		request_args = {
+			"TableName": self.name,
+			"Key": key_hash
+		}
+		self._add_condition_args(request_args, condition)
+		if return_values:
+			request_args['ReturnValues'] = return_values.upper()
 		try:
-			response = boto3_client.delete_item(
-				TableName = self.name,
-				Key = key_hash
-			)
+			response = self._request('delete_item', 'write', **request_args)
 		except ClientError as e:
+			if self._is_condition_failure(e):
+				self.ui.debug(f"delete_item {self.name}: condition failed")
+				return False
 			self.ui.debug(f"error: {e}")
 			raise ConnectionError("Failed to delete item", self.name)
 		else:
-			self.ui.debug(f"response: {response}")
+			self.ui.debug_payload(f"delete_item {self.name} response", response)
+			return self._get_write_result(response, return_values)
+		finally:
+			self.invalidate_cached_item(partition_key_value, sort_key_value)
+		return False
+	
+	"""
+	Writes up to 100 actions in one all-or-nothing TransactWriteItems request.
+	Each action names one of put, update, delete, or check, plus an optional condition and table
+	(another Table, for transactions across tables). update actions also take remove_keys and add;
+	one with only key fields is sent as a check of its condition, or left out if it has none.
+	Returns False if the transaction was canceled, for example by a failed condition.
+	success = table.transact_write([
+		{ "put": record, "condition": "not_exists" },
+		{ "update": { "id": "a", "status": "sold" }, "condition": { "name": "status", "value": "open" } },
+		{ "update": { "name": "stats" }, "add": { "sold": 1 }, "table": stats_table },
+		{ "delete": ("b", 2) },
+		{ "check": "c", "condition": "exists" }
+	], token=request_id)
+	"""
+	def transact_write(self, actions, token=None):
+		if type(actions) is not list:
+			raise TypeError("actions must be a list")
+		if not actions:
+			return True
+		if len(actions) > transact_max_items:
+			raise AttributeError("transact_write supports at most {} actions".format(transact_max_items))
+		
+		transact_items = []
+		key_objects = []
+		for action in actions:
+			if type(action) is not dict:
+				raise TypeError("Each action must be a dict")
+			table = action.get('table') or self
+			if 'put' in action:
+				request = {
+					"TableName": table.name,
+					"Item": table.convert_to_item(action['put'])
+				}
+				key_object = table._get_key_from_item(action['put'])
+				action_type = 'Put'
+			elif 'update' in action:
+				key_object = table._get_key_from_item(action['update'])
+				update_expression, attribute_names, attribute_values = table.get_update_expression(action['update'], action.get('remove_keys'), action.get('add'))
+				if type(update_expression) is bool:
+					# Nothing to update; a condition still has to hold for the transaction
+					if not action.get('condition'):
+						continue
+					request = {
+						"TableName": table.name,
+						"Key": key_object
+					}
+					action_type = 'ConditionCheck'
+				else:
+					request = {
+						"TableName": table.name,
+						"Key": key_object,
+						"UpdateExpression": update_expression,
+						"ExpressionAttributeNames": attribute_names
+					}
+					if attribute_values:
+						request['ExpressionAttributeValues'] = attribute_values
+					action_type = 'Update'
+			elif 'delete' in action or 'check' in action:
+				action_type = 'Delete' if 'delete' in action else 'ConditionCheck'
+				key_value, sort_value = table.split_key(action.get('delete', action.get('check')))
+				key_object = table.get_key_object(key_value, sort_value)
+				request = {
+					"TableName": table.name,
+					"Key": key_object
+				}
+				if action_type == 'ConditionCheck' and not action.get('condition'):
+					raise AttributeError("check actions require a condition")
+			else:
+				raise AttributeError("Each action requires put, update, delete, or check")
+			table._add_condition_args(request, action.get('condition'))
+			transact_items.append({ action_type: request })
+			if action_type != 'ConditionCheck':
+				key_objects.append((table, key_object))
+		
+		if self.dry_run:
+			for transact_item in transact_items:
+				self.ui.dry_run("Transact write: {}".format(transact_item))
+			return True
+		if not transact_items:
+			return True
+		
+		request_args = { "TransactItems": transact_items }
+		if token:
+			request_args['ClientRequestToken'] = str(token)
+		try:
+			response = self._request('transact_write_items', 'write', **request_args)
+		except ClientError as e:
+			if e.response.get('Error', {}).get('Code') == 'TransactionCanceledException':
+				self.ui.debug_payload(f"transact_write {self.name} canceled", e.response.get('CancellationReasons'))
+				return False
+			self.ui.debug(f"error: {e}")
+			raise ConnectionError("Failed to transact write", self.name)
+		else:
+			self.ui.debug_payload(f"transact_write {self.name} response", response)
 			if common.is_success(response):
 				return True
+		finally:
+			for table, key_object in key_objects:
+				table._invalidate_cached_item(key_object)
 		return False
+	
+	"""
+	Reads up to 100 items in one consistent TransactGetItems request.
+	Keys are the same as batch_get_items(), or dicts with a key and an optional table.
+	Returns records in the order of keys, with None for missing items.
+	records = table.transact_get(['a', 'b'])
+	records = table.transact_get([ ("a", 1), { "key": "stats", "table": stats_table } ], projection=['id', 'name'])
+	"""
+	def transact_get(self, keys, projection=None):
+		if type(keys) is not list:
+			raise TypeError("keys must be a list")
+		if not keys:
+			return []
+		if len(keys) > transact_max_items:
+			raise AttributeError("transact_get supports at most {} keys".format(transact_max_items))
+		
+		transact_items = []
+		tables = []
+		for key in keys:
+			table = self
+			if type(key) is dict and 'key' in key:
+				table = key.get('table') or self
+				key = key['key']
+			key_value, sort_value = table.split_key(key)
+			request = {
+				"TableName": table.name,
+				"Key": table.get_key_object(key_value, sort_value)
+			}
+			if projection:
+				projection_expression, attribute_names = table.get_projection_expression(projection, include_keys=True)
+				request['ProjectionExpression'] = projection_expression
+				request['ExpressionAttributeNames'] = attribute_names
+			transact_items.append({ "Get": request })
+			tables.append(table)
+		
+		try:
+			response = self._request('transact_get_items', 'read', TransactItems=transact_items)
+		except ClientError as e:
+			self.ui.debug(f"error: {e}")
+			raise ConnectionError("Failed to transact get", self.name)
+		
+		records = []
+		for table, result in zip(tables, response.get('Responses', [])):
+			records.append(table.convert_from_item(result['Item']) if 'Item' in result else None)
+		return records
+	
+	"""
+	Decodes the records of a DynamoDB Streams event, as delivered to Lambda, that belong to this table.
+	Images go through convert_from_item(). Cached get_item() results and counts for changed keys are dropped.
+	[
+		{
+			"event": "MODIFY",  # INSERT, MODIFY or REMOVE
+			"key": { "artist_id": "floris_arntzenius", "name": "landscape" },
+			"new": { ... },  # None for REMOVE, or for KEYS_ONLY and OLD_IMAGE streams
+			"old": { ... },  # None unless the stream has OLD_IMAGE or NEW_AND_OLD_IMAGES
+			"sequence": 111100000000012345678901
+		}
+	]
+	changes = table.convert_stream_records(event)
+	changes = table.convert_stream_records(event['Records'])
+	"""
+	def convert_stream_records(self, event):
+		records = event
+		if type(event) is dict:
+			records = event.get('Records')
+		
+		changes = []
+		for record in records or []:
+			if record.get('eventSource', 'aws:dynamodb') != 'aws:dynamodb':
+				continue
+			if not self._is_stream_source(record.get('eventSourceARN')):
+				continue
+			stream_record = record.get('dynamodb') or {}
+			keys = stream_record.get('Keys')
+			if not keys:
+				continue
+			
+			key_names = [self.partition_key.name]
+			if self.sort_key:
+				key_names.append(self.sort_key.name)
+			self._invalidate_cached_item({ name: keys[name] for name in key_names if name in keys })
+			
+			new_image = stream_record.get('NewImage')
+			old_image = stream_record.get('OldImage')
+			sequence = stream_record.get('SequenceNumber')
+			changes.append({
+				"event": record.get('eventName'),
+				"key": self.convert_from_item(keys),
+				"new": self.convert_from_item(new_image) if new_image else None,
+				"old": self.convert_from_item(old_image) if old_image else None,
+				"sequence": int(sequence) if sequence else None
+			})
+		self.ui.debug(f"convert_stream_records {self.name}: {len(changes)}")
+		return changes
+	
+	def _is_stream_source(self, event_source_arn):
+		# arn:aws:dynamodb:us-west-2:123456789012:table/table_name/stream/2023-08-11T11:06:33.182
+		if not event_source_arn:
+			return True
+		parts = event_source_arn.split(':', 5)
+		if len(parts) < 6:
+			return False
+		resource = parts[5].split('/')
+		return len(resource) > 1 and resource[1] == self.name
+	
+	"""
+	with table.batch_writer() as writer:
+		writer.put_item(record)
+		writer.delete_item(partition_key_value, sort_key_value)
+	stats = writer.stats
+	"""
+	def batch_writer(self, workers=4):
+		return BatchWriter(self, workers=workers, ui=self.ui, dry_run=self.dry_run)
+	
+	"""
+	stats = table.bulk_put(records)
+	stats = table.bulk_put(common.map_csv(common.read_csv(filepath), mapping), workers=8)
+	"""
+	def bulk_put(self, records, workers=4):
+		with self.batch_writer(workers=workers) as writer:
+			for record in records:
+				writer.put_item(record)
+		return writer.stats
+	
+	"""
+	Keys may be partition key values, (partition, sort) tuples, or dicts with the key fields.
+	stats = table.bulk_delete(keys)
+	"""
+	def bulk_delete(self, keys, workers=4):
+		with self.batch_writer(workers=workers) as writer:
+			for key in keys:
+				key_value, sort_value = self.split_key(key)
+				writer.delete_item(key_value, sort_value)
+		return writer.stats
+
+
+
+
+class BatchWriter:
+	"""
+	Groups puts and deletes into 25-item BatchWriteItem requests sent from a small worker pool.
+	Unprocessed items are retried with jittered backoff. A later write to the same key in a
+	pending batch replaces the earlier one. A write to a key whose batch is still in flight
+	waits for that batch, so writes to one key land in the order they were made.
+	
+	with table.batch_writer() as writer:
+	with moses_common.dynamodb.BatchWriter(table, workers=4, ui=ui, dry_run=dry_run) as writer:
+		writer.put_item(record)
+		writer.delete_item(partition_key_value, sort_key_value)
+	stats = writer.stats
+	"""
+	def __init__(self, table, workers=4, ui=None, dry_run=False):
+		self.dry_run = dry_run
+		self.ui = ui or moses_common.ui.Interface()
+		
+		self.table = table
+		self.workers = max(common.convert_to_int(workers) or 1, 1)
+		self._key_names = [table.partition_key.name]
+		if table.sort_key:
+			self._key_names.append(table.sort_key.name)
+		self._batch = []
+		self._batch_keys = {}
+		self._executor = None
+		self._pending = {}
+		self._inflight = {}
+		self._lock = threading.Lock()
+		self._counts = {
+			"put": 0,
+			"delete": 0,
+			"requests": 0,
+			"retries": 0
+		}
+		self._start_time = None
+		self._end_time = None
+	
+	def __enter__(self):
+		self.open()
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+		return False
+	
+	"""
+	{
+		"put": 1200,
+		"delete": 0,
+		"requests": 48,
+		"retries": 2,
+		"seconds": 1.52,
+		"items_per_second": 789.5
+	}
+	"""
+	@property
+	def stats(self):
+		with self._lock:
+			stats = dict(self._counts)
+		seconds = 0
+		if self._start_time:
+			seconds = (self._end_time or time.time()) - self._start_time
+		stats['seconds'] = round(seconds, 3)
+		stats['items_per_second'] = 0
+		if seconds:
+			stats['items_per_second'] = round((stats['put'] + stats['delete']) / seconds, 1)
+		return stats
+	
+	def open(self):
+		if not self._start_time:
+			self._start_time = time.time()
+		if not self._executor and not self.dry_run:
+			self._executor = ThreadPoolExecutor(max_workers=self.workers)
+	
+	def put_item(self, record):
+		if type(record) is not dict:
+			raise TypeError("record must be a dict")
+		if self.dry_run:
+			self.ui.dry_run("Put item: {}".format(record))
+		item = self.table.convert_to_item(record)
+		self._add('put', { "PutRequest": { "Item": item } }, item)
+	
+	def delete_item(self, partition_key_value, sort_key_value=None):
+		key_object = self.table.get_key_object(partition_key_value, sort_key_value)
+		if self.dry_run:
+			if sort_key_value is not None:
+				self.ui.dry_run(f"Delete item {self.table.name}.{partition_key_value}.{sort_key_value}")
+			else:
+				self.ui.dry_run(f"Delete item {self.table.name}.{partition_key_value}")
+		self._add('delete', { "DeleteRequest": { "Key": key_object } }, key_object)
+	
+	def _add(self, action, request, item):
+		self.open()
+		with self._lock:
+			self._counts[action] += 1
+		if self.dry_run:
+			return
+		
+		# BatchWriteItem rejects more than one request for the same key
+		key_id = self.table._get_key_id(item, self._key_names)
+		if key_id in self._batch_keys:
+			self._batch[self._batch_keys[key_id]] = request
+			return
+		
+		# Batches run concurrently, so an earlier write to this key could land after this one
+		future = self._inflight.get(key_id)
+		if future:
+			self._collect(wait([future]).done)
+		
+		self._batch_keys[key_id] = len(self._batch)
+		self._batch.append(request)
+		if len(self._batch) >= batch_write_max_items:
+			self.flush()
+	
+	def flush(self):
+		if not self._batch:
+			return
+		requests = self._batch
+		key_ids = list(self._batch_keys)
+		self._batch = []
+		self._batch_keys = {}
+		
+		# Keep the number of batches in flight bounded
+		while len(self._pending) >= self.workers * 2:
+			self._collect(wait(list(self._pending), return_when=FIRST_COMPLETED).done)
+		future = self._executor.submit(self._send, requests)
+		self._pending[future] = key_ids
+		for key_id in key_ids:
+			self._inflight[key_id] = future
+	
+	def close(self):
+		try:
+			if self._executor:
+				self.flush()
+				self._collect(wait(list(self._pending)).done)
+		finally:
+			if self._executor:
+				self._executor.shutdown(wait=True)
+				self._executor = None
+			self._end_time = time.time()
+		
+		stats = self.stats
+		self.ui.info("batch_writer {}: {} puts, {} deletes, {} requests, {} retries in {}s ({}/s)".format(self.table.name, stats['put'], stats['delete'], stats['requests'], stats['retries'], stats['seconds'], stats['items_per_second']))
+	
+	def _collect(self, futures):
+		for future in futures:
+			for key_id in self._pending.pop(future, []):
+				if self._inflight.get(key_id) is future:
+					del self._inflight[key_id]
+		for future in futures:
+			error = future.exception()
+			if error:
+				raise error
+	
+	def _send(self, requests):
+		try:
+			self._send_batch(requests)
+		finally:
+			# After the write, so a get_item() running alongside it can't cache the old item
+			for request in requests:
+				if 'PutRequest' in request:
+					item = request['PutRequest']['Item']
+				else:
+					item = request['DeleteRequest']['Key']
+				self.table._invalidate_cached_item({ name: item[name] for name in self._key_names if name in item })
+	
+	def _send_batch(self, requests):
+		attempt = 0
+		while True:
+			try:
+				response = self.table._request('batch_write_item', 'write',
+					RequestItems = { self.table.name: requests }
+				)
+			except ClientError as e:
+				print("error:", e)
+				raise ConnectionError("Failed to batch write items to table '{}'".format(self.table.name))
+			with self._lock:
+				self._counts['requests'] += 1
+			
+			requests = response.get('UnprocessedItems', {}).get(self.table.name)
+			if not requests:
+				return
+			
+			attempt += 1
+			if attempt > batch_max_retries:
+				raise ConnectionError("Failed to batch write {} items to table '{}'".format(len(requests), self.table.name))
+			with self._lock:
+				self._counts['retries'] += 1
+			self.ui.debug(f"batch_writer {self.table.name}: retry {len(requests)} unprocessed items")
+			self.table._backoff(attempt)
+
+
+
+
+class QueryPlan:
+	"""
+	A query compiled once from an args template, for endpoints that run the same query shape
+	many times. The key condition, attribute names, projection, limit and sort order are built
+	up front; each call only converts and binds the partition and sort key values. That saves
+	request building (about half of it in benchmarks/dynamodb_table.py), not DynamoDB time.
+	Takes the same args as Table.query(). The sort key condition is included when the template
+	has sort_key_operator or sort_key_value; values passed to a call override the template's.
+	
+	plan = table.prepare_query({ "sort_key_operator": "between", "limit": 100 })
+	plan = index.prepare_query({ "fields": ['id', 'name'] })
+	records, total = plan.query(partition_key_value, sort_key_value, sort_key_value_end)
+	records, next_cursor, count = plan.query_page(partition_key_value, cursor=cursor, count='estimate')
+	count = plan.query_count(partition_key_value)
+	"""
+	def __init__(self, table, index=None, args={}):
+		if args and type(args) is not dict:
+			raise AttributeError("args must be dict")
+		args = args or {}
+		self.table = table
+		self.index = index
+		self.ui = table.ui
+		self.key_source = index or table
+		self.index_name = index.name if index else None
+		self.args = dict(args)
+		
+		partition_key = self.key_source.partition_key
+		sort_key = self.key_source.sort_key
+		self.key_condition = '#pkey = :pvalue'
+		self.attribute_names = { "#pkey": partition_key.name }
+		self._sort_value_count = 0
+		if sort_key and ('sort_key_value' in args or 'sort_key_operator' in args):
+			sort_key_operator = args.get('sort_key_operator', '=')
+			self.attribute_names["#skey"] = sort_key.name
+			if sort_key_operator == 'between':
+				self.key_condition += ' AND #skey BETWEEN :svalue AND :svalue2'
+				self._sort_value_count = 2
+			elif sort_key_operator == 'begins_with':
+				self.key_condition += ' AND begins_with (#skey, :svalue)'
+				self._sort_value_count = 1
+			elif sort_key_operator in ['=', '<', '<=', '>', '>=']:
+				self.key_condition += ' AND #skey {} :svalue'.format(sort_key_operator)
+				self._sort_value_count = 1
+			else:
+				raise AttributeError("Invalid sort_key_operator '{}' for table '{}'".format(sort_key_operator, table.name))
+		
+		limit = None
+		if 'limit' in args:
+			limit = common.convert_to_int(args['limit'])
+			if limit is not None and limit < 1:
+				limit = None
+		self.page_limit = limit or table.get_max_limit()
+		
+		self.offset = None
+		if 'offset' in args:
+			offset = common.convert_to_int(args['offset']) - 1
+			if offset >= 1:
+				self.offset = offset
+				if limit:
+					limit += offset
+		self.limit = limit or table.get_max_limit()
+		
+		# Like Index.query(), order_by only applies to table queries
+		sort_forward = True
+		if type(args.get('order_by')) is list and sort_key and not index:
+			for element in args['order_by']:
+				if element.get('field') == sort_key.name and element.get('order') == 'desc':
+					sort_forward = False
+		
+		self._query_args = {
+			"TableName": table.name,
+			"Select": 'ALL_ATTRIBUTES',
+			"KeyConditionExpression": self.key_condition,
+			"ExpressionAttributeNames": dict(self.attribute_names),
+			"ScanIndexForward": sort_forward
+		}
+		if self.index_name:
+			self._query_args['IndexName'] = self.index_name
+		table._add_projection_args(self._query_args, args.get('fields'))
+	
+	def _bind(self, partition_key_value, sort_key_value=None, sort_key_value_end=None):
+		attribute_values = { ":pvalue": _convert_to_attribute_value(partition_key_value) }
+		if self._sort_value_count:
+			if sort_key_value is None:
+				sort_key_value = self.args.get('sort_key_value')
+			if sort_key_value is None:
+				raise AttributeError("Query plan for table '{}' requires sort_key_value".format(self.table.name))
+			attribute_values[":svalue"] = _convert_to_attribute_value(sort_key_value)
+			if self._sort_value_count == 2:
+				if sort_key_value_end is None:
+					sort_key_value_end = self.args.get('sort_key_value_end')
+				if sort_key_value_end is None:
+					raise AttributeError("'between' operator requires sort_key_value_end for table '{}'".format(self.table.name))
+				attribute_values[":svalue2"] = _convert_to_attribute_value(sort_key_value_end)
+		return attribute_values
+	
+	def _request(self, query_args):
+		try:
+			response = self.table._request('query', 'read', **query_args)
+		except ClientError as e:
+			print("error:", e)
+			raise ConnectionError("Failed to query table '{}'".format(self.table.name))
+		if not common.is_success(response) or 'Items' not in response:
+			return None
+		return response
+	
+	def _count(self, attribute_values):
+		return self.table._count_key_condition(self.key_source, self.index_name, self.key_condition, self.attribute_names, attribute_values)
+	
+	"""
+	The Query request that query() sends; the same as Table.get_query_args() for the plan's args.
+	query_args = plan.get_query_args(partition_key_value, sort_key_value)
+	"""
+	def get_query_args(self, partition_key_value, sort_key_value=None, sort_key_value_end=None):
+		attribute_values = self._bind(partition_key_value, sort_key_value, sort_key_value_end)
+		return dict(self._query_args, ExpressionAttributeValues=attribute_values, Limit=self.limit)
+	
+	"""
+	Same return values as Table.query().
+	records, total = plan.query(partition_key_value)
+	records, total = plan.query(partition_key_value, sort_key_value, sort_key_value_end)
+	"""
+	def query(self, partition_key_value, sort_key_value=None, sort_key_value_end=None):
+		query_args = self.get_query_args(partition_key_value, sort_key_value, sort_key_value_end)
+		response = self._request(query_args)
+		if not response:
+			return None
+		records = self.table.convert_from_item(response['Items'])
+		
+		count = len(records)
+		if 'LastEvaluatedKey' in response:
+			count = self._count(query_args['ExpressionAttributeValues'])
+		if self.offset:
+			return records[self.offset:], count
+		return records, count
+	
+	"""
+	Same return values as Table.query_page(). offset is ignored.
+	records, next_cursor, count = plan.query_page(partition_key_value)
+	records, next_cursor, count = plan.query_page(partition_key_value, sort_key_value, cursor=cursor, count='exact')
+	"""
+	def query_page(self, partition_key_value, sort_key_value=None, sort_key_value_end=None, cursor=None, count=None):
+		attribute_values = self._bind(partition_key_value, sort_key_value, sort_key_value_end)
+		query_args = dict(self._query_args, ExpressionAttributeValues=attribute_values, Limit=self.page_limit)
+		seen = 0
+		if cursor:
+			query_args['ExclusiveStartKey'], seen = self.table._get_cursor_start_key(self.key_source, cursor, attribute_values[':pvalue'])
+		response = self._request(query_args)
+		if not response:
+			return [], None, None
+		records = self.table.convert_from_item(response['Items'])
+		
+		next_cursor = None
+		if 'LastEvaluatedKey' in response:
+			next_cursor = _encode_cursor(response['LastEvaluatedKey'], seen + len(records))
+		
+		total = None
+		if count == 'exact':
+			total = self._count(attribute_values)
+		elif count == 'estimate':
+			total = seen + len(records)
+			if next_cursor:
+				total += self.page_limit
+		return records, next_cursor, total
+	
+	"""
+	count = plan.query_count(partition_key_value)
+	count = plan.query_count(partition_key_value, sort_key_value)
+	"""
+	def query_count(self, partition_key_value, sort_key_value=None, sort_key_value_end=None):
+		return self._count(self._bind(partition_key_value, sort_key_value, sort_key_value_end))
+
+
+
+
+class RateLimiter:
+	"""
+	Token bucket refilled at rate units per second, holding at most one second of burst.
+	The bucket may go negative when a request consumes more than was available; wait() then
+	blocks until it is paid back.
+	limiter = moses_common.dynamodb.RateLimiter(100)
+	limiter.wait()
+	limiter.consume(units)
+	"""
+	def __init__(self, rate):
+		self.rate = common.convert_to_float(rate) or 1.0
+		self.capacity = self.rate
+		self._tokens = self.capacity
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+	
+	def _refill(self):
+		now = time.monotonic()
+		self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+		self._updated = now
+	
+	def wait(self):
+		while True:
+			with self._lock:
+				self._refill()
+				if self._tokens > 0:
+					return
+				delay = -self._tokens / self.rate
+			time.sleep(max(delay, 0.01))
+	
+	def consume(self, units):
+		with self._lock:
+			self._refill()
+			self._tokens -= units
+
+
+
+
+class ItemCache:
+	"""
+	LRU cache whose entries expire after ttl seconds. Used by Table.get_item().
+	cache = moses_common.dynamodb.ItemCache(max_size=256, ttl=60)
+	found, value = cache.get(key)
+	cache.set(key, value)
+	cache.set(key, value, ttl=5)  # Overrides the cache's ttl for this entry
+	cache.invalidate(key)
+	cache.invalidate()  # Everything
+	
+	version changes on every invalidate(). A value read from the table before a write can be
+	stored with the version seen before the read; set() skips it if anything was invalidated since.
+	version = cache.version
+	cache.set(key, value, version=version)
+	"""
+	def __init__(self, max_size=256, ttl=60):
+		self.max_size = max(common.convert_to_int(max_size) or 1, 1)
+		self.ttl = common.convert_to_float(ttl) or 0
+		self.hits = 0
+		self.misses = 0
+		self.version = 0
+		self._items = collections.OrderedDict()
+		self._lock = threading.Lock()
+	
+	def __len__(self):
+		return len(self._items)
+	
+	"""
+	{
+		"size": 12,
+		"max_size": 256,
+		"hits": 340,
+		"misses": 12,
+		"hit_rate": 0.966
+	}
+	"""
+	@property
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"size": len(self._items),
+				"max_size": self.max_size,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 3) if lookups else 0
+			}
+	
+	def get(self, key):
+		with self._lock:
+			entry = self._items.get(key)
+			if entry and entry[0] > time.monotonic():
+				self._items.move_to_end(key)
+				self.hits += 1
+				return True, entry[1]
+			if entry:
+				del self._items[key]
+			self.misses += 1
+			return False, None
+	
+	def set(self, key, value, ttl=None, version=None):
+		if ttl is None:
+			ttl = self.ttl
+		with self._lock:
+			if version is not None and version != self.version:
+				return
+			self._items[key] = (time.monotonic() + ttl, value)
+			self._items.move_to_end(key)
+			while len(self._items) > self.max_size:
+				self._items.popitem(last=False)
+	
+	def invalidate(self, key=None):
+		with self._lock:
+			self.version += 1
+			if key is None:
+				self._items.clear()
+			else:
+				self._items.pop(key, None)
+
+
+
+
+class StreamCache:
+	"""
+	In-process copy of a table that is kept current from DynamoDB Streams events, so a warm
+	Lambda container sees inserts, modifies and removes without rescanning the table.
+	load() scans once; apply() takes the Lambda event. Records replayed by a Lambda retry are
+	skipped using the last sequence number seen for each key.
+	For KEYS_ONLY and OLD_IMAGE streams, changed items are read back with get_item().
+	cache = moses_common.dynamodb.StreamCache(table)
+	cache = moses_common.dynamodb.StreamCache(table, load=True, segments=4)
+	changes = cache.apply(event)
+	record = cache.get(key_value, sort_value=None)
+	records = cache.values()
+	if cache.version != last_version:
+	"""
+	def __init__(self, table, ui=None, load=False, segments=None):
+		self.table = table
+		self.ui = ui or table.ui
+		self.loaded = False
+		self.version = 0
+		self._items = {}
+		self._sequences = {}
+		self._lock = threading.RLock()
+		if load:
+			self.load(segments=segments)
+	
+	def __len__(self):
+		return len(self._items)
+	
+	def __contains__(self, key):
+		return self._get_id(*self.table.split_key(key)) in self._items
+	
+	def _get_id(self, key_value, sort_value=None):
+		if self.table.sort_key:
+			return (key_value, sort_value)
+		return (key_value,)
+	
+	"""
+	Replaces the contents with a full scan of the table.
+	cache.load()
+	cache.load(segments=4)
+	"""
+	def load(self, segments=None):
+		items = {}
+		for record in self.table.iter_scan(segments=segments):
+			items[self._get_id(*self.table.split_key(record))] = record
+		with self._lock:
+			self._items = items
+			self.loaded = True
+			self.version += 1
+		self.ui.debug(f"StreamCache {self.table.name}: loaded {len(items)}")
+	
+	"""
+	Applies the event's records for this table and returns the changes applied, as from
+	table.convert_stream_records(). Before load(), changes still apply to what is cached.
+	changes = cache.apply(event)
+	"""
+	def apply(self, event):
+		applied = []
+		with self._lock:
+			for change in self.table.convert_stream_records(event):
+				key_value, sort_value = self.table.split_key(change['key'])
+				item_id = self._get_id(key_value, sort_value)
+				sequence = change['sequence']
+				if sequence is not None:
+					last_sequence = self._sequences.get(item_id)
+					if last_sequence is not None and sequence <= last_sequence:
+						continue
+					self._sequences[item_id] = sequence
+				
+				record = None
+				if change['event'] != 'REMOVE':
+					record = change['new']
+					if record is None:
+						record = self.table.get_item(key_value, sort_value)
+				if record is None:
+					self._items.pop(item_id, None)
+				else:
+					self._items[item_id] = record
+				applied.append(change)
+			if applied:
+				self.version += 1
+		return applied
+	
+	def get(self, key_value, sort_value=None):
+		return self._items.get(self._get_id(key_value, sort_value))
+	
+	def values(self):
+		with self._lock:
+			return list(self._items.values())
 
 
 
@@ -812,9 +2770,9 @@ class Index:
 				key_info = args['KeySchema'][i]
 				if key_info and type(key_info) is dict and 'AttributeName' in key_info:
 					if i == 0:
-						self.partition_key = self.table.attributes[key_info['AttributeName']]
+						self.partition_key = self.table._attributes[key_info['AttributeName']]
 					if i == 1:
-						self.sort_key = self.table.attributes[key_info['AttributeName']]
+						self.sort_key = self.table._attributes[key_info['AttributeName']]
 			return True
 		return False
 	
@@ -855,33 +2813,21 @@ class Index:
 		return key_condition, attribute_names, attribute_values
 	
 	"""
-	Same args as query() except limit and offset.
-	count = table.query_count(partition_key_value, args=None)
+	Same args as Table.query_count().
+	count = index.query_count(partition_key_value, args=None)
+	count = index.query_count(partition_key_value, args, segments=8)
 	"""
-	def query_count(self, partition_key_value, args={}):
-		if args and type(args) is not dict:
-			raise AttributeError("args must be dict")
-		
-		key_condition, attribute_names, attribute_values = self.get_key_condition_expressions(partition_key_value, args)
-		
-		try:
-			response = boto3_client.query(
-				TableName = self.name,
-				Select = 'COUNT',
-				KeyConditionExpression = key_condition,
-				ExpressionAttributeNames = attribute_names,
-				ExpressionAttributeValues = attribute_values
-			)
-		
-		except ClientError as e:
-			print("error:", e)
-			raise ConnectionError("Failed to query table '{}'".format(self.name))
-		
-		else:
-			self.ui.debug(f"response: {response}")
-			if common.is_success(response) and 'Count' in response:
-				return response['Count']
-				
+	def query_count(self, partition_key_value, args={}, segments=None):
+		return self.table._query_count(self, self.name, partition_key_value, args, segments=segments)
+	
+	"""
+	Same as Table.prepare_query() for this index.
+	plan = index.prepare_query({ "sort_key_operator": ">=", "limit": 20 })
+	records, total = plan.query(partition_key_value, sort_key_value)
+	"""
+	def prepare_query(self, args={}):
+		return QueryPlan(self.table, index=self, args=args)
+	
 	"""
 	records = index.query(partition_key_value)
 	records = index.query(partition_key_value, {
@@ -889,7 +2835,8 @@ class Index:
 		"sort_key_value_end": value,  # Required by sort_key_operator 'between'
 		"sort_key_operator": '='|'<'|'<='|'>'|'>='|'begins_with'|'between',  # defaults to '='
 		"limit": int,
-		"offset": int
+		"offset": int,
+		"fields": ['field1', 'field2']  # Only return these fields
 	})
 	"""
 	def query(self, partition_key_value, args={}):
@@ -915,23 +2862,25 @@ class Index:
 		if not limit:
 			limit = self.table.get_max_limit()
 		
+		query_args = {
+			"TableName": self.table.name,
+			"IndexName": self.name,
+			"Select": 'ALL_ATTRIBUTES',
+			"KeyConditionExpression": key_condition,
+			"ExpressionAttributeNames": attribute_names,
+			"ExpressionAttributeValues": attribute_values,
+			"Limit": limit
+		}
+		self.table._add_projection_args(query_args, args.get('fields'))
 		try:
-			response = boto3_client.query(
-				TableName = self.table.name,
-				IndexName = self.name,
-				Select = 'ALL_ATTRIBUTES',
-				KeyConditionExpression = key_condition,
-				ExpressionAttributeNames = attribute_names,
-				ExpressionAttributeValues = attribute_values,
-				Limit = limit
-			)
+			response = self.table._request('query', 'read', **query_args)
 		
 		except ClientError as e:
 			print("error:", e)
 			raise ConnectionError("Failed to query table '{}'".format(self.name))
 		
 		else:
-			self.ui.debug(f"response: {response}")
+			self.ui.debug_payload(f"query {self.table.name} {self.name} response", response)
 			if common.is_success(response) and 'Items' in response:
 				records = self.table.convert_from_item(response['Items'])
 				
@@ -953,7 +2902,21 @@ class Index:
 				for i in range(offset, len(records)):
 					offset_records.append(records[i])
 				return offset_records, count
-				
+					
+	"""
+	Same args and return values as Table.query_page().
+	records, next_cursor, count = index.query_page(partition_key_value, args)
+	"""
+	def query_page(self, partition_key_value, args={}):
+		return self.table._query_page(self, self.name, partition_key_value, args)
+	
+	"""
+	Same args as Table.query_many(); results are merged in ascending sort key order when sort=True.
+	for record in index.query_many(['artist1', 'artist2'], workers=8, sort=True):
+	"""
+	def query_many(self, partition_values, args={}, workers=8, sort=False):
+		return self.table._query_many(self, partition_values, args, workers=workers, sort=sort)
+
 
 
 
@@ -0,0 +1,1464 @@
+# print("Loaded DynamoDB memory module")
+
+import decimal
+import math
+import re
+import threading
+import types
+import zlib
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+
+"""
+In-process stand-in for the DynamoDB low-level client
+
+Implements the calls that moses_common.dynamodb and api_dynamodb make, with DynamoDB's
+request and response shapes and error codes, so Table, Index and DynamoDBActionProcessor can
+run without AWS. Everything lives in memory and results are deterministic, which also makes
+it a baseline for throughput benchmarks of our own data paths.
+
+Supported: CreateTable, DeleteTable, DescribeTable, ListTables, GetItem, PutItem, UpdateItem,
+DeleteItem, Query, Scan (including parallel segments), BatchGetItem, BatchWriteItem,
+TransactGetItems and TransactWriteItems. Condition, filter, key condition, projection and
+update expressions are parsed and evaluated, including placeholders, nested paths and the
+usual functions. Pages end at Limit or max_page_bytes with a LastEvaluatedKey.
+
+Not modeled: capacity limits and throttling, eventual consistency, streams, TTL, and
+DynamoDB's reserved word list.
+
+import moses_common.dynamodb_memory
+
+client = moses_common.dynamodb_memory.MemoryClient()
+client.add_table('artist', ('artist_id', 'S'))
+client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+	"status-index": (('status', 'S'), ('create_time', 'S'))
+})
+moses_common.dynamodb.set_backend(client)
+processor = moses_common.api_dynamodb.DynamoDBActionProcessor(ddb_resource=client.resource(), ui=ui)
+"""
+
+# DynamoDB stops a Query or Scan page after 1 MB of data
+max_page_bytes = 1024 * 1024
+
+_key_types = ['S', 'N', 'B']
+
+def _client_error(operation, code, message, **extra):
+	response = {
+		"Error": {
+			"Code": code,
+			"Message": message
+		},
+		"ResponseMetadata": { "HTTPStatusCode": 400 }
+	}
+	response.update(extra)
+	return ClientError(response, operation)
+
+def _validation_error(operation, message):
+	return _client_error(operation, 'ValidationException', message)
+
+def _success(**response):
+	response['ResponseMetadata'] = { "HTTPStatusCode": 200 }
+	return response
+
+"""
+Attribute values
+
+Items are stored in the wire format, e.g. { "name": { "S": "Lu" }, "count": { "N": "3" } }.
+"""
+def _copy_value(value):
+	if type(value) is dict:
+		return { key: _copy_value(item) for key, item in value.items() }
+	if type(value) is list:
+		return [ _copy_value(item) for item in value ]
+	return value
+
+def _copy_item(item):
+	return { name: _copy_value(value) for name, value in item.items() }
+
+def _get_type(attribute_value):
+	if type(attribute_value) is not dict or len(attribute_value) != 1:
+		return None
+	for attribute_type in attribute_value:
+		return attribute_type
+
+def _to_decimal(text):
+	try:
+		return decimal.Decimal(text)
+	except (decimal.InvalidOperation, TypeError):
+		raise _validation_error(None, "The parameter cannot be converted to a numeric value: {}".format(text))
+
+"""
+Comparable and hashable form of an attribute value.
+"""
+def _normalize(attribute_value):
+	attribute_type = _get_type(attribute_value)
+	value = attribute_value[attribute_type]
+	if attribute_type == 'N':
+		return ('N', _to_decimal(value))
+	if attribute_type in ['S', 'B', 'BOOL', 'NULL']:
+		return (attribute_type, value)
+	if attribute_type == 'NS':
+		return ('NS', frozenset(_to_decimal(item) for item in value))
+	if attribute_type in ['SS', 'BS']:
+		return (attribute_type, frozenset(value))
+	if attribute_type == 'L':
+		return ('L', tuple(_normalize(item) for item in value))
+	if attribute_type == 'M':
+		return ('M', tuple(sorted((key, _normalize(item)) for key, item in value.items())))
+	raise _validation_error(None, "Supplied AttributeValue has an invalid data type: {}".format(attribute_type))
+
+def _item_size(item):
+	return sum(len(name) + _value_size(value) for name, value in item.items())
+
+def _value_size(attribute_value):
+	attribute_type = _get_type(attribute_value)
+	value = attribute_value[attribute_type]
+	if attribute_type == 'S':
+		return len(value.encode('utf-8'))
+	if attribute_type == 'N':
+		return len(value) // 2 + 2
+	if attribute_type == 'B':
+		return len(value)
+	if attribute_type in ['SS', 'BS']:
+		return sum(len(item) for item in value)
+	if attribute_type == 'NS':
+		return sum(len(item) // 2 + 2 for item in value)
+	if attribute_type == 'L':
+		return 3 + sum(_value_size(item) + 1 for item in value)
+	if attribute_type == 'M':
+		return 3 + sum(len(key) + _value_size(item) + 1 for key, item in value.items())
+	return 1
+
+
+"""
+Expressions
+
+Condition, filter and key condition expressions are parsed into nested tuples and evaluated
+against an item. Update expressions become a list of actions and projections a list of paths.
+A path is a list of attribute names and list indexes, e.g. ['info', 'tags', 0].
+"""
+_token_pattern = re.compile(r'\s*(?:(#[A-Za-z0-9_]+)|(:[A-Za-z0-9_]+)|(\d+)|([A-Za-z_][A-Za-z0-9_]*)|(<>|<=|>=|[=<>(),.\[\]+-]))')
+
+_comparators = ['=', '<>', '<', '<=', '>', '>=']
+_condition_functions = ['attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains']
+_update_clauses = ['SET', 'REMOVE', 'ADD', 'DELETE']
+
+class _ExpressionParser:
+	"""
+	parser = _ExpressionParser(operation, expression_attribute_names, expression_attribute_values)
+	condition = parser.parse_condition(expression)
+	parser.check_unused()
+	"""
+	def __init__(self, operation, names=None, values=None):
+		self.operation = operation
+		self.names = names
+		self.values = values
+		self.used_names = set()
+		self.used_values = set()
+		if names is not None and not names:
+			raise _validation_error(operation, "ExpressionAttributeNames must not be empty")
+		if values is not None and not values:
+			raise _validation_error(operation, "ExpressionAttributeValues must not be empty")
+	
+	def _error(self, message):
+		return _validation_error(self.operation, "Invalid {}: {}".format(self.expression_type, message))
+	
+	def _tokenize(self, expression):
+		self.tokens = []
+		position = 0
+		expression = expression.rstrip()
+		while position < len(expression):
+			match = _token_pattern.match(expression, position)
+			if not match or match.end() == position:
+				raise self._error("Syntax error; token: \"{}\", near: \"{}\"".format(expression[position:position + 1], expression[position:position + 10]))
+			name, value, number, word, symbol = match.groups()
+			if name:
+				self.tokens.append(('name', name))
+			elif value:
+				self.tokens.append(('value', value))
+			elif number:
+				self.tokens.append(('number', int(number)))
+			elif word:
+				self.tokens.append(('word', word))
+			else:
+				self.tokens.append(('symbol', symbol))
+			position = match.end()
+		self.position = 0
+	
+	def _peek(self, offset=0):
+		if self.position + offset < len(self.tokens):
+			return self.tokens[self.position + offset]
+		return (None, None)
+	
+	def _next(self):
+		token = self._peek()
+		if token[0] is None:
+			raise self._error("Syntax error; unexpected end of expression")
+		self.position += 1
+		return token
+	
+	def _is_keyword(self, keyword, offset=0):
+		token_type, token = self._peek(offset)
+		return token_type == 'word' and token.upper() == keyword
+	
+	def _is_symbol(self, symbol, offset=0):
+		return self._peek(offset) == ('symbol', symbol)
+	
+	def _expect_symbol(self, symbol):
+		token_type, token = self._next()
+		if (token_type, token) != ('symbol', symbol):
+			raise self._error("Syntax error; token: \"{}\", expected: \"{}\"".format(token, symbol))
+	
+	def _expect_end(self):
+		token_type, token = self._peek()
+		if token_type is not None:
+			raise self._error("Syntax error; token: \"{}\"".format(token))
+	
+	def _get_name(self, placeholder):
+		if self.names is None or placeholder not in self.names:
+			raise self._error("An expression attribute name used in the document path is not defined; attribute name: {}".format(placeholder))
+		self.used_names.add(placeholder)
+		return self.names[placeholder]
+	
+	def _get_value(self, placeholder):
+		if self.values is None or placeholder not in self.values:
+			raise self._error("An expression attribute value used in expression is not defined; attribute value: {}".format(placeholder))
+		self.used_values.add(placeholder)
+		value = self.values[placeholder]
+		if _get_type(value) is None:
+			raise _validation_error(self.operation, "Supplied AttributeValue is empty, must contain exactly one of the supported datatypes")
+		return value
+	
+	def _parse_path(self):
+		token_type, token = self._next()
+		if token_type == 'name':
+			path = [self._get_name(token)]
+		elif token_type == 'word':
+			path = [token]
+		else:
+			raise self._error("Syntax error; token: \"{}\"".format(token))
+		while True:
+			if self._is_symbol('.'):
+				self.position += 1
+				token_type, token = self._next()
+				if token_type == 'name':
+					path.append(self._get_name(token))
+				elif token_type == 'word':
+					path.append(token)
+				else:
+					raise self._error("Syntax error; token: \"{}\"".format(token))
+			elif self._is_symbol('['):
+				self.position += 1
+				token_type, token = self._next()
+				if token_type != 'number':
+					raise self._error("Syntax error; token: \"{}\"".format(token))
+				path.append(token)
+				self._expect_symbol(']')
+			else:
+				return path
+	
+	"""
+	condition = parser.parse_condition('#k1 = :v1 AND begins_with (#k2, :v2)')
+	"""
+	def parse_condition(self, expression, expression_type='ConditionExpression'):
+		self.expression_type = expression_type
+		if type(expression) is not str or not expression.strip():
+			raise _validation_error(self.operation, "Invalid {}: The expression can not be empty;".format(expression_type))
+		self._tokenize(expression)
+		condition = self._parse_or()
+		self._expect_end()
+		return condition
+	
+	def _parse_or(self):
+		condition = self._parse_and()
+		while self._is_keyword('OR'):
+			self.position += 1
+			condition = ('or', condition, self._parse_and())
+		return condition
+	
+	def _parse_and(self):
+		condition = self._parse_not()
+		while self._is_keyword('AND'):
+			self.position += 1
+			condition = ('and', condition, self._parse_not())
+		return condition
+	
+	def _parse_not(self):
+		if self._is_keyword('NOT'):
+			self.position += 1
+			return ('not', self._parse_not())
+		return self._parse_primary()
+	
+	def _parse_primary(self):
+		if self._is_symbol('('):
+			self.position += 1
+			condition = self._parse_or()
+			self._expect_symbol(')')
+			return condition
+		
+		token_type, token = self._peek()
+		if token_type == 'word' and token.lower() in _condition_functions and self._is_symbol('(', 1):
+			function = token.lower()
+			self.position += 2
+			path = self._parse_path()
+			args = [('path', path)]
+			if function not in ['attribute_exists', 'attribute_not_exists']:
+				self._expect_symbol(',')
+				args.append(self._parse_operand())
+			self._expect_symbol(')')
+			return ('function', function, args)
+		
+		operand = self._parse_operand()
+		if self._is_keyword('BETWEEN'):
+			self.position += 1
+			low = self._parse_operand()
+			if not self._is_keyword('AND'):
+				raise self._error("Syntax error; BETWEEN requires AND")
+			self.position += 1
+			return ('between', operand, low, self._parse_operand())
+		if self._is_keyword('IN'):
+			self.position += 1
+			self._expect_symbol('(')
+			options = [self._parse_operand()]
+			while self._is_symbol(','):
+				self.position += 1
+				options.append(self._parse_operand())
+			self._expect_symbol(')')
+			return ('in', operand, options)
+		token_type, token = self._next()
+		if token_type != 'symbol' or token not in _comparators:
+			raise self._error("Syntax error; token: \"{}\"".format(token))
+		return ('compare', token, operand, self._parse_operand())
+	
+	def _parse_operand(self):
+		token_type, token = self._peek()
+		if token_type == 'value':
+			self.position += 1
+			return ('value', self._get_value(token))
+		if token_type == 'word' and token.lower() == 'size' and self._is_symbol('(', 1):
+			self.position += 2
+			path = self._parse_path()
+			self._expect_symbol(')')
+			return ('size', path)
+		return ('path', self._parse_path())
+	
+	"""
+	actions = parser.parse_update('SET #k1 = :v1, #k2 = #k2 + :v2 REMOVE #k3 ADD #k4 :v4')
+	"""
+	def parse_update(self, expression):
+		self.expression_type = 'UpdateExpression'
+		if type(expression) is not str or not expression.strip():
+			raise _validation_error(self.operation, "Invalid UpdateExpression: The expression can not be empty;")
+		self._tokenize(expression)
+		actions = []
+		seen_clauses = set()
+		while self._peek()[0] is not None:
+			token_type, token = self._next()
+			clause = token.upper() if token_type == 'word' else None
+			if clause not in _update_clauses:
+				raise self._error("Syntax error; token: \"{}\"".format(token))
+			if clause in seen_clauses:
+				raise self._error("The \"{}\" section can only be used once in an update expression;".format(clause))
+			seen_clauses.add(clause)
+			while True:
+				path = self._parse_path()
+				if clause == 'SET':
+					self._expect_symbol('=')
+					actions.append(('set', path, self._parse_set_value()))
+				elif clause == 'REMOVE':
+					actions.append(('remove', path))
+				else:
+					token_type, token = self._next()
+					if token_type != 'value':
+						raise self._error("Syntax error; {} requires a value".format(clause))
+					actions.append((clause.lower(), path, self._get_value(token)))
+				if not self._is_symbol(','):
+					break
+				self.position += 1
+		return actions
+	
+	def _parse_set_value(self):
+		value = self._parse_set_operand()
+		if self._is_symbol('+') or self._is_symbol('-'):
+			token_type, token = self._next()
+			value = ('plus' if token == '+' else 'minus', value, self._parse_set_operand())
+		return value
+	
+	def _parse_set_operand(self):
+		token_type, token = self._peek()
+		if token_type == 'word' and token.lower() in ['if_not_exists', 'list_append'] and self._is_symbol('(', 1):
+			function = token.lower()
+			self.position += 2
+			if function == 'if_not_exists':
+				first = ('path', self._parse_path())
+			else:
+				first = self._parse_set_operand()
+			self._expect_symbol(',')
+			second = self._parse_set_value()
+			self._expect_symbol(')')
+			return (function, first, second)
+		if token_type == 'value':
+			self.position += 1
+			return ('value', self._get_value(token))
+		return ('path', self._parse_path())
+	
+	"""
+	paths = parser.parse_projection('#p, #s, info.tags[0]')
+	"""
+	def parse_projection(self, expression):
+		self.expression_type = 'ProjectionExpression'
+		if type(expression) is not str or not expression.strip():
+			raise _validation_error(self.operation, "Invalid ProjectionExpression: The expression can not be empty;")
+		self._tokenize(expression)
+		paths = [self._parse_path()]
+		while self._is_symbol(','):
+			self.position += 1
+			paths.append(self._parse_path())
+		self._expect_end()
+		return paths
+	
+	def check_unused(self):
+		if self.names:
+			unused = [name for name in self.names if name not in self.used_names]
+			if unused:
+				raise _validation_error(self.operation, "Value provided in ExpressionAttributeNames unused in expressions: keys: {{{}}}".format(', '.join(unused)))
+		if self.values:
+			unused = [value for value in self.values if value not in self.used_values]
+			if unused:
+				raise _validation_error(self.operation, "Value provided in ExpressionAttributeValues unused in expressions: keys: {{{}}}".format(', '.join(unused)))
+
+
+def _get_path(item, path):
+	value = item.get(path[0])
+	for element in path[1:]:
+		if value is None:
+			return None
+		if type(element) is int:
+			value = value.get('L')
+			if value is None or element >= len(value):
+				return None
+			value = value[element]
+		else:
+			value = value.get('M')
+			if value is None:
+				return None
+			value = value.get(element)
+	return value
+
+def _set_path(operation, item, path, attribute_value):
+	container = item
+	for i, element in enumerate(path[:-1]):
+		value = _get_path(item, path[:i + 1])
+		next_element = path[i + 1]
+		if value is None or (type(next_element) is int and 'L' not in value) or (type(next_element) is str and 'M' not in value):
+			raise _validation_error(operation, "The document path provided in the update expression is invalid for update")
+		container = value['L'] if type(next_element) is int else value['M']
+	element = path[-1]
+	if type(element) is int:
+		if element >= len(container):
+			container.append(attribute_value)
+		else:
+			container[element] = attribute_value
+	else:
+		container[element] = attribute_value
+
+def _remove_path(item, path):
+	container = item
+	if len(path) > 1:
+		value = _get_path(item, path[:-1])
+		if value is None:
+			return
+		container = value.get('L') if type(path[-1]) is int else value.get('M')
+		if container is None:
+			return
+	element = path[-1]
+	if type(element) is int:
+		if element < len(container):
+			container.pop(element)
+	else:
+		container.pop(element, None)
+
+def _project(item, paths):
+	projected = {}
+	for path in paths:
+		value = _get_path(item, path)
+		if value is None:
+			continue
+		# Rebuild just the parts of the document on the path
+		container = projected
+		for element, next_element in zip(path, path[1:]):
+			empty = { "L": [] } if type(next_element) is int else { "M": {} }
+			if type(container) is dict:
+				holder = container.setdefault(element, empty)
+			else:
+				container.append(empty)
+				holder = container[-1]
+			container = holder['L'] if type(next_element) is int else holder['M']
+		if type(container) is dict:
+			container[path[-1]] = _copy_value(value)
+		else:
+			container.append(_copy_value(value))
+	return projected
+
+def _get_operand(operand, item):
+	kind = operand[0]
+	if kind == 'value':
+		return operand[1]
+	if kind == 'path':
+		return _get_path(item, operand[1])
+	if kind == 'size':
+		value = _get_path(item, operand[1])
+		attribute_type = _get_type(value)
+		if attribute_type in ['S']:
+			return { "N": str(len(value['S'])) }
+		if attribute_type in ['B', 'SS', 'NS', 'BS', 'L', 'M']:
+			return { "N": str(len(value[attribute_type])) }
+		return None
+	return None
+
+def _compare(operator, left, right):
+	if left is None or right is None:
+		return operator == '<>'
+	if operator in ['=', '<>']:
+		equal = _normalize(left) == _normalize(right)
+		return equal if operator == '=' else not equal
+	left_type = _get_type(left)
+	if left_type != _get_type(right) or left_type not in _key_types:
+		return False
+	left_value = _normalize(left)[1]
+	right_value = _normalize(right)[1]
+	if operator == '<':
+		return left_value < right_value
+	if operator == '<=':
+		return left_value <= right_value
+	if operator == '>':
+		return left_value > right_value
+	return left_value >= right_value
+
+def _evaluate(condition, item):
+	kind = condition[0]
+	if kind == 'and':
+		return _evaluate(condition[1], item) and _evaluate(condition[2], item)
+	if kind == 'or':
+		return _evaluate(condition[1], item) or _evaluate(condition[2], item)
+	if kind == 'not':
+		return not _evaluate(condition[1], item)
+	if kind == 'compare':
+		return _compare(condition[1], _get_operand(condition[2], item), _get_operand(condition[3], item))
+	if kind == 'between':
+		value = _get_operand(condition[1], item)
+		return _compare('>=', value, _get_operand(condition[2], item)) and _compare('<=', value, _get_operand(condition[3], item))
+	if kind == 'in':
+		value = _get_operand(condition[1], item)
+		return any(_compare('=', value, _get_operand(option, item)) for option in condition[2])
+	
+	function, args = condition[1], condition[2]
+	value = _get_operand(args[0], item)
+	if function == 'attribute_exists':
+		return value is not None
+	if function == 'attribute_not_exists':
+		return value is None
+	other = _get_operand(args[1], item)
+	if value is None or other is None:
+		return False
+	value_type = _get_type(value)
+	other_type = _get_type(other)
+	if function == 'attribute_type':
+		return other_type == 'S' and value_type == other['S']
+	if function == 'begins_with':
+		return value_type == other_type and value_type in ['S', 'B'] and value[value_type].startswith(other[other_type])
+	# contains
+	if value_type in ['S', 'B']:
+		return value_type == other_type and other[other_type] in value[value_type]
+	if value_type in ['SS', 'NS', 'BS']:
+		return value_type == other_type + 'S' and _normalize(other)[1] in _normalize(value)[1]
+	if value_type == 'L':
+		normalized = _normalize(other)
+		return any(_normalize(element) == normalized for element in value['L'])
+	return False
+
+def _get_set_value(operation, value, item):
+	kind = value[0]
+	if kind in ['value', 'path']:
+		result = _get_operand(value, item)
+		if result is None:
+			raise _validation_error(operation, "The provided expression refers to an attribute that does not exist in the item")
+		return result
+	if kind == 'if_not_exists':
+		existing = _get_operand(value[1], item)
+		if existing is not None:
+			return existing
+		return _get_set_value(operation, value[2], item)
+	left = _get_set_value(operation, value[1], item)
+	right = _get_set_value(operation, value[2], item)
+	if kind == 'list_append':
+		if 'L' not in left or 'L' not in right:
+			raise _validation_error(operation, "An operand in the update expression has an incorrect data type")
+		return { "L": left['L'] + right['L'] }
+	if 'N' not in left or 'N' not in right:
+		raise _validation_error(operation, "An operand in the update expression has an incorrect data type")
+	if kind == 'plus':
+		return { "N": _format_number(_to_decimal(left['N']) + _to_decimal(right['N'])) }
+	return { "N": _format_number(_to_decimal(left['N']) - _to_decimal(right['N'])) }
+
+def _format_number(number):
+	text = str(number)
+	if 'E' in text or 'e' in text:
+		text = '{:f}'.format(number)
+	if '.' in text:
+		text = text.rstrip('0').rstrip('.')
+	return text
+
+
+class _KeyedIndex:
+	"""
+	Items of a table or index grouped by partition key. Each partition keeps a sorted list
+	that is rebuilt on the next read after a write to it.
+	index = _KeyedIndex(name, key_schema, table_keys, projection)
+	"""
+	def __init__(self, name, key_schema, table_keys, projection=None):
+		self.name = name
+		self.partition_key, self.sort_key = _extract_key_names(key_schema)
+		self.key_schema = key_schema
+		# Table keys break ties between index entries with the same index keys
+		self.key_names = [self.partition_key]
+		if self.sort_key:
+			self.key_names.append(self.sort_key)
+		for table_key in table_keys:
+			if table_key not in self.key_names:
+				self.key_names.append(table_key)
+		self.table_keys = table_keys
+		self.projection = projection or { "ProjectionType": "ALL" }
+		self.partitions = {}
+		self._sorted = {}
+	
+	def get_entry_key(self, item):
+		values = []
+		for name in self.key_names:
+			if name not in item:
+				return None, None
+			values.append(_normalize(item[name]))
+		return values[0], tuple(values[1:])
+	
+	def add(self, item):
+		partition_key, entry_key = self.get_entry_key(item)
+		if partition_key is None:
+			return
+		self.partitions.setdefault(partition_key, {})[entry_key] = item
+		self._sorted.pop(partition_key, None)
+	
+	def remove(self, item):
+		partition_key, entry_key = self.get_entry_key(item)
+		if partition_key is None:
+			return
+		partition = self.partitions.get(partition_key)
+		if partition is None:
+			return
+		partition.pop(entry_key, None)
+		if not partition:
+			self.partitions.pop(partition_key)
+		self._sorted.pop(partition_key, None)
+	
+	def get_partition(self, partition_key):
+		if partition_key not in self._sorted:
+			partition = self.partitions.get(partition_key, {})
+			self._sorted[partition_key] = [ (entry_key, partition[entry_key]) for entry_key in sorted(partition, key=self._get_order) ]
+		return self._sorted[partition_key]
+	
+	def _get_order(self, entry_key):
+		return tuple(value[1] for value in entry_key)
+	
+	def project(self, item):
+		projection_type = self.projection.get('ProjectionType', 'ALL')
+		if projection_type == 'ALL':
+			return item
+		names = set(self.key_names)
+		if projection_type == 'INCLUDE':
+			names.update(self.projection.get('NonKeyAttributes', []))
+		return { name: value for name, value in item.items() if name in names }
+	
+	@property
+	def item_count(self):
+		return sum(len(partition) for partition in self.partitions.values())
+
+
+def _extract_key_names(key_schema):
+	partition_key = sort_key = None
+	for key_info in key_schema or []:
+		if key_info.get('KeyType') == 'HASH':
+			partition_key = key_info.get('AttributeName')
+		elif key_info.get('KeyType') == 'RANGE':
+			sort_key = key_info.get('AttributeName')
+	return partition_key, sort_key
+
+
+class _MemoryTable:
+	def __init__(self, name, key_schema, attribute_definitions, global_indexes=None, local_indexes=None):
+		self.name = name
+		self.key_schema = key_schema
+		self.attribute_definitions = attribute_definitions
+		self.attribute_types = { definition['AttributeName']: definition['AttributeType'] for definition in attribute_definitions }
+		self.partition_key, self.sort_key = _extract_key_names(key_schema)
+		self.key_names = [self.partition_key]
+		if self.sort_key:
+			self.key_names.append(self.sort_key)
+		self.primary = _KeyedIndex(None, key_schema, self.key_names)
+		self.items = {}
+		# Sizes of stored items by id(); stored items are never modified in place
+		self.sizes = {}
+		self.indexes = {}
+		self.global_indexes = []
+		self.local_indexes = []
+		for index_info in global_indexes or []:
+			self.indexes[index_info['IndexName']] = _KeyedIndex(index_info['IndexName'], index_info['KeySchema'], self.key_names, index_info.get('Projection'))
+			self.global_indexes.append(index_info)
+		for index_info in local_indexes or []:
+			self.indexes[index_info['IndexName']] = _KeyedIndex(index_info['IndexName'], index_info['KeySchema'], self.key_names, index_info.get('Projection'))
+			self.local_indexes.append(index_info)
+	
+	@property
+	def arn(self):
+		return "arn:aws:dynamodb:local:000000000000:table/{}".format(self.name)
+	
+	def get_index(self, operation, index_name):
+		if not index_name:
+			return self.primary
+		if index_name not in self.indexes:
+			raise _validation_error(operation, "The table does not have the specified index: {}".format(index_name))
+		return self.indexes[index_name]
+	
+	def get_key(self, operation, key):
+		if type(key) is not dict or set(key) != set(self.key_names):
+			raise _validation_error(operation, "The provided key element does not match the schema")
+		self.check_key_types(operation, key, self.key_names)
+		return tuple(_normalize(key[name]) for name in self.key_names)
+	
+	def check_key_types(self, operation, item, names):
+		for name in names:
+			if name not in item:
+				continue
+			attribute_type = _get_type(item[name])
+			if attribute_type != self.attribute_types.get(name):
+				raise _validation_error(operation, "One or more parameter values were invalid: Type mismatch for key {} expected: {} actual: {}".format(name, self.attribute_types.get(name), attribute_type))
+			if attribute_type in ['S', 'B'] and not item[name][attribute_type]:
+				raise _validation_error(operation, "One or more parameter values are not valid. The AttributeValue for a key attribute cannot contain an empty string value. Key: {}".format(name))
+	
+	def get_item_key(self, operation, item):
+		for name in self.key_names:
+			if name not in item:
+				raise _validation_error(operation, "One or more parameter values were invalid: Missing the key {} in the item".format(name))
+		index_keys = [ name for index in self.indexes.values() for name in [index.partition_key, index.sort_key] if name ]
+		self.check_key_types(operation, item, self.key_names + index_keys)
+		return tuple(_normalize(item[name]) for name in self.key_names)
+	
+	def put(self, key, item):
+		old_item = self.items.get(key)
+		if old_item is not None:
+			self._unindex(old_item)
+		self.items[key] = item
+		self.sizes[id(item)] = _item_size(item)
+		self.primary.add(item)
+		for index in self.indexes.values():
+			index.add(item)
+		return old_item
+	
+	def delete(self, key):
+		old_item = self.items.pop(key, None)
+		if old_item is not None:
+			self._unindex(old_item)
+		return old_item
+	
+	def get_size(self, item):
+		size = self.sizes.get(id(item))
+		if size is None:
+			size = _item_size(item)
+		return size
+	
+	def _unindex(self, item):
+		self.sizes.pop(id(item), None)
+		self.primary.remove(item)
+		for index in self.indexes.values():
+			index.remove(item)
+	
+	def describe(self):
+		description = {
+			"TableName": self.name,
+			"TableArn": self.arn,
+			"TableStatus": "ACTIVE",
+			"KeySchema": self.key_schema,
+			"AttributeDefinitions": self.attribute_definitions,
+			"ItemCount": len(self.items),
+			"TableSizeBytes": sum(self.sizes.values()),
+			"BillingModeSummary": { "BillingMode": "PAY_PER_REQUEST" }
+		}
+		for key, index_list in [('GlobalSecondaryIndexes', self.global_indexes), ('LocalSecondaryIndexes', self.local_indexes)]:
+			if not index_list:
+				continue
+			description[key] = []
+			for index_info in index_list:
+				index = self.indexes[index_info['IndexName']]
+				description[key].append({
+					"IndexName": index.name,
+					"KeySchema": index.key_schema,
+					"Projection": index.projection,
+					"IndexStatus": "ACTIVE",
+					"IndexArn": "{}/index/{}".format(self.arn, index.name),
+					"ItemCount": index.item_count
+				})
+		return _copy_value(description)
+
+
+class MemoryClient:
+	"""
+	Drop-in for boto3.client('dynamodb') backed by memory. Safe to share between threads.
+	
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client = moses_common.dynamodb_memory.MemoryClient(page_bytes=4096)  # Force small pages
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	"""
+	def __init__(self, page_bytes=None):
+		self.max_page_bytes = page_bytes or max_page_bytes
+		self.tables = {}
+		# Request counts by operation, for tests and benchmarks
+		self.calls = {}
+		self._lock = threading.RLock()
+		self.meta = types.SimpleNamespace(region_name='local')
+	
+	"""
+	Shorthand for create_table(). Keys are (name, type) tuples; indexes maps global secondary
+	index names to (partition_key, sort_key) with projection ALL.
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), None)
+	})
+	"""
+	def add_table(self, table_name, partition_key, sort_key=None, indexes=None):
+		definitions = {}
+		def get_key_schema(partition_key, sort_key):
+			key_schema = []
+			for key, key_type in [(partition_key, 'HASH'), (sort_key, 'RANGE')]:
+				if not key:
+					continue
+				definitions[key[0]] = key[1]
+				key_schema.append({ "AttributeName": key[0], "KeyType": key_type })
+			return key_schema
+		
+		args = {
+			"TableName": table_name,
+			"KeySchema": get_key_schema(partition_key, sort_key)
+		}
+		if indexes:
+			args['GlobalSecondaryIndexes'] = [ {
+				"IndexName": index_name,
+				"KeySchema": get_key_schema(*index_keys),
+				"Projection": { "ProjectionType": "ALL" }
+			} for index_name, index_keys in indexes.items() ]
+		args['AttributeDefinitions'] = [ { "AttributeName": name, "AttributeType": key_type } for name, key_type in definitions.items() ]
+		return self.create_table(**args)
+	
+	"""
+	Returns a stand-in for boto3.resource('dynamodb') that uses this client.
+	resource = client.resource()
+	"""
+	def resource(self):
+		return MemoryResource(self)
+	
+	def _get_table(self, operation, table_name):
+		table = self.tables.get(table_name)
+		if table is None:
+			raise _client_error(operation, 'ResourceNotFoundException', "Requested resource not found: Table: {} not found".format(table_name))
+		return table
+	
+	def _count(self, operation):
+		self.calls[operation] = self.calls.get(operation, 0) + 1
+	
+	def _get_capacity(self, table, items, read, consistent=True, return_consumed=None, size=None):
+		if not return_consumed or return_consumed == 'NONE':
+			return None
+		if size is None:
+			sizes = [ table.get_size(item) for item in items if item is not None ]
+			size = sum(sizes) if read else max(sizes or [0])
+		if read:
+			units = max(math.ceil(size / 4096), 1)
+			if not consistent:
+				units = units / 2
+		else:
+			units = max(math.ceil(size / 1024), 1)
+		return { "TableName": table.name, "CapacityUnits": float(units) }
+	
+	def _check_select(self, operation, select, projection_expression):
+		if select and select not in ['ALL_ATTRIBUTES', 'ALL_PROJECTED_ATTRIBUTES', 'SPECIFIC_ATTRIBUTES', 'COUNT']:
+			raise _validation_error(operation, "1 validation error detected: Value '{}' at 'select' failed to satisfy constraint".format(select))
+		if projection_expression and select and select != 'SPECIFIC_ATTRIBUTES':
+			raise _validation_error(operation, "Cannot specify the ProjectionExpression when choosing to get {}".format(select))
+	
+	def _parse_projection(self, parser, projection_expression):
+		if projection_expression is None:
+			return None
+		return parser.parse_projection(projection_expression)
+	
+	def _check_condition(self, operation, condition, item):
+		if condition is not None and not _evaluate(condition, item or {}):
+			raise _client_error(operation, 'ConditionalCheckFailedException', "The conditional request failed")
+	
+	def _get_return_values(self, operation, return_values, allowed):
+		return_values = return_values or 'NONE'
+		if return_values not in allowed:
+			raise _validation_error(operation, "Return values set to invalid value")
+		return return_values
+	
+	# ---------- Tables ----------
+	
+	def create_table(self, TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes=None, LocalSecondaryIndexes=None, **kwargs):
+		with self._lock:
+			self._count('create_table')
+			if TableName in self.tables:
+				raise _client_error('CreateTable', 'ResourceInUseException', "Table already exists: {}".format(TableName))
+			table = _MemoryTable(TableName, KeySchema, AttributeDefinitions, GlobalSecondaryIndexes, LocalSecondaryIndexes)
+			defined = set(table.attribute_types)
+			for name in table.key_names + [ name for index in table.indexes.values() for name in [index.partition_key, index.sort_key] if name ]:
+				if name not in defined:
+					raise _validation_error('CreateTable', "One or more parameter values were invalid: Some index key attributes are not defined in AttributeDefinitions")
+			self.tables[TableName] = table
+			return _success(TableDescription=table.describe())
+	
+	def delete_table(self, TableName, **kwargs):
+		with self._lock:
+			self._count('delete_table')
+			table = self._get_table('DeleteTable', TableName)
+			description = table.describe()
+			del self.tables[TableName]
+			return _success(TableDescription=description)
+	
+	def describe_table(self, TableName, **kwargs):
+		with self._lock:
+			self._count('describe_table')
+			return _success(Table=self._get_table('DescribeTable', TableName).describe())
+	
+	def list_tables(self, **kwargs):
+		with self._lock:
+			self._count('list_tables')
+			return _success(TableNames=sorted(self.tables))
+	
+	# ---------- Items ----------
+	
+	def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('get_item')
+			table = self._get_table('GetItem', TableName)
+			parser = _ExpressionParser('GetItem', ExpressionAttributeNames)
+			paths = self._parse_projection(parser, ProjectionExpression)
+			parser.check_unused()
+			
+			item = table.items.get(table.get_key('GetItem', Key))
+			response = {}
+			if item is not None:
+				response['Item'] = _project(item, paths) if paths else _copy_item(item)
+			consumed = self._get_capacity(table, [item], True, ConsistentRead, ReturnConsumedCapacity)
+			if consumed:
+				response['ConsumedCapacity'] = consumed
+			return _success(**response)
+	
+	def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues=None, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('put_item')
+			table = self._get_table('PutItem', TableName)
+			return_values = self._get_return_values('PutItem', ReturnValues, ['NONE', 'ALL_OLD'])
+			parser = _ExpressionParser('PutItem', ExpressionAttributeNames, ExpressionAttributeValues)
+			condition = parser.parse_condition(ConditionExpression) if ConditionExpression is not None else None
+			parser.check_unused()
+			
+			key = table.get_item_key('PutItem', Item)
+			for value in Item.values():
+				_normalize(value)
+			old_item = table.items.get(key)
+			self._check_condition('PutItem', condition, old_item)
+			table.put(key, _copy_item(Item))
+			
+			response = {}
+			if return_values == 'ALL_OLD' and old_item is not None:
+				response['Attributes'] = _copy_item(old_item)
+			consumed = self._get_capacity(table, [Item, old_item], False, return_consumed=ReturnConsumedCapacity)
+			if consumed:
+				response['ConsumedCapacity'] = consumed
+			return _success(**response)
+	
+	def update_item(self, TableName, Key, UpdateExpression=None, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues=None, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('update_item')
+			table = self._get_table('UpdateItem', TableName)
+			return_values = self._get_return_values('UpdateItem', ReturnValues, ['NONE', 'ALL_OLD', 'UPDATED_OLD', 'ALL_NEW', 'UPDATED_NEW'])
+			parser = _ExpressionParser('UpdateItem', ExpressionAttributeNames, ExpressionAttributeValues)
+			actions = parser.parse_update(UpdateExpression) if UpdateExpression is not None else []
+			condition = parser.parse_condition(ConditionExpression) if ConditionExpression is not None else None
+			parser.check_unused()
+			
+			key = table.get_key('UpdateItem', Key)
+			old_item = table.items.get(key)
+			self._check_condition('UpdateItem', condition, old_item)
+			new_item = self._apply_update('UpdateItem', table, actions, old_item, Key)
+			table.put(key, new_item)
+			
+			response = {}
+			updated_names = set(action[1][0] for action in actions)
+			if return_values == 'ALL_OLD' and old_item is not None:
+				response['Attributes'] = _copy_item(old_item)
+			elif return_values == 'ALL_NEW':
+				response['Attributes'] = _copy_item(new_item)
+			elif return_values == 'UPDATED_OLD' and old_item is not None:
+				response['Attributes'] = { name: _copy_value(value) for name, value in old_item.items() if name in updated_names }
+			elif return_values == 'UPDATED_NEW':
+				response['Attributes'] = { name: _copy_value(value) for name, value in new_item.items() if name in updated_names }
+			if 'Attributes' in response and not response['Attributes']:
+				del response['Attributes']
+			consumed = self._get_capacity(table, [new_item, old_item], False, return_consumed=ReturnConsumedCapacity)
+			if consumed:
+				response['ConsumedCapacity'] = consumed
+			return _success(**response)
+	
+	def _apply_update(self, operation, table, actions, old_item, key):
+		original = old_item or dict(key)
+		new_item = _copy_item(original)
+		seen_paths = []
+		for action in actions:
+			kind, path = action[0], action[1]
+			for seen_path in seen_paths:
+				shorter = min(len(seen_path), len(path))
+				if seen_path[:shorter] == path[:shorter]:
+					raise _validation_error(operation, "Invalid UpdateExpression: Two document paths overlap with each other; must remove or rewrite one of these paths")
+			seen_paths.append(path)
+			if path[0] in table.key_names:
+				raise _validation_error(operation, "One or more parameter values were invalid: Cannot update attribute {}. This attribute is part of the key".format(path[0]))
+			
+			if kind == 'set':
+				_set_path(operation, new_item, path, _copy_value(_get_set_value(operation, action[2], original)))
+			elif kind == 'remove':
+				_remove_path(new_item, path)
+			elif kind == 'add':
+				value = action[2]
+				value_type = _get_type(value)
+				existing = _get_path(new_item, path)
+				if value_type == 'N':
+					if existing is None:
+						_set_path(operation, new_item, path, _copy_value(value))
+					elif 'N' in existing:
+						_set_path(operation, new_item, path, { "N": _format_number(_to_decimal(existing['N']) + _to_decimal(value['N'])) })
+					else:
+						raise _validation_error(operation, "An operand in the update expression has an incorrect data type")
+				elif value_type in ['SS', 'NS', 'BS']:
+					if existing is None:
+						_set_path(operation, new_item, path, _copy_value(value))
+					elif value_type in existing:
+						merged = list(existing[value_type]) + [ element for element in value[value_type] if element not in existing[value_type] ]
+						_set_path(operation, new_item, path, { value_type: merged })
+					else:
+						raise _validation_error(operation, "An operand in the update expression has an incorrect data type")
+				else:
+					raise _validation_error(operation, "Invalid UpdateExpression: Incorrect operand type for operator or function; operator: ADD, operand type: {}".format(value_type))
+			elif kind == 'delete':
+				value = action[2]
+				value_type = _get_type(value)
+				if value_type not in ['SS', 'NS', 'BS']:
+					raise _validation_error(operation, "Invalid UpdateExpression: Incorrect operand type for operator or function; operator: DELETE, operand type: {}".format(value_type))
+				existing = _get_path(new_item, path)
+				if existing is None:
+					continue
+				if value_type not in existing:
+					raise _validation_error(operation, "An operand in the update expression has an incorrect data type")
+				remaining = [ element for element in existing[value_type] if element not in value[value_type] ]
+				if remaining:
+					_set_path(operation, new_item, path, { value_type: remaining })
+				else:
+					_remove_path(new_item, path)
+		table.get_item_key(operation, new_item)
+		for value in new_item.values():
+			_normalize(value)
+		return new_item
+	
+	def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues=None, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('delete_item')
+			table = self._get_table('DeleteItem', TableName)
+			return_values = self._get_return_values('DeleteItem', ReturnValues, ['NONE', 'ALL_OLD'])
+			parser = _ExpressionParser('DeleteItem', ExpressionAttributeNames, ExpressionAttributeValues)
+			condition = parser.parse_condition(ConditionExpression) if ConditionExpression is not None else None
+			parser.check_unused()
+			
+			key = table.get_key('DeleteItem', Key)
+			self._check_condition('DeleteItem', condition, table.items.get(key))
+			old_item = table.delete(key)
+			
+			response = {}
+			if return_values == 'ALL_OLD' and old_item is not None:
+				response['Attributes'] = old_item
+			consumed = self._get_capacity(table, [old_item], False, return_consumed=ReturnConsumedCapacity)
+			if consumed:
+				response['ConsumedCapacity'] = consumed
+			return _success(**response)
+	
+	# ---------- Query and scan ----------
+	
+	def query(self, TableName, KeyConditionExpression=None, IndexName=None, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, Select=None, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, ConsistentRead=False, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('query')
+			table = self._get_table('Query', TableName)
+			index = table.get_index('Query', IndexName)
+			self._check_select('Query', Select, ProjectionExpression)
+			if KeyConditionExpression is None:
+				raise _validation_error('Query', "Either the KeyConditions or KeyConditionExpression parameter must be specified in the request.")
+			parser = _ExpressionParser('Query', ExpressionAttributeNames, ExpressionAttributeValues)
+			key_condition = parser.parse_condition(KeyConditionExpression, 'KeyConditionExpression')
+			filter_condition = parser.parse_condition(FilterExpression, 'FilterExpression') if FilterExpression is not None else None
+			paths = self._parse_projection(parser, ProjectionExpression)
+			parser.check_unused()
+			
+			partition_value = self._get_partition_value(index, key_condition)
+			entries = index.get_partition(_normalize(partition_value))
+			if not ScanIndexForward:
+				entries = entries[::-1]
+			start = 0
+			if ExclusiveStartKey:
+				start_key = index.get_entry_key(ExclusiveStartKey)[1]
+				if start_key is None:
+					raise _validation_error('Query', "The provided starting key is invalid")
+				for position, (entry_key, item) in enumerate(entries):
+					if self._is_past(index, entry_key, start_key, ScanIndexForward):
+						start = position
+						break
+				else:
+					start = len(entries)
+			candidates = (item for entry_key, item in entries[start:] if _evaluate(key_condition, item))
+			return self._get_page('Query', table, index, candidates, Limit, filter_condition, paths, Select, ConsistentRead, ReturnConsumedCapacity)
+	
+	def _is_past(self, index, entry_key, start_key, forward):
+		order = index._get_order(entry_key)
+		start_order = index._get_order(start_key)
+		return order > start_order if forward else order < start_order
+	
+	def _get_partition_value(self, index, key_condition):
+		conditions = [key_condition]
+		sort_conditions = 0
+		partition_value = None
+		while conditions:
+			condition = conditions.pop()
+			if condition[0] == 'and':
+				conditions.extend([condition[1], condition[2]])
+				continue
+			names = self._get_condition_names(condition)
+			if names == [index.partition_key] and condition[0] == 'compare' and condition[1] == '=' and condition[3][0] == 'value':
+				if partition_value is not None:
+					raise _validation_error('Query', "KeyConditionExpressions must only contain one condition per key")
+				partition_value = condition[3][1]
+			elif names == [index.sort_key] and index.sort_key and condition[0] in ['compare', 'between', 'function']:
+				if condition[0] == 'compare' and condition[1] == '<>':
+					raise _validation_error('Query', "Unsupported operator in KeyConditionExpression: <>")
+				if condition[0] == 'function' and condition[1] != 'begins_with':
+					raise _validation_error('Query', "Invalid operator used in KeyConditionExpression: {}".format(condition[1]))
+				sort_conditions += 1
+			else:
+				raise _validation_error('Query', "Query key condition not supported")
+		if partition_value is None:
+			raise _validation_error('Query', "Query condition missed key schema element: {}".format(index.partition_key))
+		if sort_conditions > 1:
+			raise _validation_error('Query', "KeyConditionExpressions must only contain one condition per key")
+		return partition_value
+	
+	def _get_condition_names(self, condition):
+		names = []
+		for operand in condition[1:]:
+			operands = operand if type(operand) is list else [operand]
+			for element in operands:
+				if type(element) is tuple and element[0] in ['path', 'size']:
+					if len(element[1]) > 1:
+						return None
+					names.append(element[1][0])
+		return sorted(set(names))
+	
+	def scan(self, TableName, IndexName=None, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, Select=None, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None, ConsistentRead=False, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('scan')
+			table = self._get_table('Scan', TableName)
+			index = table.get_index('Scan', IndexName)
+			self._check_select('Scan', Select, ProjectionExpression)
+			if (Segment is None) != (TotalSegments is None):
+				raise _validation_error('Scan', "The TotalSegments parameter is required but was not present in the request when Segment parameter is present")
+			if TotalSegments is not None and not 0 <= Segment < TotalSegments:
+				raise _validation_error('Scan', "The Segment parameter is zero-based and must be less than parameter TotalSegments")
+			parser = _ExpressionParser('Scan', ExpressionAttributeNames, ExpressionAttributeValues)
+			filter_condition = parser.parse_condition(FilterExpression, 'FilterExpression') if FilterExpression is not None else None
+			paths = self._parse_projection(parser, ProjectionExpression)
+			parser.check_unused()
+			
+			partition_keys = list(index.partitions)
+			if TotalSegments:
+				partition_keys = [ partition_key for partition_key in partition_keys if zlib.crc32(repr(partition_key).encode('utf-8')) % TotalSegments == Segment ]
+			entries = [ (partition_key, entry_key, item) for partition_key in partition_keys for entry_key, item in index.get_partition(partition_key) ]
+			start = 0
+			if ExclusiveStartKey:
+				start_key = index.get_entry_key(ExclusiveStartKey)
+				for position, (partition_key, entry_key, item) in enumerate(entries):
+					if (partition_key, entry_key) == start_key:
+						start = position + 1
+						break
+				else:
+					raise _validation_error('Scan', "The provided starting key is invalid")
+			candidates = (item for partition_key, entry_key, item in entries[start:])
+			return self._get_page('Scan', table, index, candidates, Limit, filter_condition, paths, Select, ConsistentRead, ReturnConsumedCapacity)
+	
+	def _get_page(self, operation, table, index, candidates, limit, filter_condition, paths, select, consistent, return_consumed):
+		if limit is not None and (type(limit) is not int or limit < 1):
+			raise _validation_error(operation, "1 validation error detected: Value '{}' at 'limit' failed to satisfy constraint: Member must have value greater than or equal to 1".format(limit))
+		items = []
+		scanned = 0
+		size = 0
+		last_item = None
+		more = False
+		for item in candidates:
+			if last_item is not None and ((limit and scanned >= limit) or size >= self.max_page_bytes):
+				more = True
+				break
+			scanned += 1
+			size += table.get_size(item)
+			last_item = item
+			if filter_condition is None or _evaluate(filter_condition, item):
+				items.append(item)
+		
+		response = {
+			"Count": len(items),
+			"ScannedCount": scanned
+		}
+		if select != 'COUNT':
+			if paths:
+				response['Items'] = [ _project(item, paths) for item in items ]
+			else:
+				response['Items'] = [ _copy_item(index.project(item)) for item in items ]
+		if more:
+			response['LastEvaluatedKey'] = { name: _copy_value(last_item[name]) for name in index.key_names }
+		consumed = self._get_capacity(table, None, True, consistent, return_consumed, size=size)
+		if consumed:
+			response['ConsumedCapacity'] = consumed
+		return _success(**response)
+	
+	# ---------- Batches and transactions ----------
+	
+	def batch_get_item(self, RequestItems, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('batch_get_item')
+			if not RequestItems or sum(len(request.get('Keys', [])) for request in RequestItems.values()) > 100:
+				raise _validation_error('BatchGetItem', "Too many items requested for the BatchGetItem call")
+			responses = {}
+			consumed = []
+			for table_name, request in RequestItems.items():
+				table = self._get_table('BatchGetItem', table_name)
+				parser = _ExpressionParser('BatchGetItem', request.get('ExpressionAttributeNames'))
+				paths = self._parse_projection(parser, request.get('ProjectionExpression'))
+				parser.check_unused()
+				keys = [ table.get_key('BatchGetItem', key) for key in request['Keys'] ]
+				if len(set(keys)) != len(keys):
+					raise _validation_error('BatchGetItem', "Provided list of item keys contains duplicates")
+				items = [ table.items[key] for key in keys if key in table.items ]
+				responses[table_name] = [ _project(item, paths) if paths else _copy_item(item) for item in items ]
+				capacity = self._get_capacity(table, items, True, request.get('ConsistentRead'), ReturnConsumedCapacity)
+				if capacity:
+					consumed.append(capacity)
+			response = { "Responses": responses, "UnprocessedKeys": {} }
+			if consumed:
+				response['ConsumedCapacity'] = consumed
+			return _success(**response)
+	
+	def batch_write_item(self, RequestItems, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('batch_write_item')
+			if not RequestItems or sum(len(requests) for requests in RequestItems.values()) > 25:
+				raise _validation_error('BatchWriteItem', "Too many items requested for the BatchWriteItem call")
+			writes = []
+			for table_name, requests in RequestItems.items():
+				table = self._get_table('BatchWriteItem', table_name)
+				keys = set()
+				for request in requests:
+					if 'PutRequest' in request:
+						item = request['PutRequest']['Item']
+						key = table.get_item_key('BatchWriteItem', item)
+						for value in item.values():
+							_normalize(value)
+					elif 'DeleteRequest' in request:
+						item = None
+						key = table.get_key('BatchWriteItem', request['DeleteRequest']['Key'])
+					else:
+						raise _validation_error('BatchWriteItem', "Supplied write request must contain PutRequest or DeleteRequest")
+					if key in keys:
+						raise _validation_error('BatchWriteItem', "Provided list of item keys contains duplicates")
+					keys.add(key)
+					writes.append((table, key, item))
+			
+			consumed = {}
+			for table, key, item in writes:
+				if item is None:
+					old_item = table.delete(key)
+				else:
+					old_item = table.put(key, _copy_item(item))
+				capacity = self._get_capacity(table, [item, old_item], False, return_consumed=ReturnConsumedCapacity)
+				if capacity:
+					consumed.setdefault(table.name, 0)
+					consumed[table.name] += capacity['CapacityUnits']
+			response = { "UnprocessedItems": {} }
+			if consumed:
+				response['ConsumedCapacity'] = [ { "TableName": table_name, "CapacityUnits": units } for table_name, units in consumed.items() ]
+			return _success(**response)
+	
+	def transact_get_items(self, TransactItems, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('transact_get_items')
+			if not TransactItems or len(TransactItems) > 100:
+				raise _validation_error('TransactGetItems', "Member must have length less than or equal to 100")
+			responses = []
+			for transact_item in TransactItems:
+				request = transact_item['Get']
+				table = self._get_table('TransactGetItems', request['TableName'])
+				parser = _ExpressionParser('TransactGetItems', request.get('ExpressionAttributeNames'))
+				paths = self._parse_projection(parser, request.get('ProjectionExpression'))
+				parser.check_unused()
+				item = table.items.get(table.get_key('TransactGetItems', request['Key']))
+				if item is None:
+					responses.append({})
+				else:
+					responses.append({ "Item": _project(item, paths) if paths else _copy_item(item) })
+			return _success(Responses=responses)
+	
+	def transact_write_items(self, TransactItems, ClientRequestToken=None, ReturnConsumedCapacity=None, **kwargs):
+		with self._lock:
+			self._count('transact_write_items')
+			if not TransactItems or len(TransactItems) > 100:
+				raise _validation_error('TransactWriteItems', "Member must have length less than or equal to 100")
+			
+			# Validate and check every condition before writing anything
+			writes = []
+			seen_keys = set()
+			reasons = []
+			failed = False
+			for transact_item in TransactItems:
+				if len(transact_item) != 1:
+					raise _validation_error('TransactWriteItems', "TransactItems can only contain one of Check, Put, Update or Delete")
+				(action, request), = transact_item.items()
+				table = self._get_table('TransactWriteItems', request['TableName'])
+				parser = _ExpressionParser('TransactWriteItems', request.get('ExpressionAttributeNames'), request.get('ExpressionAttributeValues'))
+				actions = None
+				if action == 'Update':
+					actions = parser.parse_update(request['UpdateExpression'])
+				condition = None
+				if request.get('ConditionExpression') is not None:
+					condition = parser.parse_condition(request['ConditionExpression'])
+				elif action == 'ConditionCheck':
+					raise _validation_error('TransactWriteItems', "The ConditionExpression is required for ConditionCheck")
+				parser.check_unused()
+				
+				if action == 'Put':
+					key = table.get_item_key('TransactWriteItems', request['Item'])
+				elif action in ['Update', 'Delete', 'ConditionCheck']:
+					key = table.get_key('TransactWriteItems', request['Key'])
+				else:
+					raise _validation_error('TransactWriteItems', "Invalid transaction action: {}".format(action))
+				if (table.name, key) in seen_keys:
+					raise _validation_error('TransactWriteItems', "Transaction request cannot include multiple operations on one item")
+				seen_keys.add((table.name, key))
+				
+				old_item = table.items.get(key)
+				if condition is not None and not _evaluate(condition, old_item or {}):
+					reasons.append({ "Code": "ConditionalCheckFailed", "Message": "The conditional request failed" })
+					failed = True
+				else:
+					reasons.append({ "Code": "None" })
+				writes.append((action, table, key, request, actions, old_item))
+			
+			if failed:
+				raise _client_error('TransactWriteItems', 'TransactionCanceledException', "Transaction cancelled, please refer cancellation reasons for specific reasons [{}]".format(', '.join(reason['Code'] for reason in reasons)), CancellationReasons=reasons)
+			
+			new_items = []
+			for action, table, key, request, actions, old_item in writes:
+				if action == 'Put':
+					new_items.append((table, key, _copy_item(request['Item'])))
+				elif action == 'Update':
+					new_items.append((table, key, self._apply_update('TransactWriteItems', table, actions, old_item, request['Key'])))
+				elif action == 'Delete':
+					new_items.append((table, key, None))
+			for table, key, item in new_items:
+				if item is None:
+					table.delete(key)
+				else:
+					table.put(key, item)
+			return _success()
+
+
+class MemoryResource:
+	"""
+	Stand-in for boto3.resource('dynamodb') on top of a MemoryClient, for code written against
+	the resource API such as DynamoDBActionProcessor. Like boto3, it builds Key() and Attr()
+	conditions with ConditionExpressionBuilder and converts values with TypeSerializer and
+	TypeDeserializer, so numbers come back as Decimal and floats are rejected.
+	
+	resource = moses_common.dynamodb_memory.MemoryResource(client)
+	table = resource.Table('artist')
+	"""
+	def __init__(self, client):
+		self.meta = types.SimpleNamespace(client=client)
+	
+	def Table(self, table_name):
+		return MemoryResourceTable(self.meta.client, table_name)
+
+
+class MemoryResourceTable:
+	_condition_params = ['KeyConditionExpression', 'FilterExpression', 'ConditionExpression']
+	_item_params = ['Item', 'Key', 'ExclusiveStartKey']
+	_response_params = ['Item', 'Attributes', 'LastEvaluatedKey']
+	
+	def __init__(self, client, table_name):
+		self.name = table_name
+		self.table_name = table_name
+		self.meta = types.SimpleNamespace(client=client)
+		self._serializer = TypeSerializer()
+		self._deserializer = TypeDeserializer()
+	
+	def get_item(self, **kwargs):
+		return self._call('get_item', kwargs)
+	
+	def put_item(self, **kwargs):
+		return self._call('put_item', kwargs)
+	
+	def update_item(self, **kwargs):
+		return self._call('update_item', kwargs)
+	
+	def delete_item(self, **kwargs):
+		return self._call('delete_item', kwargs)
+	
+	def query(self, **kwargs):
+		return self._call('query', kwargs)
+	
+	def scan(self, **kwargs):
+		return self._call('scan', kwargs)
+	
+	def _call(self, operation, kwargs):
+		kwargs = dict(kwargs)
+		builder = ConditionExpressionBuilder()
+		for param in self._condition_params:
+			if isinstance(kwargs.get(param), ConditionBase):
+				built = builder.build_expression(kwargs[param], is_key_condition=(param == 'KeyConditionExpression'))
+				kwargs[param] = built.condition_expression
+				if built.attribute_name_placeholders:
+					kwargs['ExpressionAttributeNames'] = dict(kwargs.get('ExpressionAttributeNames') or {}, **built.attribute_name_placeholders)
+				if built.attribute_value_placeholders:
+					kwargs['ExpressionAttributeValues'] = dict(kwargs.get('ExpressionAttributeValues') or {}, **built.attribute_value_placeholders)
+		for param in self._item_params:
+			if param in kwargs:
+				kwargs[param] = { name: self._serializer.serialize(value) for name, value in kwargs[param].items() }
+		if kwargs.get('ExpressionAttributeValues'):
+			kwargs['ExpressionAttributeValues'] = { name: self._serializer.serialize(value) for name, value in kwargs['ExpressionAttributeValues'].items() }
+		
+		response = getattr(self.meta.client, operation)(TableName=self.name, **kwargs)
+		for param in self._response_params:
+			if param in response:
+				response[param] = { name: self._deserializer.deserialize(value) for name, value in response[param].items() }
+		if 'Items' in response:
+			response['Items'] = [ { name: self._deserializer.deserialize(value) for name, value in item.items() } for item in response['Items'] ]
+		return response
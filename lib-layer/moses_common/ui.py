@@ -6,7 +6,9 @@
 import getopt
 import inspect
 import logging
+import random
 import re
+import reprlib
 import os
 import sys
 from dataclasses import dataclass
@@ -15,6 +17,11 @@ from typing import Any, Dict, Optional
 
 import moses_common.__init__ as common
 
+# Payloads passed to Interface.debug_payload() are logged in full unless debug_max_length is set,
+# e.g. to 2000, to cut them to that many characters; debug_sample_rate logs that fraction of them,
+# e.g. 0.01 under load; 1 logs all.
+debug_max_length = None
+debug_sample_rate = 1
 
 @dataclass
 class ValidationResult:
@@ -825,8 +832,48 @@ class Interface:
 	def emergency(self, text=None):
 		self.log(text=text, log_level='emergency', formatting=['white', 'bold', 'red_bg', 'blink'], prefix='EMERGENCY:', padding=True)
 
+	# if ui.is_enabled('debug'):
+	def is_enabled(self, log_level='debug'):
+		level_info = self.get_log_level_info(log_level)
+		if self.log_level >= level_info['syslog_num']:
+			return True
+		return bool(self.log_messages and self.logger and self.logger.isEnabledFor(level_info['logging_num']))
+
+	# Bounded repr of a large value, e.g. a DynamoDB response, for debug output.
+	# Long containers and strings are elided while formatting, so the cost doesn't grow with the value.
+	# text = ui.truncate(response)
+	# text = ui.truncate(response, max_length=None)  # Full str()
+	def truncate(self, value, max_length=2000):
+		if not max_length:
+			return str(value)
+		if type(value) is str:
+			text = value
+		else:
+			formatter = reprlib.Repr()
+			formatter.maxlevel = 8
+			formatter.maxdict = formatter.maxlist = formatter.maxtuple = formatter.maxset = 25
+			formatter.maxstring = formatter.maxother = max(max_length // 10, 40)
+			text = formatter.repr(value)
+		if len(text) > max_length:
+			text = text[:max_length] + f"... ({len(text) - max_length} more characters)"
+		return text
+
+	# Debug output for a large value such as a request or response payload. Nothing is formatted
+	# unless debug logging is enabled and the call is sampled (see debug_sample_rate).
+	# ui.debug_payload("query response", response)
+	def debug_payload(self, label, payload):
+		if debug_sample_rate < 1 and random.random() >= debug_sample_rate:
+			return
+		self.debug(lambda: f"{label}: {self.truncate(payload, debug_max_length)}")
+
 	# general logging
+	# text may be a function that returns the text, which is only called if log_level is enabled
+	# ui.debug(lambda: f"response: {response}")
 	def log(self, text=None, log_level='notice', formatting=[], prefix=None, quote=None, padding=False, log_quote=None):
+		if callable(text):
+			if not self.is_enabled(log_level):
+				return
+			text = text()
 		if not text:
 			return
 		if prefix:
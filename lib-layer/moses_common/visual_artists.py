@@ -11,7 +11,7 @@ import moses_common.dynamodb
 import moses_common.openai
 import moses_common.ui
 
-artist_table = moses_common.dynamodb.Table('artintelligence.gallery-artists')
+artist_table = moses_common.dynamodb.Table('artintelligence.gallery-artists', lazy=True)
 artist_list = None
 
 """
@@ -76,7 +76,7 @@ class Collective:
 			common.write_file(self.artist_list_filename, response_data)
 	
 	def get_all_artist_ids(self):
-		artists_ids = artist_table.get_keys_as_list()
+		artists_ids = artist_table.get_keys_as_list(segments=4)
 		return artists_ids
 	
 	def sync_artists_to_db(self):
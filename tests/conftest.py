@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib-layer'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+import moses_common.dynamodb
+
+
+@pytest.fixture(autouse=True)
+def restore_dynamodb_backend():
+	"""
+	Tests point moses_common.dynamodb at a MemoryClient; put the previous client back
+	(and drop its cached DescribeTable results) so nothing leaks into the next test.
+	"""
+	backend = moses_common.dynamodb.get_backend()
+	yield
+	moses_common.dynamodb.set_backend(backend)
@@ -0,0 +1,29 @@
+from boto3.dynamodb.types import TypeSerializer
+
+_serializer = TypeSerializer()
+
+
+def serialize(record):
+	if record is None:
+		return None
+	return { name: _serializer.serialize(value) for name, value in record.items() }
+
+
+def make_record(table_name, event_name, keys, new=None, old=None, sequence=None):
+	"""
+	One DynamoDB Streams record as Lambda delivers it. With new=None the record has no
+	NewImage, like a KEYS_ONLY or OLD_IMAGE stream.
+	"""
+	stream_record = { "Keys": serialize(keys) }
+	if new is not None:
+		stream_record['NewImage'] = serialize(new)
+	if old is not None:
+		stream_record['OldImage'] = serialize(old)
+	if sequence is not None:
+		stream_record['SequenceNumber'] = str(sequence)
+	return {
+		"eventSource": "aws:dynamodb",
+		"eventName": event_name,
+		"eventSourceARN": f"arn:aws:dynamodb:us-west-2:123456789012:table/{table_name}/stream/2026-10-17T00:00:00.000",
+		"dynamodb": stream_record
+	}
@@ -0,0 +1,43 @@
+import moses_common.api_dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+def make_processor():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	client.add_table('membership', ('user_id', 'S'), ('artist_id', 'S'))
+	resource = client.resource()
+	processor = moses_common.api_dynamodb.DynamoDBActionProcessor(ddb_resource=resource, ui=moses_common.ui.Interface())
+	return client, resource, processor
+
+
+def make_action(**auth_options):
+	auth = { "table_name": "membership", "fields": [["user_id", "str", True], ["artist_id", "str", True]], "cache_ttl": 60 }
+	auth.update(auth_options)
+	return { "source": "ddb", "table_name": "artwork", "fields": [["artist_id", "str", True]], "auth": auth }
+
+
+def test_denials_are_not_cached_by_default():
+	client, resource, processor = make_processor()
+	action = make_action()
+	data = { "user_id": "u1", "artist_id": "a1" }
+	assert processor.process('GET', action, {}, data)['errors'][0]['code'] == 'auth_failed'
+	
+	# Access granted outside the processor applies to the next request
+	resource.Table('membership').put_item(Item={ "user_id": "u1", "artist_id": "a1" })
+	assert 'errors' not in processor.process('GET', action, {}, data)
+	
+	# Grants are cached
+	queries = client.calls['query']
+	assert 'errors' not in processor.process('GET', action, {}, data)
+	assert client.calls['query'] == queries + 1
+
+
+def test_denials_are_cached_with_negative_cache_ttl():
+	client, resource, processor = make_processor()
+	action = make_action(negative_cache_ttl=60)
+	data = { "user_id": "u1", "artist_id": "a1" }
+	assert processor.process('GET', action, {}, data)['errors'][0]['code'] == 'auth_failed'
+	resource.Table('membership').put_item(Item={ "user_id": "u1", "artist_id": "a1" })
+	assert processor.process('GET', action, {}, data)['errors'][0]['code'] == 'auth_failed'
@@ -0,0 +1,202 @@
+import pytest
+
+import moses_common.api_dynamodb
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class UnprocessedClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Leaves keys whose artwork_id is in unprocessed_reads or unprocessed_writes unprocessed by BatchGetItem or BatchWriteItem.
+	"""
+	def __init__(self):
+		super().__init__()
+		self.unprocessed_reads = set()
+		self.unprocessed_writes = set()
+		self.attempts = 0
+	
+	@staticmethod
+	def _split(requests, artwork_ids, get_key):
+		kept = [request for request in requests if get_key(request)['artwork_id']['N'] not in artwork_ids]
+		left = [request for request in requests if get_key(request)['artwork_id']['N'] in artwork_ids]
+		return kept, left
+	
+	def batch_get_item(self, RequestItems, **kwargs):
+		self.attempts += 1
+		request = dict(RequestItems['artwork'])
+		request['Keys'], left = self._split(request['Keys'], self.unprocessed_reads, lambda key: key)
+		response = super().batch_get_item(RequestItems={ "artwork": request }, **kwargs) if request['Keys'] else { "Responses": { "artwork": [] } }
+		if left:
+			response['UnprocessedKeys'] = { "artwork": dict(request, Keys=left) }
+		return response
+	
+	def batch_write_item(self, RequestItems, **kwargs):
+		self.attempts += 1
+		kept, left = self._split(RequestItems['artwork'], self.unprocessed_writes, lambda request: request['DeleteRequest']['Key'])
+		response = super().batch_write_item(RequestItems={ "artwork": kept }, **kwargs) if kept else {}
+		if left:
+			response['UnprocessedItems'] = { "artwork": left }
+		return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, '_backoff_delay', lambda attempt: 0)
+	monkeypatch.setattr(moses_common.dynamodb, 'batch_max_retries', 2)
+	client = UnprocessedClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	client.add_table('membership', ('user_id', 'S'), ('artist_id', 'S'))
+	resource = client.resource()
+	resource.Table('membership').put_item(Item={ "user_id": "u1", "artist_id": "a1" })
+	for artwork_id in range(3):
+		resource.Table('artwork').put_item(Item={ "artist_id": "a1", "artwork_id": artwork_id, "title": f"t{artwork_id}" })
+	return client
+
+
+@pytest.fixture
+def processor(client):
+	return moses_common.api_dynamodb.DynamoDBActionProcessor(ddb_resource=client.resource(), ui=moses_common.ui.Interface())
+
+
+def make_action(**options):
+	action = {
+		"source": "ddb",
+		"table_name": "artwork",
+		"batch": True,
+		"fields": [["artist_id", "str", True], ["artwork_id", "int", True], ["title", "str"]],
+		"auth": { "table_name": "membership", "fields": [["user_id", "str", True], ["artist_id", "str", True]] }
+	}
+	action.update(options)
+	return action
+
+
+def get_codes(response):
+	return [result['errors'][0]['code'] if 'errors' in result else None for result in response['results']]
+
+
+def get_titles(client):
+	return { int(item['artwork_id']['N']): item.get('title', {}).get('S') for item in client.scan(TableName='artwork')['Items'] }
+
+
+# _process_batch
+
+def test_rejects_bad_batches(processor):
+	action = make_action()
+	data = { "user_id": "u1", "artist_id": "a1" }
+	assert processor.process('GET', action, {}, data)['errors'][0]['message'] == "Batch requires a non-empty 'items' list"
+	assert processor.process('GET', action, {}, dict(data, items={}))['errors'][0]['code'] == 'bad_request'
+	response = processor.process('GET', make_action(batch_max=2), {}, dict(data, items=[{ "artwork_id": 0 }] * 3))
+	assert response['errors'][0]['message'] == "Batch is limited to 2 items"
+	assert processor.process('PUT', action, {}, dict(data, items=[{ "artwork_id": 0 }]))['errors'][0]['code'] == 'bad_request'
+
+
+def test_get_reads_each_element(processor):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0 }, { "artwork_id": 9 }, { "artwork_id": 0 }, { "artwork_id": 1 }] }
+	response = processor.process('GET', make_action(), {}, data)
+	assert get_codes(response) == [None, 'not_found', None, None]
+	assert response['results'][0]['item']['title'] == "t0"
+	assert response['results'][3]['item']['title'] == "t1"
+	assert response['count'] == 3
+
+
+def test_post_creates_like_single_requests(client, processor):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 5, "title": "new" }, { "artwork_id": 6 }] }
+	response = processor.process('POST', make_action(), {}, data)
+	assert get_codes(response) == [None, None]
+	assert response['results'][0]['item']['create_time']
+	assert get_titles(client)[5] == "new"
+	
+	# An existing item fails like a single create and nothing is written
+	data['items'] = [{ "artwork_id": 7 }, { "artwork_id": 1, "title": "overwritten" }]
+	response = processor.process('POST', make_action(), {}, data)
+	assert get_codes(response) == ['transaction_canceled', 'already_exists']
+	assert get_titles(client)[1] == "t1"
+	assert 7 not in get_titles(client)
+
+
+def test_post_must_be_atomic(client, processor):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 1, "title": "overwritten" }] }
+	response = processor.process('POST', make_action(atomic=False), {}, data)
+	assert response['errors'][0]['message'] == "POST batches must be atomic"
+	assert get_titles(client)[1] == "t1"
+
+
+def test_patch_requires_existing_items(client, processor):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0, "title": "new" }, { "artwork_id": 9, "title": "x" }] }
+	response = processor.process('PATCH', make_action(), {}, data)
+	assert get_codes(response) == ['transaction_canceled', 'not_found']
+	data['items'] = [{ "artwork_id": 0, "title": "new" }, { "artwork_id": 1, "title": None }]
+	response = processor.process('PATCH', make_action(), {}, data)
+	assert response['results'] == [{ "updated": { "artist_id": "a1", "artwork_id": 0 } }, { "updated": { "artist_id": "a1", "artwork_id": 1 } }]
+	assert get_titles(client)[0] == "new"
+	assert get_titles(client)[1] is None
+
+
+@pytest.mark.parametrize("atomic", [True, False])
+def test_delete_reports_missing_items(client, processor, atomic):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0 }, { "artwork_id": 9 }, { "artwork_id": 1 }] }
+	response = processor.process('DELETE', make_action(atomic=atomic), {}, data)
+	if atomic:
+		assert get_codes(response) == ['transaction_canceled', 'not_found', 'transaction_canceled']
+		assert sorted(get_titles(client)) == [0, 1, 2]
+	else:
+		assert get_codes(response) == [None, 'not_found', None]
+		assert response['results'][0] == { "deleted": { "artist_id": "a1", "artwork_id": 0 } }
+		assert sorted(get_titles(client)) == [2]
+
+
+def test_duplicate_keys_are_rejected(client, processor):
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0 }, { "artwork_id": 0 }] }
+	response = processor.process('DELETE', make_action(atomic=False), {}, data)
+	assert get_codes(response) == [None, 'bad_request']
+	assert response['results'][1]['errors'][0]['details'] == { "item": 0 }
+
+
+# _validate_batch
+
+def test_validation_and_auth_per_element(client, processor):
+	data = { "user_id": "u1", "items": [
+		{ "artist_id": "a1", "artwork_id": 0 },
+		{ "artist_id": "a2", "artwork_id": 0 },
+		"not an object",
+		{ "artist_id": "a1", "artwork_id": "x" },
+		{ "artist_id": "a1", "artwork_id": 1 }
+	] }
+	queries = client.calls.get('query', 0)
+	response = processor.process('GET', make_action(), {}, data)
+	assert get_codes(response) == [None, 'auth_failed', 'bad_request', 'bad_request', None]
+	# One auth query per distinct auth input
+	assert client.calls['query'] - queries == 2
+	
+	# A failed element cancels an atomic write
+	response = processor.process('DELETE', make_action(), {}, data)
+	assert get_codes(response) == ['transaction_canceled', 'auth_failed', 'bad_request', 'bad_request', 'transaction_canceled']
+	assert sorted(get_titles(client)) == [0, 1, 2]
+
+
+def test_path_vars_apply_to_every_element(client, processor):
+	data = { "user_id": "u1", "items": [{ "artist_id": "a2", "artwork_id": 0 }, { "artwork_id": 1 }] }
+	response = processor.process('GET', make_action(), { "artist_id": "a1" }, data)
+	assert get_codes(response) == [None, None]
+
+
+# Unprocessed items
+
+def test_unprocessed_keys_are_throttled(client, processor):
+	client.unprocessed_reads = { "1" }
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0 }, { "artwork_id": 1 }, { "artwork_id": 9 }] }
+	response = processor.process('GET', make_action(), {}, data)
+	assert get_codes(response) == [None, 'throttled', 'not_found']
+	assert client.attempts == 1 + moses_common.dynamodb.batch_max_retries
+
+
+def test_unprocessed_deletes_are_throttled(client, processor):
+	client.unprocessed_writes = { "1" }
+	data = { "user_id": "u1", "artist_id": "a1", "items": [{ "artwork_id": 0 }, { "artwork_id": 1 }, { "artwork_id": 2 }] }
+	response = processor.process('DELETE', make_action(atomic=False), {}, data)
+	assert get_codes(response) == [None, 'throttled', None]
+	# One read of the keys, then the write and its retries
+	assert client.attempts == 2 + moses_common.dynamodb.batch_max_retries
+	assert response['count'] == 2
+	assert sorted(get_titles(client)) == [1]
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+import moses_common.api_dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class SlowAuthClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Auth table queries wait for the data read to start, so a speculative GET that doesn't
+	overlap them shows up as read_overlapped False.
+	"""
+	def __init__(self):
+		super().__init__()
+		self.read_started = threading.Event()
+		self.read_overlapped = None
+	
+	def get_item(self, **kwargs):
+		self.read_started.set()
+		return super().get_item(**kwargs)
+	
+	def query(self, **kwargs):
+		if kwargs['TableName'] == 'membership':
+			self.read_overlapped = self.read_started.wait(timeout=2)
+		else:
+			self.read_started.set()
+		return super().query(**kwargs)
+
+
+@pytest.fixture
+def client():
+	client = SlowAuthClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	client.add_table('membership', ('user_id', 'S'), ('artist_id', 'S'))
+	resource = client.resource()
+	resource.Table('membership').put_item(Item={ "user_id": "member", "artist_id": "a1" })
+	resource.Table('artwork').put_item(Item={ "artist_id": "a1", "artwork_id": 1, "title": "Harbor" })
+	return client
+
+
+@pytest.fixture
+def processor(client):
+	return moses_common.api_dynamodb.DynamoDBActionProcessor(ddb_resource=client.resource(), ui=moses_common.ui.Interface())
+
+
+def make_action(table_name='artwork', **auth_options):
+	auth = { "table_name": "membership", "fields": [["user_id", "str", True], ["artist_id", "str", True]] }
+	auth.update(auth_options)
+	return {
+		"source": "ddb",
+		"table_name": table_name,
+		"speculative": True,
+		"fields": [["artist_id", "str", True], ["artwork_id", "int"]],
+		"auth": auth
+	}
+
+
+def test_allowed_get_returns_item_read_alongside_auth(client, processor):
+	response = processor.process('GET', make_action(), {}, { "user_id": "member", "artist_id": "a1", "artwork_id": 1 })
+	assert response == { "item": { "artist_id": "a1", "artwork_id": 1, "title": "Harbor" } }
+	assert client.read_overlapped is True
+
+
+def test_allowed_list_query(client, processor):
+	response = processor.process('GET', make_action(), {}, { "user_id": "member", "artist_id": "a1" })
+	assert [item['title'] for item in response['items']] == ["Harbor"]
+	assert client.read_overlapped is True
+
+
+def test_denied_get_never_returns_the_item(client, processor):
+	data = { "user_id": "stranger", "artist_id": "a1", "artwork_id": 1 }
+	response = processor.process('GET', make_action(), {}, data)
+	assert response == { "errors": [{ "code": "auth_failed", "message": "Authorization failed" }] }
+	# The item was read, then dropped
+	assert client.read_overlapped is True
+	assert client.calls['get_item'] == 1
+	assert "Harbor" not in str(response)
+
+
+def test_denied_list_query_never_returns_items(client, processor):
+	response = processor.process('GET', make_action(), {}, { "user_id": "stranger", "artist_id": "a1" })
+	assert response['errors'][0]['code'] == 'auth_failed'
+	assert 'items' not in response
+
+
+def test_denied_get_hides_whether_the_item_exists(client, processor):
+	response = processor.process('GET', make_action(), {}, { "user_id": "stranger", "artist_id": "a1", "artwork_id": 2 })
+	assert response['errors'][0]['code'] == 'auth_failed'
+
+
+def test_denied_get_hides_read_errors(client, processor):
+	# The read fails before reaching the table, so don't make auth wait for it
+	client.read_started.set()
+	response = processor.process('GET', make_action('missing-table'), {}, { "user_id": "stranger", "artist_id": "a1", "artwork_id": 1 })
+	assert response['errors'][0]['code'] == 'auth_failed'
+	
+	# Allowed, the read error is reported
+	response = processor.process('GET', make_action('missing-table'), {}, { "user_id": "member", "artist_id": "a1", "artwork_id": 1 })
+	assert response['errors'][0]['code'] != 'auth_failed'
+
+
+def test_cached_decisions_skip_speculation(client, processor):
+	action = make_action(cache_ttl=60, negative_cache_ttl=60)
+	for user_id in ["member", "stranger"]:
+		processor.process('GET', action, {}, { "user_id": user_id, "artist_id": "a1", "artwork_id": 1 })
+	client.read_started.clear()
+	queries = client.calls['query']
+	
+	assert processor.process('GET', action, {}, { "user_id": "member", "artist_id": "a1", "artwork_id": 1 })['item']['title'] == "Harbor"
+	# A cached denial doesn't read the item at all
+	get_items = client.calls['get_item']
+	assert processor.process('GET', action, {}, { "user_id": "stranger", "artist_id": "a1", "artwork_id": 1 })['errors'][0]['code'] == 'auth_failed'
+	assert client.calls['get_item'] == get_items
+	assert client.calls['query'] == queries
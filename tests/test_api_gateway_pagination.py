@@ -0,0 +1,60 @@
+import urllib.parse
+
+import moses_common.api_gateway
+import moses_common.ui
+
+
+def make_request(query=None):
+	event = { "httpMethod": "GET", "path": "/artworks", "queryStringParameters": query }
+	return moses_common.api_gateway.Request(event, ui=moses_common.ui.Interface())
+
+
+ORDER_BY = [{ "field": "title", "order": "asc" }, { "field": "year", "order": "desc" }]
+
+
+def test_page_number_links_are_unchanged():
+	api = make_request()
+	meta_data = api.get_pagination_links(45, { "page_size": 10, "page_number": 2, "order_by": ORDER_BY })
+	assert meta_data == {
+		"count": 45,
+		"page_size": 10,
+		"page_number": 2,
+		"last_page_number": 5,
+		"pagination_links": {
+			"first_page": "/artworks?page_size=10&page_number=1&title%20asc,year%20desc",
+			"last_page": "/artworks?page_size=10&page_number=5&title%20asc,year%20desc",
+			"prev_page": "/artworks?page_size=10&page_number=1&title%20asc,year%20desc",
+			"next_page": "/artworks?page_size=10&page_number=3&title%20asc,year%20desc"
+		}
+	}
+	assert api.get_pagination_links(5, { "page_size": 10 }) == { "count": 5, "page_size": 10 }
+	assert api.get_pagination_links(5) == { "count": 5 }
+
+
+def test_cursor_links():
+	api = make_request()
+	meta_data = api.get_pagination_links(None, { "page_size": 10, "order_by": ORDER_BY }, next_cursor="abc=_-")
+	assert meta_data == {
+		"page_size": 10,
+		"next_cursor": "abc=_-",
+		"pagination_links": {
+			"first_page": "/artworks?page_size=10&order_by=title%20asc,year%20desc",
+			"next_page": "/artworks?cursor=abc%3D_-&page_size=10&order_by=title%20asc,year%20desc"
+		}
+	}
+	
+	# The last cursor page only links back to the first
+	meta_data = api.get_pagination_links(3, { "page_size": 10, "cursor": "abc" })
+	assert meta_data == { "count": 3, "page_size": 10, "pagination_links": { "first_page": "/artworks?page_size=10" } }
+
+
+def test_cursor_link_reads_back():
+	api = make_request()
+	link = api.get_pagination_links(None, { "page_size": 10, "order_by": ORDER_BY }, next_cursor="abc")['pagination_links']['next_page']
+	query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(link).query))
+	assert make_request(query).get_pagination_from_query() == {
+		"page_size": 10,
+		"limit": 10,
+		"cursor": "abc",
+		"order_by": ORDER_BY
+	}
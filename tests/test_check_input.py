@@ -0,0 +1,25 @@
+import moses_common.__init__ as common
+
+
+field_list = [
+	["name", "str", True, 1, 16],
+	["status", "str", ["open", "sold"]],
+	["size", "dict", False, [
+		["width", "int", True],
+		["height", "int"]
+	]]
+]
+
+
+def test_compiled_input_matches_field_list():
+	field_specs = common.compile_input(field_list)
+	for body in [
+		{ "name": "Harbor", "status": "open", "size": { "width": "40", "height": 30 } },
+		{ "name": "", "status": "lost", "size": {} },
+		{}
+	]:
+		assert common.check_input(field_specs, dict(body)) == common.check_input(field_list, dict(body))
+
+
+def test_plain_tuple_is_an_invalid_schema():
+	assert common.check_input(tuple(field_list), { "name": "Harbor" }) == ({}, ["Invalid schema for check_input"])
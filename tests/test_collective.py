@@ -0,0 +1,153 @@
+import datetime
+
+import pytest
+
+import moses_common.__init__ as common
+import moses_common.collective
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+from stream_events import make_record
+
+
+@pytest.fixture
+def client():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artintelligence.gallery-settings', ('name', 'S'))
+	client.add_table('artintelligence.gallery-collective', ('id', 'S'))
+	client.add_table('artintelligence.gallery-works', ('artist_id', 'S'), ('name', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+@pytest.fixture
+def collective(client):
+	# Collective() sets log_level through common.normalize_log_level, which this tree's
+	# moses_common.__init__ doesn't define, so set up the instance without __init__
+	collective = moses_common.collective.Collective.__new__(moses_common.collective.Collective)
+	collective._log_level = 5
+	collective.dry_run = False
+	collective.ui = moses_common.ui.Interface()
+	# Don't compare against the settings table while the test runs
+	collective.artists_last_checked = common.get_dt_now()
+	collective.genres_last_checked = common.get_dt_now()
+	return collective
+
+
+def set_now(monkeypatch, now):
+	monkeypatch.setattr(common, 'get_dt_now', lambda format=None: now)
+
+
+def get_value(name):
+	return moses_common.collective.settings_table.get_item(name)['value']
+
+
+# _set_last_update
+
+def test_last_update_is_stored_as_a_datetime_string(monkeypatch, collective):
+	now = datetime.datetime(2026, 10, 17, 19, 15, 18, 598005, tzinfo=datetime.timezone.utc)
+	set_now(monkeypatch, now)
+	collective._set_last_update('artists_last_update')
+	assert get_value('artists_last_update') == common.convert_datetime_to_string(now)
+	assert common.convert_string_to_datetime(get_value('artists_last_update'), tz_aware=True) == now
+
+
+def test_last_update_never_moves_back(monkeypatch, collective):
+	later = datetime.datetime(2026, 10, 17, 19, 15, 18, 500000, tzinfo=datetime.timezone.utc)
+	set_now(monkeypatch, later)
+	collective._set_last_update('genres_last_update')
+	
+	# A writer with an earlier clock leaves the later time alone
+	set_now(monkeypatch, later - datetime.timedelta(microseconds=1))
+	collective._set_last_update('genres_last_update')
+	assert get_value('genres_last_update') == common.convert_datetime_to_string(later)
+	
+	# Whole seconds have no fractional part in the string but still order as times
+	for now in [
+		later + datetime.timedelta(microseconds=500000),
+		later + datetime.timedelta(microseconds=500001),
+		later + datetime.timedelta(days=1)
+	]:
+		set_now(monkeypatch, now)
+		collective._set_last_update('genres_last_update')
+		assert get_value('genres_last_update') == common.convert_datetime_to_string(now)
+	
+	set_now(monkeypatch, later + datetime.timedelta(seconds=2))
+	collective._set_last_update('genres_last_update')
+	assert get_value('genres_last_update') == common.convert_datetime_to_string(later + datetime.timedelta(days=1))
+
+
+# apply_stream_event
+
+# Artist and Genre set log_level through common.normalize_log_level too
+needs_log_level = pytest.mark.skipif(not hasattr(common, 'normalize_log_level'), reason="moses_common.__init__ has no normalize_log_level")
+
+
+@pytest.fixture
+def loaded(monkeypatch, client, collective):
+	monkeypatch.setattr(moses_common.collective, 'stream_sequences', {})
+	artists = moses_common.collective.artist_table
+	genres = moses_common.collective.genres_table
+	for artist_id, name in [("a1", "Ada"), ("b2", "Bea")]:
+		artists.put_item({ "id": artist_id, "name": name, "sort_name": name.lower() })
+		genres.put_item({ "artist_id": artist_id, "name": "landscape" })
+	monkeypatch.setattr(moses_common.collective, 'artist_list', None)
+	monkeypatch.setattr(moses_common.collective, 'genres_list', None)
+	assert len(collective.artists) == 2
+	assert len(collective.genres) == 2
+	return collective
+
+
+def get_artists():
+	return { artist.id: artist.name for artist in moses_common.collective.artist_list }
+
+
+def get_genres():
+	return sorted((genre.artist_id, genre.name) for genre in moses_common.collective.genres_list)
+
+
+@needs_log_level
+def test_stream_insert_modify_remove(loaded):
+	loaded.apply_stream_event({ "Records": [
+		make_record('artintelligence.gallery-collective', 'INSERT', { "id": "c3" }, new={ "id": "c3", "name": "Cy", "sort_name": "cy" }, sequence=10),
+		make_record('artintelligence.gallery-collective', 'MODIFY', { "id": "a1" }, new={ "id": "a1", "name": "Ada L", "sort_name": "ada" }, sequence=11),
+		make_record('artintelligence.gallery-collective', 'REMOVE', { "id": "b2" }, sequence=12),
+		make_record('artintelligence.gallery-works', 'INSERT', { "artist_id": "c3", "name": "portrait" }, new={ "artist_id": "c3", "name": "portrait" }, sequence=13),
+		make_record('artintelligence.gallery-works', 'MODIFY', { "artist_id": "a1", "name": "landscape" }, new={ "artist_id": "a1", "name": "landscape", "time_period": "now" }, sequence=14),
+		make_record('artintelligence.gallery-works', 'REMOVE', { "artist_id": "b2", "name": "landscape" }, sequence=15)
+	] })
+	assert get_artists() == { "a1": "Ada L", "c3": "Cy" }
+	assert [artist.id for artist in moses_common.collective.artist_list] == ["a1", "c3"]
+	assert get_genres() == [("a1", "landscape"), ("c3", "portrait")]
+	genre = [genre for genre in moses_common.collective.genres_list if genre.artist_id == "a1"][0]
+	assert genre.data['time_period'] == "now"
+	assert genre.artist.id == "a1"
+
+
+@needs_log_level
+def test_stream_out_of_order_records_are_skipped(loaded):
+	loaded.apply_stream_event([
+		make_record('artintelligence.gallery-collective', 'MODIFY', { "id": "a1" }, new={ "id": "a1", "name": "Newest", "sort_name": "ada" }, sequence=30),
+		make_record('artintelligence.gallery-collective', 'MODIFY', { "id": "a1" }, new={ "id": "a1", "name": "Older", "sort_name": "ada" }, sequence=20)
+	])
+	loaded.apply_stream_event([
+		make_record('artintelligence.gallery-collective', 'REMOVE', { "id": "a1" }, sequence=25),
+		make_record('artintelligence.gallery-works', 'REMOVE', { "artist_id": "a1", "name": "landscape" }, sequence=40),
+		make_record('artintelligence.gallery-works', 'INSERT', { "artist_id": "a1", "name": "landscape" }, new={ "artist_id": "a1", "name": "landscape" }, sequence=35)
+	])
+	assert get_artists() == { "a1": "Newest", "b2": "Bea" }
+	assert get_genres() == [("b2", "landscape")]
+
+
+@needs_log_level
+def test_stream_keys_only_records_read_the_item(loaded):
+	moses_common.collective.artist_table.put_item({ "id": "a1", "name": "Read back", "sort_name": "ada" })
+	loaded.apply_stream_event([make_record('artintelligence.gallery-collective', 'MODIFY', { "id": "a1" }, sequence=5)])
+	assert get_artists()["a1"] == "Read back"
+
+
+def test_stream_before_lists_load_is_ignored(monkeypatch, collective):
+	monkeypatch.setattr(moses_common.collective, 'artist_list', None)
+	monkeypatch.setattr(moses_common.collective, 'genres_list', None)
+	collective.apply_stream_event([make_record('artintelligence.gallery-collective', 'REMOVE', { "id": "a1" }, sequence=1)])
+	assert moses_common.collective.artist_list is None
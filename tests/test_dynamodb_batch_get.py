@@ -0,0 +1,84 @@
+import pytest
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class PartialBatchClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Returns only the first `processed` keys of each BatchGetItem request for `partial_requests`
+	requests; the rest come back in UnprocessedKeys with the request's other arguments.
+	"""
+	def __init__(self):
+		super().__init__()
+		self.processed = 10
+		self.partial_requests = 0
+		self.requests = []
+	
+	def batch_get_item(self, RequestItems, **kwargs):
+		(table_name, request), = RequestItems.items()
+		self.requests.append(request)
+		if not self.partial_requests or len(request['Keys']) <= self.processed:
+			return super().batch_get_item(RequestItems=RequestItems, **kwargs)
+		self.partial_requests -= 1
+		processed = dict(request, Keys=request['Keys'][:self.processed])
+		response = super().batch_get_item(RequestItems={ table_name: processed }, **kwargs)
+		response['UnprocessedKeys'] = { table_name: dict(request, Keys=request['Keys'][self.processed:]) }
+		return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, '_backoff_delay', lambda attempt: 0)
+	client = PartialBatchClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+@pytest.fixture
+def table(client):
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	with table.batch_writer() as writer:
+		for i in range(300):
+			writer.put_item({ "artist_id": "a1", "artwork_id": i, "title": f"t{i}", "notes": "x" })
+	return table
+
+
+def test_chunks_above_100_keys(client, table):
+	# 250 distinct keys, in a scrambled order, with duplicates and missing keys
+	artwork_ids = [(i * 7) % 250 for i in range(250)]
+	keys = [("a1", artwork_id) for artwork_id in artwork_ids] + [("a1", 3), ("a1", 999), ("a2", 1)]
+	records = table.batch_get_items(keys, workers=2)
+	assert [record['artwork_id'] for record in records] == artwork_ids
+	assert [len(request['Keys']) for request in client.requests] == [100, 100, 52]
+
+
+def test_unprocessed_keys_are_retried(client, table):
+	client.partial_requests = 4
+	keys = [{ "artist_id": "a1", "artwork_id": i } for i in range(150)]
+	records = table.batch_get_items(keys, projection=['title'], consistent=True)
+	assert [record['artwork_id'] for record in records] == list(range(150))
+	assert set(records[0]) == { 'artist_id', 'artwork_id', 'title' }
+	
+	# Retries carry the projection and read consistency with the remaining keys
+	assert len(client.requests) > 2
+	for request in client.requests:
+		assert request['ConsistentRead'] is True
+		assert request['ProjectionExpression']
+	assert sum(len(request['Keys']) for request in client.requests) > 150
+	assert table.metrics['retries'] == 4
+
+
+def test_unprocessed_keys_after_last_retry_raise(client, table, monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, 'batch_max_retries', 2)
+	client.partial_requests = 10
+	with pytest.raises(ConnectionError):
+		table.batch_get_items([("a1", i) for i in range(50)])
+	assert len(client.requests) == 3
+
+
+def test_no_keys(client, table):
+	assert table.batch_get_items([]) == []
+	assert client.requests == []
@@ -0,0 +1,59 @@
+import time
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class SlowPutClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Holds back batches that contain puts, so a later batch of deletes would finish first
+	if the writer let them race.
+	"""
+	def batch_write_item(self, RequestItems, **kwargs):
+		if any('PutRequest' in request for requests in RequestItems.values() for request in requests):
+			time.sleep(0.2)
+		return super().batch_write_item(RequestItems, **kwargs)
+
+
+def make_table(client):
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	return moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+
+
+def test_put_then_delete_in_later_batch_lands_in_order():
+	client = SlowPutClient()
+	table = make_table(client)
+	with table.batch_writer(workers=4) as writer:
+		for i in range(moses_common.dynamodb.batch_write_max_items):
+			writer.put_item({ "artist_id": "artist-1", "artwork_id": i, "title": f"Study {i}" })
+		writer.delete_item("artist-1", 0)
+	
+	assert table.get_item("artist-1", 0) is None
+	assert table.get_item("artist-1", 1)['title'] == "Study 1"
+	assert writer.stats['requests'] == 2
+
+
+def test_repeated_key_in_pending_batch_keeps_last_write():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	table = make_table(client)
+	stats = table.bulk_put([
+		{ "artist_id": "artist-1", "artwork_id": 1, "title": "First" },
+		{ "artist_id": "artist-1", "artwork_id": 1, "title": "Second" }
+	])
+	
+	assert table.get_item("artist-1", 1)['title'] == "Second"
+	assert stats['requests'] == 1
+	assert stats['put'] == 2
+
+
+def test_bulk_put_and_bulk_delete_many_batches():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	table = make_table(client)
+	records = [{ "artist_id": f"artist-{i % 3}", "artwork_id": i } for i in range(120)]
+	table.bulk_put(records, workers=4)
+	assert len(table.scan()) == 120
+	
+	table.bulk_delete([(record['artist_id'], record['artwork_id']) for record in records[:100]], workers=4)
+	assert len(table.scan()) == 20
@@ -0,0 +1,76 @@
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class HookClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Runs a hook in the middle of a request: during a put before it is applied, or during a
+	get after the item was read, to stand in for another thread using the same Table.
+	"""
+	def __init__(self):
+		super().__init__()
+		self.during_put = None
+		self.during_get = None
+	
+	def put_item(self, **kwargs):
+		hook, self.during_put = self.during_put, None
+		if hook:
+			hook()
+		return super().put_item(**kwargs)
+	
+	def get_item(self, **kwargs):
+		response = super().get_item(**kwargs)
+		hook, self.during_get = self.during_get, None
+		if hook:
+			hook()
+		return response
+
+
+def make_table():
+	client = HookClient()
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artist', ui=moses_common.ui.Interface(), item_cache_size=16)
+	table.put_item({ "artist_id": "a1", "name": "Old" })
+	return client, table
+
+
+def test_read_during_write_is_not_served_after_write():
+	client, table = make_table()
+	client.during_put = lambda: table.get_item("a1")
+	table.put_item({ "artist_id": "a1", "name": "New" })
+	assert table.get_item("a1")['name'] == "New"
+
+
+def test_read_that_overlaps_write_is_not_cached():
+	client, table = make_table()
+	client.during_get = lambda: table.put_item({ "artist_id": "a1", "name": "New" })
+	assert table.get_item("a1")['name'] == "Old"
+	assert table.get_item("a1")['name'] == "New"
+
+
+def test_failed_write_still_invalidates():
+	client, table = make_table()
+	assert table.get_item("a1")['name'] == "Old"
+	# Written through another Table, which this table's cache doesn't see
+	moses_common.dynamodb.Table('artist', ui=table.ui).put_item({ "artist_id": "a1", "name": "Changed" })
+	assert table.put_item({ "artist_id": "a1", "name": "New" }, condition='not_exists') is False
+	assert table.get_item("a1")['name'] == "Changed"
+
+
+def test_count_cache_is_opt_in():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	ui = moses_common.ui.Interface()
+	table = moses_common.dynamodb.Table('artwork', ui=ui)
+	cached_table = moses_common.dynamodb.Table('artwork', ui=ui, count_cache_ttl=30)
+	table.bulk_put([{ "artist_id": "a1", "artwork_id": i } for i in range(3)])
+	assert table.count_cache is None
+	assert cached_table.query_count("a1") == 3
+	
+	table.put_item({ "artist_id": "a1", "artwork_id": 3 })
+	assert table.query_count("a1") == 4
+	# Writes through other Table objects aren't seen until the entry expires
+	assert cached_table.query_count("a1") == 3
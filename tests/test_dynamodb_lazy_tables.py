@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+
+
+@pytest.fixture
+def client(monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, 'table_info_snapshot_file', None)
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('artwork_id', 'N'))
+	})
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+def describe_calls(client):
+	return client.calls.get('describe_table', 0)
+
+
+# Lazy tables
+
+def test_lazy_table_loads_on_first_attribute(client):
+	table = moses_common.dynamodb.Table('artwork', lazy=True)
+	assert not table.is_loaded
+	assert describe_calls(client) == 0
+	assert table.partition_key.name == 'artist_id'
+	assert table.is_loaded
+	assert sorted(table.attributes) == ['artist_id', 'artwork_id', 'status']
+	assert list(table.indexes) == ['status-index']
+	assert describe_calls(client) == 1
+
+
+def test_lazy_table_loads_once_across_threads(client):
+	table = moses_common.dynamodb.Table('artwork', lazy=True)
+	moses_common.dynamodb.invalidate_table_info()
+	barrier = threading.Barrier(8)
+	names = []
+	
+	def read_sort_key():
+		barrier.wait()
+		names.append(table.sort_key.name)
+	
+	threads = [threading.Thread(target=read_sort_key) for i in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert names == ['artwork_id'] * 8
+	assert describe_calls(client) == 1
+
+
+def test_lazy_missing_table_raises_on_use(client):
+	table = moses_common.dynamodb.Table('missing', lazy=True)
+	with pytest.raises(ClientError):
+		table.partition_key
+	assert not table.is_loaded
+
+
+# warm_tables
+
+def test_warm_tables(client):
+	tables = [moses_common.dynamodb.Table(name, lazy=True) for name in ['artwork', 'artist']]
+	moses_common.dynamodb.warm_tables(tables)
+	assert all(table.is_loaded for table in tables)
+	assert describe_calls(client) == 2
+	
+	# Loaded tables are skipped
+	moses_common.dynamodb.warm_tables(tables)
+	assert describe_calls(client) == 2
+
+
+def test_warm_tables_reports_each_failure(client, capsys):
+	tables = [moses_common.dynamodb.Table(name, lazy=True) for name in ['missing1', 'artwork', 'missing2']]
+	with pytest.raises(ClientError) as error:
+		moses_common.dynamodb.warm_tables(tables)
+	assert 'missing1' in str(error.value)
+	output = capsys.readouterr().out
+	assert "failed to load table 'missing1'" in output
+	assert "failed to load table 'missing2'" in output
+	assert [table.is_loaded for table in tables] == [False, True, False]
+	
+	# Failed tables try again on first use
+	client.add_table('missing1', ('id', 'S'))
+	assert tables[0].partition_key.name == 'id'
@@ -0,0 +1,170 @@
+import pytest
+from botocore.exceptions import ClientError
+
+import moses_common.api_dynamodb
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+@pytest.fixture
+def client():
+	client = moses_common.dynamodb_memory.MemoryClient(page_bytes=2048)
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('artwork_id', 'N'))
+	})
+	client.add_table('membership', ('user_id', 'S'), ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+@pytest.fixture
+def table(client):
+	return moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+
+
+@pytest.fixture
+def processor(client):
+	return moses_common.api_dynamodb.DynamoDBActionProcessor(ddb_resource=client.resource(), ui=moses_common.ui.Interface())
+
+
+def make_records(count, artist_id="a1"):
+	return [{ "artist_id": artist_id, "artwork_id": i, "status": "sold" if i % 3 == 0 else "open", "notes": "x" * 200 } for i in range(count)]
+
+
+# Conditions
+
+def test_put_item_conditions(table):
+	record = { "artist_id": "a1", "artwork_id": 1, "version": 1 }
+	assert table.put_item(record, condition='not_exists') is True
+	assert table.put_item(dict(record, version=2), condition='not_exists') is False
+	assert table.put_item(dict(record, version=2), condition='exists') is True
+	assert table.get_item("a1", 1)['version'] == 2
+
+
+def test_update_and_delete_conditions(table):
+	table.put_item({ "artist_id": "a1", "artwork_id": 1, "version": 3, "title": "Harbor" })
+	stale = { "name": "version", "operator": "=", "value": 2 }
+	current = { "name": "version", "operator": "=", "value": 3 }
+	assert table.update_item({ "artist_id": "a1", "artwork_id": 1, "title": "Dawn" }, condition=stale) is False
+	assert table.update_item({ "artist_id": "a1", "artwork_id": 1, "title": "Dawn" }, add={ "version": 1 }, condition=current) is True
+	assert table.get_item("a1", 1) == { "artist_id": "a1", "artwork_id": 1, "version": 4, "title": "Dawn" }
+	
+	assert table.delete_item("a1", 1, condition={ "name": "title", "operator": "begins_with", "value": "Har" }) is False
+	assert table.delete_item("a1", 1, condition=[{ "name": "title", "operator": "begins_with", "value": "Da" }, { "name": "version", "operator": "between", "value": [1, 5] }]) is True
+	assert table.get_item("a1", 1) is None
+
+
+def test_condition_failure_error_shape(client):
+	client.put_item(TableName='artwork', Item={ "artist_id": { "S": "a1" }, "artwork_id": { "N": "1" } })
+	with pytest.raises(ClientError) as error:
+		client.put_item(TableName='artwork', Item={ "artist_id": { "S": "a1" }, "artwork_id": { "N": "1" } }, ConditionExpression='attribute_not_exists(artist_id)')
+	assert error.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# Paging
+
+def test_query_pages_end_at_page_bytes_and_resume(client, table):
+	table.bulk_put(make_records(40))
+	response = client.query(TableName='artwork', KeyConditionExpression='artist_id = :a', ExpressionAttributeValues={ ":a": { "S": "a1" } })
+	assert 0 < response['Count'] < 40
+	assert 'LastEvaluatedKey' in response
+	
+	seen = []
+	cursor = None
+	while True:
+		records, cursor, count = table.query_page("a1", { "cursor": cursor } if cursor else {})
+		seen.extend(record['artwork_id'] for record in records)
+		if not cursor:
+			break
+	assert seen == list(range(40))
+
+
+def test_query_limit_desc_and_count(table):
+	table.bulk_put(make_records(30))
+	records, count = table.query("a1", { "limit": 5, "order_by": [{ "field": "artwork_id", "order": "desc" }] })
+	assert [record['artwork_id'] for record in records] == [29, 28, 27, 26, 25]
+	assert count == 30
+	assert table.query_count("a1", { "sort_key_value": 10, "sort_key_operator": "<" }) == 10
+
+
+def test_scan_and_index_query_follow_pages(table):
+	table.bulk_put(make_records(30) + make_records(30, artist_id="a2"))
+	assert len(table.scan()) == 60
+	assert len(table.parallel_scan(segments=3)) == 60
+	records, count = table.indexes["status-index"].query("sold")
+	assert count == 20
+
+
+# Transactions
+
+def test_transact_write_cancellation_reasons(client):
+	client.put_item(TableName='artwork', Item={ "artist_id": { "S": "a1" }, "artwork_id": { "N": "1" } })
+	with pytest.raises(ClientError) as error:
+		client.transact_write_items(TransactItems=[
+			{ "Put": { "TableName": 'artwork', "Item": { "artist_id": { "S": "a1" }, "artwork_id": { "N": "2" } } } },
+			{ "Put": { "TableName": 'artwork', "Item": { "artist_id": { "S": "a1" }, "artwork_id": { "N": "1" } }, "ConditionExpression": 'attribute_not_exists(artist_id)' } }
+		])
+	assert error.value.response['Error']['Code'] == 'TransactionCanceledException'
+	assert [reason['Code'] for reason in error.value.response['CancellationReasons']] == ['None', 'ConditionalCheckFailed']
+	assert 'Item' not in client.get_item(TableName='artwork', Key={ "artist_id": { "S": "a1" }, "artwork_id": { "N": "2" } })
+
+
+def test_table_transaction_is_all_or_nothing(table):
+	table.put_item({ "artist_id": "a1", "artwork_id": 1, "status": "open" })
+	result = table.transact_write([
+		{ "put": { "artist_id": "a1", "artwork_id": 2 } },
+		{ "update": { "artist_id": "a1", "artwork_id": 1, "status": "sold" }, "condition": { "name": "status", "value": "sold" } }
+	])
+	assert result is False
+	assert table.get_item("a1", 2) is None
+	assert table.get_item("a1", 1)['status'] == "open"
+	
+	assert table.transact_write([
+		{ "put": { "artist_id": "a1", "artwork_id": 2 } },
+		{ "update": { "artist_id": "a1", "artwork_id": 1, "status": "sold" }, "condition": { "name": "status", "value": "open" } }
+	]) is True
+	assert table.transact_get([("a1", 1), ("a1", 2), ("a1", 3)]) == [
+		{ "artist_id": "a1", "artwork_id": 1, "status": "sold" },
+		{ "artist_id": "a1", "artwork_id": 2 },
+		None
+	]
+
+
+# DynamoDBActionProcessor
+
+fields = [["artist_id", "str", True], ["artwork_id", "int", True], ["title", "str"]]
+
+
+def test_processor_item_actions(processor):
+	action = { "source": "ddb", "table_name": "artwork", "fields": fields }
+	created = processor.process('POST', action, {}, { "artist_id": "a1", "artwork_id": 1, "title": "Harbor" })
+	assert created['item']['title'] == "Harbor"
+	assert processor.process('POST', action, {}, { "artist_id": "a1", "artwork_id": 1 })['errors'][0]['code'] == 'already_exists'
+	assert processor.process('PATCH', action, {}, { "artist_id": "a1", "artwork_id": 2, "title": "Dawn" })['errors'][0]['code'] == 'not_found'
+	assert processor.process('GET', action, {}, { "artist_id": "a1", "artwork_id": 1 })['item']['title'] == "Harbor"
+	assert 'errors' not in processor.process('DELETE', action, {}, { "artist_id": "a1", "artwork_id": 1 })
+	assert processor.process('GET', action, {}, { "artist_id": "a1", "artwork_id": 1 })['errors'][0]['code'] == 'not_found'
+
+
+def test_processor_list_pages(processor, table):
+	table.bulk_put(make_records(10))
+	action = { "source": "ddb", "table_name": "artwork", "fields": [["artist_id", "str", True]] }
+	seen = []
+	data = { "artist_id": "a1", "limit": 4 }
+	while True:
+		result = processor.process('GET', action, {}, data)
+		seen.extend(int(item['artwork_id']) for item in result['items'])
+		if not result.get('last_evaluated_key'):
+			break
+		data['last_evaluated_key'] = result['last_evaluated_key']
+	assert seen == list(range(10))
+
+
+def test_processor_atomic_batch_is_canceled_together(processor, table):
+	table.put_item({ "artist_id": "a1", "artwork_id": 1 })
+	action = { "source": "ddb", "table_name": "artwork", "fields": fields, "batch": True }
+	result = processor.process('POST', action, { "artist_id": "a1" }, { "items": [{ "artwork_id": 5 }, { "artwork_id": 1 }] })
+	assert result['count'] == 0
+	assert [element['errors'][0]['code'] for element in result['results']] == ['transaction_canceled', 'already_exists']
+	assert table.get_item("a1", 5) is None
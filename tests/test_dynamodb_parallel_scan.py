@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class FailingSegmentClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Fails scans of one segment with a non-retryable error.
+	"""
+	failing_segment = None
+	
+	def scan(self, **kwargs):
+		if kwargs.get('Segment') is not None and kwargs['Segment'] == self.failing_segment:
+			raise ClientError({ "Error": { "Code": "ValidationException", "Message": "Bad segment" }, "ResponseMetadata": { "HTTPStatusCode": 400 } }, 'Scan')
+		return super().scan(**kwargs)
+
+
+@pytest.fixture
+def client():
+	client = FailingSegmentClient(page_bytes=1024)
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	resource_table = client.resource().Table('artwork')
+	for i in range(400):
+		resource_table.put_item(Item={ "artist_id": f"a{i % 13}", "artwork_id": i, "notes": "x" * 100 })
+	return client
+
+
+@pytest.fixture
+def table(client):
+	return moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+
+
+def get_ids(records):
+	return sorted((record['artist_id'], record['artwork_id']) for record in records)
+
+
+def scan_threads():
+	return [thread for thread in threading.enumerate() if thread.name.startswith('ThreadPoolExecutor')]
+
+
+def wait_for_scan_threads(baseline, timeout=2):
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		if len(scan_threads()) <= baseline:
+			return True
+		time.sleep(0.02)
+	return False
+
+
+def test_parallel_scan_matches_scan(table):
+	expected = get_ids(table.scan())
+	assert len(expected) == 400
+	assert get_ids(table.parallel_scan()) == expected
+	assert get_ids(table.parallel_scan(segments=7, workers=2)) == expected
+	assert get_ids(table.iter_scan(segments=3, page_size=10)) == expected
+	
+	filters = [{ "name": "artist_id", "operator": "=", "value": "a3" }]
+	assert get_ids(table.parallel_scan(filters, segments=5)) == get_ids(table.scan(filters))
+
+
+def test_stopping_early_does_not_hang_or_leak_threads(table):
+	baseline = len(scan_threads())
+	
+	# Small pages and one worker keep the bounded queue full while the consumer stops
+	started = time.monotonic()
+	records = list(table.iter_scan(segments=8, workers=1, page_size=5, max_items=7))
+	assert len(records) == 7
+	assert wait_for_scan_threads(baseline)
+	
+	# Breaking out of the loop closes the scan too
+	iterator = table.iter_scan(segments=4, workers=4, page_size=5)
+	for i, record in enumerate(iterator):
+		if i == 3:
+			break
+	iterator.close()
+	assert wait_for_scan_threads(baseline)
+	assert time.monotonic() - started < 5
+
+
+def test_segment_error_reaches_caller(client, table):
+	baseline = len(scan_threads())
+	client.failing_segment = 2
+	with pytest.raises(ConnectionError):
+		table.parallel_scan(segments=4)
+	with pytest.raises(ConnectionError):
+		list(table.iter_scan(segments=4, workers=1, page_size=5))
+	assert wait_for_scan_threads(baseline)
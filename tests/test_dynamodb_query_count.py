@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+@pytest.fixture
+def client():
+	client = moses_common.dynamodb_memory.MemoryClient(page_bytes=512)
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"price-index": (('status', 'S'), ('price', 'N'))
+	})
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+@pytest.fixture
+def table(client):
+	return moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+
+
+def put_items(client, artwork_ids, artist_id="a1"):
+	resource_table = client.resource().Table('artwork')
+	for artwork_id in artwork_ids:
+		resource_table.put_item(Item={ "artist_id": artist_id, "artwork_id": artwork_id, "status": "open", "price": artwork_id % 7 * 10 })
+
+
+def parallel_count(client, source, partition_key_value, args={}, segments=4):
+	queries = client.calls.get('query', 0)
+	count = source.query_count(partition_key_value, args, segments=segments)
+	# Two probes plus at least one range; a single query means the serial path ran
+	assert client.calls['query'] - queries > 2
+	return count
+
+
+def test_matches_serial_count(client, table):
+	put_items(client, range(100))
+	put_items(client, range(10), artist_id="a2")
+	assert table.query_count("a1") == 100
+	for segments in [2, 3, 4, 7, 16]:
+		assert parallel_count(client, table, "a1", segments=segments) == 100
+
+
+@pytest.mark.parametrize("args", [
+	{ "sort_key_operator": ">", "sort_key_value": 10 },
+	{ "sort_key_operator": ">=", "sort_key_value": 10 },
+	{ "sort_key_operator": "<", "sort_key_value": 90 },
+	{ "sort_key_operator": "between", "sort_key_value": 13, "sort_key_value_end": 77 },
+])
+def test_matches_serial_count_with_range_condition(client, table, args):
+	put_items(client, range(100))
+	assert parallel_count(client, table, "a1", args) == table.query_count("a1", args)
+
+
+def test_keys_on_split_boundaries(client, table):
+	# low 0, high 100 and 4 segments split at 25, 50 and 75
+	put_items(client, [0, 24, 25, 26, 50, 75, 100])
+	assert parallel_count(client, table, "a1") == 7
+	put_items(client, [0, 25, 50, 75, 100], artist_id="a2")
+	assert parallel_count(client, table, "a2") == 5
+
+
+def test_empty_sub_ranges(client, table):
+	put_items(client, [0, 1, 2, 98, 99, 100])
+	assert parallel_count(client, table, "a1", segments=8) == 6
+	
+	# More segments than distinct values
+	put_items(client, [0, 3], artist_id="a2")
+	assert parallel_count(client, table, "a2", segments=16) == 2
+
+
+def test_fractional_sort_values(client, table):
+	put_items(client, [Decimal("0.5"), Decimal("1.25"), Decimal("2"), Decimal("2.75"), Decimal("3.5")])
+	assert parallel_count(client, table, "a1", segments=3) == 5
+
+
+def test_single_value_and_no_match_fall_back(client, table):
+	put_items(client, [5])
+	assert table.query_count("a1", segments=4) == 1
+	assert table.query_count("missing", segments=4) == 0
+	assert table.query_count("a1", { "sort_key_operator": ">", "sort_key_value": 5 }, segments=4) == 0
+
+
+def test_index_count_with_duplicate_boundary_values(client, table):
+	# Index sort values repeat: prices 0-60, several items on each split boundary
+	put_items(client, range(200))
+	index = table.indexes["price-index"]
+	serial = index.query_count("open")
+	assert serial == 200
+	for segments in [2, 3, 6]:
+		assert parallel_count(client, index, "open", segments=segments) == serial
+	args = { "sort_key_operator": "between", "sort_key_value": 10, "sort_key_value_end": 40 }
+	assert parallel_count(client, index, "open", args) == index.query_count("open", args)
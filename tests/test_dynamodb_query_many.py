@@ -0,0 +1,53 @@
+import pytest
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+@pytest.fixture
+def table():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('title', 'S'))
+	})
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	for i in range(60):
+		table.put_item({ "artist_id": f"a{i % 3}", "artwork_id": i, "title": f"t{i:03d}", "status": "open" if i % 2 else "sold" })
+	return table
+
+
+def test_unsorted_returns_every_partition(table):
+	records = list(table.query_many(["a0", "a1", "a2", "a1"]))
+	assert sorted(record['artwork_id'] for record in records) == list(range(60))
+
+
+def test_sorted_merge(table):
+	records = list(table.query_many(["a2", "a0", "a1"], sort=True))
+	assert [record['artwork_id'] for record in records] == list(range(60))
+	
+	args = { "order_by": [{ "field": "artwork_id", "order": "desc" }] }
+	records = list(table.query_many(["a2", "a0", "a1"], args, sort=True))
+	assert [record['artwork_id'] for record in records] == list(reversed(range(60)))
+
+
+def test_sorted_merge_with_fields_without_sort_key(table):
+	records = list(table.query_many(["a0", "a1", "a2"], { "fields": ['title'] }, sort=True))
+	assert [record['title'] for record in records] == [f"t{i:03d}" for i in range(60)]
+	assert all('artwork_id' not in record for record in records)
+	
+	records = list(table.query_many(["a0", "a1"], { "fields": 'title' }, sort=True))
+	assert len(records) == 40
+	assert set(records[0]) == { 'title' }
+	
+	# Fields that include the sort key are returned as asked
+	records = list(table.query_many(["a0", "a1"], { "fields": ['title', 'artwork_id'] }, sort=True))
+	assert [record['artwork_id'] for record in records] == [i for i in range(60) if i % 3 < 2]
+
+
+def test_index_sorted_merge_with_fields_without_sort_key(table):
+	index = table.indexes["status-index"]
+	records = list(index.query_many(["open", "sold"], { "fields": ['artwork_id'] }, sort=True))
+	assert [record['artwork_id'] for record in records] == list(range(60))
+	assert all('title' not in record for record in records)
@@ -0,0 +1,112 @@
+import base64
+import json
+
+import pytest
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+@pytest.fixture
+def client():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('artwork_id', 'N'))
+	})
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+@pytest.fixture
+def table(client):
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	for i in range(23):
+		table.put_item({ "artist_id": "a1", "artwork_id": i, "status": "open" if i % 2 else "sold" })
+	table.put_item({ "artist_id": "a2", "artwork_id": 0, "status": "open" })
+	return table
+
+
+def read_pages(source, partition_key_value, args):
+	pages = []
+	cursor = None
+	while True:
+		records, cursor, count = source.query_page(partition_key_value, dict(args, cursor=cursor))
+		pages.append(([record['artwork_id'] for record in records], count))
+		if not cursor:
+			return pages
+
+
+def make_cursor(data):
+	return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip(table):
+	pages = read_pages(table, "a1", { "limit": 5 })
+	assert [ids for ids, count in pages] == [list(range(start, min(start + 5, 23))) for start in range(0, 23, 5)]
+	
+	args = { "limit": 5, "order_by": [{ "field": "artwork_id", "order": "desc" }] }
+	assert sum((ids for ids, count in read_pages(table, "a1", args)), []) == list(reversed(range(23)))
+	
+	args = { "limit": 4, "sort_key_operator": ">=", "sort_key_value": 10 }
+	assert sum((ids for ids, count in read_pages(table, "a1", args)), []) == list(range(10, 23))
+
+
+def test_cursor_round_trip_through_index(table):
+	index = table.indexes["status-index"]
+	pages = read_pages(index, "open", { "limit": 3 })
+	assert sum((ids for ids, count in pages), []) == [0] + list(range(1, 23, 2))
+	
+	plan = index.prepare_query({ "limit": 3 })
+	records, cursor, count = plan.query_page("open")
+	records, cursor, count = plan.query_page("open", cursor=cursor)
+	assert [record['artwork_id'] for record in records] == [5, 7, 9]
+
+
+def test_count_estimate_and_exact(table, client):
+	queries = client.calls.get('query', 0)
+	pages = read_pages(table, "a1", { "limit": 10, "count": 'estimate' })
+	# Items returned so far, plus one more page while there is one; no extra reads
+	assert [count for ids, count in pages] == [20, 30, 23]
+	assert client.calls['query'] - queries == len(pages)
+	
+	pages = read_pages(table, "a1", { "limit": 10, "count": 'exact' })
+	assert [count for ids, count in pages] == [23, 23, 23]
+	
+	records, cursor, count = table.query_page("a1", { "limit": 10 })
+	assert count is None
+
+
+@pytest.mark.parametrize("cursor", [
+	"not a cursor!",
+	"e30",  # {}
+	make_cursor([1, 2]),
+	make_cursor({ "k": "key", "n": 1 }),
+	make_cursor({ "k": { "artist_id": "a1", "artwork_id": 4 } }),
+	make_cursor({ "k": { "artist_id": { "S": "a1" } } }),
+])
+def test_invalid_cursor(table, cursor):
+	with pytest.raises(AttributeError, match="Invalid cursor"):
+		table.query_page("a1", { "cursor": cursor })
+
+
+def test_cursor_from_another_partition_or_source(table):
+	records, cursor, count = table.query_page("a1", { "limit": 5 })
+	with pytest.raises(AttributeError, match="Invalid cursor"):
+		table.query_page("a2", { "cursor": cursor })
+	
+	# A table cursor lacks the index key
+	index = table.indexes["status-index"]
+	with pytest.raises(AttributeError, match="Invalid cursor"):
+		index.query_page("open", { "cursor": cursor })
+	with pytest.raises(AttributeError, match="Invalid cursor"):
+		index.prepare_query({}).query_page("open", cursor=cursor)
+
+
+def test_tampered_seen_count(table):
+	records, cursor, count = table.query_page("a1", { "limit": 5 })
+	data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+	data['n'] = -100
+	records, cursor, count = table.query_page("a1", { "limit": 5, "count": 'estimate', "cursor": make_cursor(data) })
+	assert [record['artwork_id'] for record in records] == [5, 6, 7, 8, 9]
+	assert count == 10
@@ -0,0 +1,33 @@
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+def make_table():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('artwork_id', 'N'))
+	})
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	table.bulk_put([{ "artist_id": "a1", "artwork_id": i, "status": "open" } for i in range(10)])
+	return table
+
+
+def test_prepared_table_query_matches_query():
+	table = make_table()
+	args = { "sort_key_value": 2, "sort_key_value_end": 7, "sort_key_operator": "between", "limit": 4, "order_by": [{ "field": "artwork_id", "order": "desc" }] }
+	plan = table.prepare_query(args)
+	assert plan.get_query_args("a1") == table.get_query_args("a1", args)[0]
+	assert plan.query("a1") == table.query("a1", args)
+	assert [record['artwork_id'] for record in plan.query("a1")[0]] == [7, 6, 5, 4]
+
+
+def test_prepared_index_query_matches_index_query():
+	table = make_table()
+	index = table.indexes["status-index"]
+	args = { "sort_key_value": 2, "sort_key_operator": ">=", "order_by": [{ "field": "artwork_id", "order": "desc" }] }
+	plan = index.prepare_query(args)
+	assert plan.query("open") == index.query("open", args)
+	records, next_cursor, count = index.query_page("open", args)
+	assert records == plan.query_page("open")[0]
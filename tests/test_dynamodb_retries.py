@@ -0,0 +1,69 @@
+import pytest
+from botocore.exceptions import ClientError
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+class ThrottlingClient(moses_common.dynamodb_memory.MemoryClient):
+	"""
+	Fails the next `failures` get_item calls with the given error code.
+	"""
+	def __init__(self, code):
+		super().__init__()
+		self.code = code
+		self.failures = 0
+		self.attempts = 0
+	
+	def get_item(self, **kwargs):
+		if self.failures:
+			self.attempts += 1
+			self.failures -= 1
+			raise ClientError({ "Error": { "Code": self.code, "Message": "Rate exceeded" }, "ResponseMetadata": { "HTTPStatusCode": 400 } }, 'GetItem')
+		return super().get_item(**kwargs)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, '_backoff_delay', lambda attempt: 0)
+
+
+def make_table(code):
+	client = ThrottlingClient(code)
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artist', ui=moses_common.ui.Interface())
+	table.put_item({ "artist_id": "a1", "name": "Ada" })
+	return client, table
+
+
+def test_default_client_leaves_retries_to_table():
+	assert moses_common.dynamodb.client_config.retries['total_max_attempts'] == 1
+
+
+def test_throttles_are_retried_and_counted(no_sleep):
+	client, table = make_table('ProvisionedThroughputExceededException')
+	client.failures = 3
+	assert table.get_item("a1")['name'] == "Ada"
+	metrics = table.metrics
+	assert metrics['throttles'] == 3
+	assert metrics['retries'] == 3
+
+
+def test_throttle_after_last_retry_is_raised_and_counted(no_sleep, monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, 'throttle_max_retries', 2)
+	client, table = make_table('ThrottlingException')
+	client.failures = 10
+	with pytest.raises(ClientError):
+		table._request('get_item', 'read', TableName='artist', Key={ "artist_id": { "S": "a1" } })
+	assert client.attempts == 3
+	assert table.metrics['throttles'] == 3
+
+
+def test_other_errors_are_not_retried(no_sleep):
+	client, table = make_table('ValidationException')
+	client.failures = 1
+	assert table.get_item("a1") is None
+	assert client.attempts == 1
+	assert table.metrics['retries'] == 0
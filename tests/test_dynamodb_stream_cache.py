@@ -0,0 +1,78 @@
+import pytest
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+from stream_events import make_record
+
+
+@pytest.fixture
+def table():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'))
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artwork', ui=moses_common.ui.Interface())
+	for artwork_id in range(3):
+		table.put_item({ "artist_id": "a1", "artwork_id": artwork_id, "title": f"t{artwork_id}" })
+	return table
+
+
+def artwork(artwork_id, title):
+	return { "artist_id": "a1", "artwork_id": artwork_id, "title": title }
+
+
+def key(artwork_id):
+	return { "artist_id": "a1", "artwork_id": artwork_id }
+
+
+def test_insert_modify_remove(table):
+	cache = moses_common.dynamodb.StreamCache(table, load=True, segments=2)
+	assert len(cache) == 3
+	version = cache.version
+	
+	changes = cache.apply({ "Records": [
+		make_record('artwork', 'INSERT', key(5), new=artwork(5, "new"), sequence=100),
+		make_record('artwork', 'MODIFY', key(1), new=artwork(1, "changed"), old=artwork(1, "t1"), sequence=101),
+		make_record('artwork', 'REMOVE', key(2), old=artwork(2, "t2"), sequence=102),
+		make_record('other-table', 'REMOVE', key(0), sequence=103)
+	] })
+	assert [change['event'] for change in changes] == ['INSERT', 'MODIFY', 'REMOVE']
+	assert cache.version == version + 1
+	assert cache.get("a1", 5) == artwork(5, "new")
+	assert cache.get("a1", 1)['title'] == "changed"
+	assert cache.get("a1", 2) is None
+	assert key(0) in cache
+	assert sorted(record['artwork_id'] for record in cache.values()) == [0, 1, 5]
+
+
+def test_out_of_order_and_replayed_records_are_skipped(table):
+	cache = moses_common.dynamodb.StreamCache(table, load=True)
+	cache.apply([make_record('artwork', 'MODIFY', key(1), new=artwork(1, "newest"), sequence=300)])
+	version = cache.version
+	
+	# An older change to the same key, and a replay of the one applied
+	changes = cache.apply([
+		make_record('artwork', 'MODIFY', key(1), new=artwork(1, "older"), sequence=200),
+		make_record('artwork', 'REMOVE', key(1), sequence=250),
+		make_record('artwork', 'MODIFY', key(1), new=artwork(1, "newest"), sequence=300)
+	])
+	assert changes == []
+	assert cache.version == version
+	assert cache.get("a1", 1)['title'] == "newest"
+	
+	# Sequence numbers are tracked per key
+	cache.apply([make_record('artwork', 'MODIFY', key(0), new=artwork(0, "other key"), sequence=150)])
+	assert cache.get("a1", 0)['title'] == "other key"
+
+
+def test_keys_only_records_read_the_item(table):
+	cache = moses_common.dynamodb.StreamCache(table)
+	table.put_item(artwork(1, "written"))
+	cache.apply([make_record('artwork', 'MODIFY', key(1), sequence=1)])
+	assert cache.get("a1", 1)['title'] == "written"
+	
+	# Applies before load() only touch what they name
+	assert len(cache) == 1
+	assert not cache.loaded
+	cache.apply([make_record('artwork', 'REMOVE', key(1), sequence=2)])
+	assert len(cache) == 0
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+
+
+@pytest.fixture
+def client(monkeypatch):
+	monkeypatch.setattr(moses_common.dynamodb, 'table_info_snapshot_file', None)
+	client = moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artwork', ('artist_id', 'S'), ('artwork_id', 'N'), indexes={
+		"status-index": (('status', 'S'), ('artwork_id', 'N'))
+	})
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	return client
+
+
+def describe_calls(client):
+	return client.calls.get('describe_table', 0)
+
+
+def age_cached_info(table_name, seconds):
+	moses_common.dynamodb._table_info_cache[table_name]['time'] -= seconds
+
+
+# describe_table
+
+def test_describe_table_is_shared_until_ttl(client, monkeypatch):
+	info = moses_common.dynamodb.describe_table('artwork')
+	assert info['TableName'] == 'artwork'
+	assert moses_common.dynamodb.describe_table('artwork') is info
+	moses_common.dynamodb.Table('artwork')
+	assert describe_calls(client) == 1
+	
+	monkeypatch.setattr(moses_common.dynamodb, 'table_info_ttl', 60)
+	age_cached_info('artwork', 59)
+	moses_common.dynamodb.describe_table('artwork')
+	assert describe_calls(client) == 1
+	age_cached_info('artwork', 2)
+	moses_common.dynamodb.describe_table('artwork')
+	assert describe_calls(client) == 2
+	
+	# max_age overrides the ttl
+	moses_common.dynamodb.describe_table('artwork', max_age=0)
+	assert describe_calls(client) == 3
+	moses_common.dynamodb.invalidate_table_info('artwork')
+	moses_common.dynamodb.describe_table('artwork')
+	assert describe_calls(client) == 4
+
+
+def test_describe_table_with_client(client):
+	other = moses_common.dynamodb_memory.MemoryClient()
+	other.add_table('other', ('id', 'S'))
+	assert moses_common.dynamodb.describe_table('other', client=other)['TableName'] == 'other'
+	assert describe_calls(client) == 0
+	with pytest.raises(ClientError):
+		moses_common.dynamodb.describe_table('missing')
+
+
+# Snapshots
+
+def test_snapshot_round_trip(client, tmp_path):
+	filepath = str(tmp_path / 'tables.json')
+	info = moses_common.dynamodb.describe_table('artwork')
+	moses_common.dynamodb.describe_table('artist')
+	assert moses_common.dynamodb.save_table_info_snapshot(filepath) is True
+	assert os.listdir(tmp_path) == ['tables.json']
+	
+	moses_common.dynamodb.invalidate_table_info()
+	assert moses_common.dynamodb.load_table_info_snapshot(filepath) == 2
+	assert moses_common.dynamodb.describe_table('artwork') == json.loads(json.dumps(info, default=str))
+	table = moses_common.dynamodb.Table('artwork')
+	assert table.sort_key.name == 'artwork_id'
+	assert describe_calls(client) == 2
+	
+	# Entries keep their time, so the ttl still applies after a load
+	moses_common.dynamodb.invalidate_table_info()
+	age_cached_info_in_file(filepath, 'artwork', moses_common.dynamodb.table_info_ttl + 1)
+	moses_common.dynamodb.load_table_info_snapshot(filepath)
+	moses_common.dynamodb.describe_table('artwork')
+	assert describe_calls(client) == 3
+	
+	# Only entries newer than the cache are loaded
+	assert moses_common.dynamodb.load_table_info_snapshot(filepath) == 0
+
+
+def age_cached_info_in_file(filepath, table_name, seconds):
+	with open(filepath) as file:
+		snapshot = json.load(file)
+	snapshot[table_name]['time'] -= seconds
+	with open(filepath, 'w') as file:
+		json.dump(snapshot, file)
+
+
+def test_snapshot_file_setting_loads_and_saves(client, tmp_path, monkeypatch):
+	filepath = str(tmp_path / 'tables.json')
+	monkeypatch.setattr(moses_common.dynamodb, 'table_info_snapshot_file', filepath)
+	monkeypatch.setattr(moses_common.dynamodb, '_table_info_snapshot_loaded', False)
+	moses_common.dynamodb.describe_table('artwork')
+	assert os.path.exists(filepath)
+	
+	# A cold start reads the snapshot instead of calling DescribeTable
+	moses_common.dynamodb.invalidate_table_info()
+	monkeypatch.setattr(moses_common.dynamodb, '_table_info_snapshot_loaded', False)
+	moses_common.dynamodb.describe_table('artwork')
+	assert describe_calls(client) == 1
+
+
+def test_bad_snapshot_files_are_ignored(client, tmp_path):
+	assert moses_common.dynamodb.load_table_info_snapshot(str(tmp_path / 'missing.json')) == 0
+	for content in ['{not json', '[1, 2]', '{"artwork": {"info": "x", "time": 1}}', '{"artwork": {"info": {}, "time": "new"}}']:
+		filepath = tmp_path / 'bad.json'
+		filepath.write_text(content)
+		assert moses_common.dynamodb.load_table_info_snapshot(str(filepath)) == 0
+	assert moses_common.dynamodb.save_table_info_snapshot(str(tmp_path / 'no-dir' / 'tables.json')) is False
+	assert os.listdir(tmp_path) == ['bad.json']
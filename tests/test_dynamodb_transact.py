@@ -0,0 +1,51 @@
+import moses_common.dynamodb
+import moses_common.dynamodb_memory
+import moses_common.ui
+
+
+def make_table(client=None):
+	client = client or moses_common.dynamodb_memory.MemoryClient()
+	client.add_table('artist', ('artist_id', 'S'))
+	moses_common.dynamodb.set_backend(client)
+	table = moses_common.dynamodb.Table('artist', ui=moses_common.ui.Interface())
+	table.put_item({ "artist_id": "a1", "status": "open" })
+	return table
+
+
+def test_key_only_update_keeps_its_condition_in_a_transaction():
+	table = make_table()
+	result = table.transact_write([
+		{ "update": { "artist_id": "a1" }, "condition": { "name": "status", "value": "sold" } },
+		{ "put": { "artist_id": "a2" } }
+	])
+	assert result is False
+	assert table.get_item("a2") is None
+	
+	result = table.transact_write([
+		{ "update": { "artist_id": "a1" }, "condition": { "name": "status", "value": "open" } },
+		{ "put": { "artist_id": "a2" } }
+	])
+	assert result is True
+	assert table.get_item("a2") == { "artist_id": "a2" }
+
+
+def test_key_only_update_without_condition_is_left_out():
+	table = make_table()
+	assert table.transact_write([{ "update": { "artist_id": "a1" } }, { "put": { "artist_id": "a2" } }]) is True
+	assert table.get_item("a1") == { "artist_id": "a1", "status": "open" }
+
+
+def test_key_only_update_item_checks_condition():
+	client = moses_common.dynamodb_memory.MemoryClient()
+	table = make_table(client)
+	assert table.update_item({ "artist_id": "a1" }, condition={ "name": "status", "value": "sold" }) is False
+	assert table.update_item({ "artist_id": "a1" }, condition={ "name": "status", "value": "open" }) is True
+	assert table.update_item({ "artist_id": "a1" }, condition='exists', return_values='ALL_OLD') == { "artist_id": "a1", "status": "open" }
+	assert table.get_item("a1") == { "artist_id": "a1", "status": "open" }
+	assert table.update_item({ "artist_id": "missing" }, condition='exists') is False
+	assert table.update_item({ "artist_id": "missing" }) is True
+	assert table.get_item("missing") is None
+	
+	# A plain conditional UpdateItem, not a transaction
+	assert client.calls['update_item'] == 4
+	assert 'transact_write_items' not in client.calls
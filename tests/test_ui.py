@@ -0,0 +1,28 @@
+import moses_common.ui
+
+
+payload = { "title": "x" * 3000 }
+
+
+def test_debug_payload_is_logged_in_full_by_default(capsys):
+	ui = moses_common.ui.Interface(log_level=7)
+	ui.debug_payload("response", payload)
+
+	assert str(payload) in capsys.readouterr().out
+
+
+def test_debug_payload_is_cut_when_debug_max_length_is_set(capsys, monkeypatch):
+	monkeypatch.setattr(moses_common.ui, 'debug_max_length', 200)
+	ui = moses_common.ui.Interface(log_level=7)
+	ui.debug_payload("response", payload)
+
+	out = capsys.readouterr().out
+	assert "response: {'title': 'xxx" in out
+	assert len(out) < 300
+
+
+def test_debug_payload_is_skipped_when_debug_is_off(capsys):
+	ui = moses_common.ui.Interface(log_level=5)
+	ui.debug_payload("response", payload)
+
+	assert capsys.readouterr().out == ""